@@ -0,0 +1,179 @@
+"""
+Content-addressed store for model files shared between sessions.
+
+Files are kept once under their SHA-256 digest and hardlinked into each
+session directory that uses them. The hardlink count is the reference
+count: a blob whose only link is its store entry is no longer used by
+any session and is removed by gc(). Blobs are made read-only, and
+link_into() always replaces the destination name rather than writing
+through it, so a session can never modify a shared copy.
+
+If the session directory is on another file system, files are copied
+instead. Those copies are not deduplicated, but everything else works.
+
+Storage is shared, but the right to link a blob by its digest alone is
+not: each owner (a client session) may only link blobs it has itself
+supplied or been given, so a digest cannot be used to fetch another
+user's file or to learn whether it is on the server.
+"""
+import os
+import stat
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+GC_GRACE = 600.0    # seconds; newly added blobs may not be linked yet
+_HEX = set('0123456789abcdef')
+
+
+def is_digest(s):
+    return isinstance(s, str) and len(s) == 64 and set(s) <= _HEX
+
+
+class BlobMissing(LookupError):
+    """The blob was removed, e.g. by gc(), before it could be linked."""
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+        self.tmpdir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmpdir, exist_ok=True)
+        self._file_digests = {}     # (path, size, mtime) → digest, for server files
+        self._owned = {}            # owner → digests it may link by digest alone
+        self._lock = threading.Lock()
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return is_digest(digest) and os.path.isfile(self.path_for(digest))
+
+    def refcount(self, digest):
+        """Number of session files linked to the blob."""
+        try:
+            return os.stat(self.path_for(digest)).st_nlink - 1
+        except OSError:
+            return 0
+
+    def _commit(self, tmp_path, digest):
+        dest = self.path_for(digest)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if os.path.exists(dest):
+            os.remove(tmp_path)     # Already known; keep the existing blob.
+        else:
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, dest)
+        return digest
+
+    def adopt(self, path, digest):
+        """Moves a file whose digest has already been computed into the
+        store. path must be on the store's file system."""
+        return self._commit(path, digest)
+
+    def add_stream(self, fileobj):
+        """Reads fileobj to the end, storing it. Returns its digest."""
+        h = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmpdir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    buf = fileobj.read(CHUNK_SIZE)
+                    if not buf:
+                        break
+                    h.update(buf)
+                    out.write(buf)
+            return self._commit(tmp_path, h.hexdigest())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def add_file(self, path):
+        """Stores a copy of the file at path. Returns its digest. Digests
+        of unchanged files are remembered, so staging the same server
+        file again costs one stat."""
+        st = os.stat(path)
+        key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._file_digests.get(key)
+        if digest and self.has(digest):
+            return digest
+        with open(path, 'rb') as f:
+            digest = self.add_stream(f)
+        with self._lock:
+            self._file_digests[key] = digest
+        return digest
+
+    def may_link(self, owner, digest):
+        """True if owner may link the blob without sending its content."""
+        with self._lock:
+            owned = digest in self._owned.get(owner, ())
+        return owned and self.has(digest)
+
+    def forget_owner(self, owner):
+        with self._lock:
+            self._owned.pop(owner, None)
+
+    def link_into(self, digest, dest_path, owner=None):
+        """Makes dest_path refer to the blob, replacing whatever was there,
+        and lets owner link it again by digest. Raises BlobMissing if the
+        blob is no longer in the store."""
+        src = self.path_for(digest)
+        try:
+            # rename() between two links to one file is a no-op, so an
+            # existing link must be left as it is.
+            linked = os.path.samefile(src, dest_path)
+        except OSError:
+            linked = False
+        if not linked:
+            tmp_dest = f'{dest_path}.link-{os.getpid()}-{threading.get_ident()}'
+            try:
+                try:
+                    os.link(src, tmp_dest)
+                except FileNotFoundError:
+                    raise
+                except OSError:
+                    shutil.copyfile(src, tmp_dest)
+            except FileNotFoundError:
+                if not os.path.exists(src):
+                    raise BlobMissing(digest)
+                raise
+            os.replace(tmp_dest, dest_path)
+        if owner is not None:
+            with self._lock:
+                self._owned.setdefault(owner, set()).add(digest)
+
+    def gc(self, grace=GC_GRACE):
+        """Removes blobs that no session links to. Returns (count, bytes)."""
+        removed, freed = 0, 0
+        now = time.time()
+        for sub in os.listdir(self.root):
+            subdir = os.path.join(self.root, sub)
+            if len(sub) != 2 or not os.path.isdir(subdir):   # tmp/, uploads/
+                continue
+            for name in os.listdir(subdir):
+                path = os.path.join(subdir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                # ctime changes when a link is added or removed.
+                if st.st_nlink == 1 and now - st.st_ctime > grace:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                        freed += st.st_size
+                    except OSError:
+                        pass
+        for name in os.listdir(self.tmpdir):   # Abandoned partial uploads
+            path = os.path.join(self.tmpdir, name)
+            try:
+                if now - os.stat(path).st_mtime > grace:
+                    os.remove(path)
+            except OSError:
+                pass
+        return removed, freed
@@ -0,0 +1,260 @@
+"""
+Resumable chunked uploads into the blob store.
+
+A client opens an upload with the file's name, size and (optionally) its
+SHA-256, then sends the file as numbered chunks of a fixed size, each with
+its own SHA-256 in the X-Chunk-SHA256 header. Chunks are written at their
+offset in a partial file, so they may arrive in any order and a chunk
+that fails its hash check is simply sent again. The set of received chunks
+is kept in a small manifest next to the partial file. A client that
+reconnects, or a server that restarts, picks the upload up where it left
+off: opening the same upload again returns the chunks already received.
+Once every chunk is in, the file is hashed as a whole, moved into the
+blob store and linked into the session.
+
+Run this module as a script to upload a file over plain HTTP, e.g. to
+exercise resume against a local server:
+
+    python chunked_upload.py http://localhost:5000 <clientId> big_model.xml
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+UPLOAD_EXPIRY = 24 * 3600.0     # seconds an idle partial upload is kept
+_MANIFEST = 'manifest.json'
+
+
+class UploadError(ValueError):
+    """A request that cannot be applied to an upload."""
+
+
+class UploadClosed(UploadError):
+    """The upload has already been completed or discarded."""
+
+
+class Upload:
+    def __init__(self, upload_dir, meta):
+        self.dir = upload_dir
+        self.meta = meta
+        self.received = set(meta.get('received', []))
+        self.lock = threading.Lock()
+        self.closed = False     # Set once the data file is adopted or removed
+
+    @property
+    def id(self):
+        return self.meta['id']
+
+    @property
+    def data_path(self):
+        return os.path.join(self.dir, 'data')
+
+    @property
+    def num_chunks(self):
+        size, chunk = self.meta['size'], self.meta['chunkSize']
+        return max(1, (size + chunk - 1) // chunk)
+
+    def chunk_length(self, index):
+        if index == self.num_chunks - 1:
+            return self.meta['size'] - index * self.meta['chunkSize']
+        return self.meta['chunkSize']
+
+    def missing(self):
+        return [i for i in range(self.num_chunks) if i not in self.received]
+
+    def status(self):
+        return {'uploadId': self.id, 'filename': self.meta['filename'],
+                'size': self.meta['size'], 'chunkSize': self.meta['chunkSize'],
+                'numChunks': self.num_chunks, 'received': sorted(self.received)}
+
+    def save_manifest(self):
+        self.meta['received'] = sorted(self.received)
+        self.meta['updated'] = time.time()
+        tmp = os.path.join(self.dir, _MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.dir, _MANIFEST))
+
+
+class UploadManager:
+    """Keeps partial uploads under root. Methods that touch the disk
+    block, so the server calls them through its thread pool."""
+
+    def __init__(self, store, root, max_size):
+        self.store = store
+        self.root = root
+        self.max_size = max_size
+        self._uploads = {}      # upload id → Upload
+        # upload id → (client id, time) for uploads completed or discarded
+        # since the server started, so that a late request for one can be
+        # told apart from a request for an id that never existed.
+        self._closed = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        for name in os.listdir(self.root):
+            upload_dir = os.path.join(self.root, name)
+            try:
+                with open(os.path.join(upload_dir, _MANIFEST)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self._uploads[meta['id']] = Upload(upload_dir, meta)
+
+    def open(self, client_id, filename, size, sha256=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Starts an upload, or returns the unfinished one for the same
+        client, file name, size and hash so that it can be resumed."""
+        if size < 0 or size > self.max_size:
+            raise UploadError(f'File size must be between 0 and {self.max_size} bytes')
+        chunk_size = min(max(int(chunk_size), 64 * 1024), MAX_CHUNK_SIZE)
+        key = [client_id, filename, size, sha256]
+        with self._lock:
+            for up in self._uploads.values():
+                if up.meta['key'] == key:
+                    return up
+            upload_id = uuid.uuid4().hex
+            upload_dir = os.path.join(self.root, upload_id)
+            os.makedirs(upload_dir)
+            meta = {'id': upload_id, 'key': key, 'clientId': client_id,
+                    'filename': filename, 'size': size, 'sha256': sha256,
+                    'chunkSize': chunk_size, 'created': time.time()}
+            up = Upload(upload_dir, meta)
+            with open(up.data_path, 'wb') as f:
+                f.truncate(size)
+            up.save_manifest()
+            self._uploads[upload_id] = up
+            return up
+
+    def get(self, upload_id, client_id):
+        up = self._uploads.get(upload_id)
+        if up is None or up.meta['clientId'] != client_id:
+            return None
+        return up
+
+    def was_closed(self, upload_id, client_id):
+        entry = self._closed.get(upload_id)
+        return entry is not None and entry[0] == client_id
+
+    def write_chunk(self, up, index, data, chunk_sha256):
+        if not 0 <= index < up.num_chunks:
+            raise UploadError(f'Chunk index {index} out of range')
+        if len(data) != up.chunk_length(index):
+            raise UploadError(f'Chunk {index} should be {up.chunk_length(index)} bytes, got {len(data)}')
+        if hashlib.sha256(data).hexdigest() != chunk_sha256:
+            raise UploadError(f'Chunk {index} does not match its sha256')
+        with up.lock:
+            if up.closed:
+                raise UploadClosed('Upload already completed')
+            fd = os.open(up.data_path, os.O_WRONLY)
+            try:
+                os.pwrite(fd, data, index * up.meta['chunkSize'])
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            up.received.add(index)
+            up.save_manifest()
+
+    def finish(self, up):
+        """Moves a complete upload into the store. Returns its digest."""
+        with up.lock:
+            if up.closed:
+                raise UploadClosed('Upload already completed')
+            missing = up.missing()
+            if missing:
+                raise UploadError(f'{len(missing)} chunks still missing')
+            with open(up.data_path, 'rb') as f:
+                h = hashlib.sha256()
+                for buf in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(buf)
+            digest = h.hexdigest()
+            expected = up.meta.get('sha256')
+            if expected and expected != digest:
+                # Every chunk checked out, so the client's whole-file hash
+                # is wrong; start over rather than keep a bad upload.
+                self.discard(up)
+                raise UploadError('Assembled file does not match its sha256')
+            self.store.adopt(up.data_path, digest)
+            up.closed = True
+        self.discard(up)
+        return digest
+
+    def discard(self, up):
+        up.closed = True
+        with self._lock:
+            self._uploads.pop(up.id, None)
+            self._closed[up.id] = (up.meta['clientId'], time.time())
+        for name in os.listdir(up.dir):
+            try:
+                os.remove(os.path.join(up.dir, name))
+            except OSError:
+                pass
+        try:
+            os.rmdir(up.dir)
+        except OSError:
+            pass
+
+    def expire(self, max_age=UPLOAD_EXPIRY):
+        now = time.time()
+        for up in list(self._uploads.values()):
+            if now - up.meta.get('updated', up.meta['created']) > max_age:
+                self.discard(up)
+        with self._lock:
+            for upload_id, (_, closed_at) in list(self._closed.items()):
+                if now - closed_at > max_age:
+                    del self._closed[upload_id]
+
+
+def upload(base_url, client_id, path, chunk_size=DEFAULT_CHUNK_SIZE, retries=5):
+    """Uploads path through the chunked protocol, resuming whatever the
+    server already holds. Returns the server's final reply."""
+    import requests
+    size = os.path.getsize(path)
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for buf in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(buf)
+    session = requests.Session()
+    r = session.post(f'{base_url}/upload_session', json={
+        'clientId': client_id, 'filename': os.path.basename(path),
+        'size': size, 'sha256': h.hexdigest(), 'chunkSize': chunk_size})
+    r.raise_for_status()
+    info = r.json()
+    if info.get('status') == 'success':
+        return info     # Already in the store.
+    upload_id, chunk_size = info['uploadId'], info['chunkSize']
+    have = set(info['received'])
+    with open(path, 'rb') as f:
+        for index in range(info['numChunks']):
+            if index in have:
+                continue
+            f.seek(index * chunk_size)
+            data = f.read(chunk_size)
+            for attempt in range(retries):
+                try:
+                    r = session.put(f'{base_url}/upload_chunk/{upload_id}/{index}',
+                                    params={'clientId': client_id}, data=data,
+                                    headers={'X-Chunk-SHA256': hashlib.sha256(data).hexdigest()})
+                    if r.ok:
+                        break
+                except requests.RequestException:
+                    pass
+                time.sleep(min(2 ** attempt, 10))
+            else:
+                raise RuntimeError(f'Chunk {index} failed after {retries} attempts; run again to resume')
+    r = session.post(f'{base_url}/upload_complete/{upload_id}', json={'clientId': client_id})
+    r.raise_for_status()
+    return r.json()
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 4:
+        sys.exit('usage: python chunked_upload.py <server url> <clientId> <file>')
+    print(json.dumps(upload(sys.argv[1].rstrip('/'), sys.argv[2], sys.argv[3]), indent=2))
@@ -0,0 +1,339 @@
+"""
+Pre-build cost estimator for jardesigner configs.
+
+Gives a rough, MOOSE-free projection of how big a model will be and how
+long it will take, so that the server can size work before a worker is
+launched and the GUI can flag pathological settings. The morphology file
+is parsed directly, spines and chem voxels are counted from the spacing
+and diffusionLength fields, and pools are counted from the chem prototype
+files. The per-item costs below are order-of-magnitude figures, not a
+benchmark; the estimate is meant to catch configs that are off by 100x,
+not to predict run times to the second.
+"""
+import os
+import re
+import ast
+import math
+import fnmatch
+
+from morphology import read_morphology
+
+# Defaults from jardesignerSchema.json
+_DEFAULTS = {
+    'elecDt': 50e-6, 'chemDt': 0.1, 'diffDt': 0.01,
+    'elecPlotDt': 0.1e-3, 'chemPlotDt': 1.0, 'runtime': 0.3,
+    'diffusionLength': 2e-6,
+}
+_DEFAULT_SPINE_SPACING = 10e-6
+_DEFAULT_MOOGLI_DT = 0.2
+_CHEM_FIELDS = {'n', 'conc', 'concInit', 'volume'}
+
+# Approximate costs. Bytes per item, and seconds per item per timestep.
+_BASE_PROCESS_BYTES = 150e6
+_COMPT_BYTES = 2000
+_CHAN_BYTES = 1500
+_POOL_VOXEL_BYTES = 150
+_SAMPLE_BYTES = 8
+_COMPT_STEP_SEC = 2e-7
+_CHAN_STEP_SEC = 1e-7
+_POOL_VOXEL_STEP_SEC = 5e-7
+_GSSA_FACTOR = 10.0
+_SAMPLE_SEC = 3e-8
+
+# Warning thresholds
+_MAX_SAMPLES_PER_TABLE = 1e7
+_MAX_PLOT_BYTES = 1e9
+_MAX_MOOGLI_FRAMES = 1e5
+_MAX_MEMORY_BYTES = 8e9
+_MAX_RUNTIME_SEC = 3600.0
+_MIN_DIFFUSION_LENGTH = 0.5e-6
+
+_JARDESIGNER_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jardesigner'))
+
+
+class Compt:
+    __slots__ = ('name', 'length')
+
+    def __init__(self, name, length):
+        self.name = name
+        self.length = length
+
+
+def _num(value, default):
+    """Config values may be numbers or numeric strings; anything else
+    (e.g. an expression in terms of p or dia) falls back to default."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _matches(path, name):
+    """True if a compartment name matches a MOOSE wildcard path such as
+    'dend#' or 'soma,apical#'. Only the last path element is considered."""
+    for part in path.split(','):
+        part = part.strip().split('/')[-1]
+        pattern = part.replace('#', '*').replace('[]', '')
+        if fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+def _matching(compts, path):
+    return [cc for cc in compts if _matches(path, cc.name)]
+
+#######################################################################
+# Morphology
+#######################################################################
+
+def cell_compartments(cell_proto, session_dir=None):
+    """Returns the compartments of the cell prototype, or None if they
+    cannot be determined without MOOSE (function or in-memory protos,
+    missing files, NeuroML)."""
+    if not cell_proto:
+        return [Compt('soma', 500e-6)]   # HH squid soma
+    ptype = cell_proto.get('type')
+    if ptype == 'soma':
+        return [Compt('soma', cell_proto.get('somaLen', 500e-6))]
+    if ptype == 'ballAndStick':
+        n = int(cell_proto.get('dendNumSeg', 1))
+        dx = cell_proto.get('dendLen', 200e-6) / n
+        return [Compt('soma', cell_proto.get('somaLen', 10e-6))] + \
+            [Compt('dend' + str(i), dx) for i in range(n)]
+    if ptype == 'branchedCell':
+        n = int(cell_proto.get('dendNumSeg', 1))
+        nb = int(cell_proto.get('branchNumSeg', 1))
+        dx = cell_proto.get('dendLen', 200e-6) / n
+        bx = cell_proto.get('branchLen', 200e-6) / nb
+        return [Compt('soma', cell_proto.get('somaLen', 10e-6))] + \
+            [Compt('dend' + str(i), dx) for i in range(n)] + \
+            [Compt('branch1_' + str(i), bx) for i in range(nb)] + \
+            [Compt('branch2_' + str(i), bx) for i in range(nb)]
+    if ptype == 'file':
+        source = cell_proto.get('source', '')
+        fname = os.path.join(session_dir, os.path.basename(source)) if session_dir else source
+        if not os.path.isfile(fname):
+            return None
+        if fname.endswith('.swc') or fname.endswith('.p'):
+            return read_morphology(fname)
+    return None
+
+#######################################################################
+# Chemistry
+#######################################################################
+
+def count_file_pools(fname):
+    """Number of pools in a kkit (.g) or SBML file."""
+    with open(fname, 'r', errors='replace') as f:
+        text = f.read()
+    if fname.endswith('.g'):
+        return len(re.findall(r'^\s*simundump\s+kpool\b', text, re.MULTILINE))
+    return len(re.findall(r'<species\b', text))
+
+
+_builtin_pool_cache = {}
+
+def count_builtin_pools(source, protos_dir=_JARDESIGNER_DIR):
+    """Number of pools made by a builtin chem prototype function such as
+    'makeChemOscillator()'. Counts moose.Pool and moose.BufPool calls in
+    the function, or the pools in the kkit file it loads."""
+    func_name = source.split('(')[0].strip()
+    if func_name in _builtin_pool_cache:
+        return _builtin_pool_cache[func_name]
+    count = None
+    try:
+        with open(os.path.join(protos_dir, 'jardesignerProtos.py'), 'r') as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        tree = None
+    for node in (tree.body if tree else []):
+        if not isinstance(node, ast.FunctionDef) or node.name != func_name:
+            continue
+        count = 0
+        for call in ast.walk(node):
+            if not isinstance(call, ast.Call):
+                continue
+            fn = call.func
+            if isinstance(fn, ast.Attribute) and fn.attr in ('Pool', 'BufPool'):
+                count += 1
+            elif isinstance(fn, ast.Name) and fn.id == 'makeChemProtoFromFile' and call.args \
+                    and isinstance(call.args[0], ast.Constant):
+                gfile = os.path.join(protos_dir, 'CHEM_MODELS', call.args[0].value + '.g')
+                if os.path.isfile(gfile):
+                    count += count_file_pools(gfile)
+        break
+    _builtin_pool_cache[func_name] = count
+    return count
+
+
+def proto_pools(chem_proto, session_dir=None):
+    """Returns {protoName: numPools}, with None where unknown."""
+    ret = {}
+    for cp in chem_proto or []:
+        ctype = cp.get('type')
+        source = cp.get('source', '')
+        count = None
+        if ctype == 'builtin':
+            count = count_builtin_pools(source)
+        elif ctype in ('kkit', 'sbml'):
+            fname = os.path.join(session_dir, os.path.basename(source)) if session_dir else source
+            if os.path.isfile(fname):
+                count = count_file_pools(fname)
+        ret[cp.get('name')] = count
+    return ret
+
+#######################################################################
+# Estimate
+#######################################################################
+
+def estimate_config_cost(config, session_dir=None, num_models=1):
+    """Returns a dict with counts, projected memory (bytes) and run time
+    (seconds) for a jardesigner config, and a list of warnings. Counts
+    that cannot be determined without building the model are left out
+    of the totals and noted in 'unknown'."""
+    cfg = dict(_DEFAULTS)
+    cfg.update({k: v for k, v in config.items() if k in _DEFAULTS})
+    runtime = _num(cfg['runtime'], _DEFAULTS['runtime'])
+    elec_dt = _num(cfg['elecDt'], _DEFAULTS['elecDt'])
+    chem_dt = _num(cfg['chemDt'], _DEFAULTS['chemDt'])
+    warnings = []
+    unknown = []
+
+    compts = cell_compartments(config.get('cellProto'), session_dir)
+    if compts is None:
+        unknown.append('cellProto')
+        compts = []
+
+    # Spines: each adds a shaft and a head compartment.
+    spines_per_compt = {}
+    for sd in config.get('spineDistrib', []):
+        spacing = _num(sd.get('spacing'), _DEFAULT_SPINE_SPACING)
+        if spacing <= 0:
+            continue
+        for cc in _matching(compts, sd.get('path', '')):
+            spines_per_compt[cc.name] = spines_per_compt.get(cc.name, 0) + cc.length / spacing
+    num_spines = int(round(sum(spines_per_compt.values())))
+
+    num_chans = 0
+    for cd in config.get('chanDistrib', []):
+        num_chans += len(_matching(compts, cd.get('path', '')))
+
+    # Chem voxels and pool-voxels.
+    diffusion_length = _num(cfg['diffusionLength'], _DEFAULTS['diffusionLength'])
+    pools = proto_pools(config.get('chemProto'), session_dir)
+    num_voxels = 0
+    pool_voxels = 0
+    voxels_per_compt = {}
+    for cd in config.get('chemDistrib', []):
+        ctype = cd.get('type')
+        matched = _matching(compts, cd.get('path', ''))
+        if ctype == 'dend':
+            dx = _num(cd.get('diffusionLength'), diffusion_length)
+            if dx < _MIN_DIFFUSION_LENGTH:
+                warnings.append('chemDistrib {}: diffusionLength {:g} m is below {:g} m; '
+                    'this makes very many voxels.'.format(cd.get('proto'), dx, _MIN_DIFFUSION_LENGTH))
+            nv = 0
+            for cc in matched:
+                vv = max(1, int(math.ceil(cc.length / dx))) if dx > 0 else 1
+                voxels_per_compt[cc.name] = voxels_per_compt.get(cc.name, 0) + vv
+                nv += vv
+        elif ctype in ('spine', 'psd', 'presyn_spine'):
+            nv = num_spines
+        elif ctype in ('presyn_dend', 'endo'):
+            spacing = _num(cd.get('spacing'), _DEFAULT_SPINE_SPACING)
+            nv = int(sum(cc.length for cc in matched) / spacing) if spacing > 0 else 0
+        else:
+            nv = 0
+        num_voxels += nv
+        npools = pools.get(cd.get('proto'))
+        if npools is None:
+            unknown.append('chemProto ' + str(cd.get('proto')))
+        else:
+            pool_voxels += npools * nv
+
+    num_compts = len(compts) + 2 * num_spines
+    if config.get('turnOffElec'):
+        elec_steps = 0
+    else:
+        elec_steps = runtime / elec_dt if elec_dt > 0 else 0
+    chem_steps = runtime / chem_dt if chem_dt > 0 and pool_voxels else 0
+
+    # Plots
+    plot_tables = 0
+    plot_samples = 0
+    for pp in config.get('plots', []):
+        field = pp.get('field', '')
+        path = pp.get('path', '')
+        is_chem = field in _CHEM_FIELDS
+        plot_dt = _num(cfg['chemPlotDt'] if is_chem else cfg['elecPlotDt'], 0)
+        sim_dt = chem_dt if is_chem else elec_dt
+        if is_chem:
+            nobj = sum(v for k, v in voxels_per_compt.items() if _matches(path, k)) \
+                if '[]' in pp.get('relpath', '') else len(_matching(compts, path))
+        else:
+            nobj = len(_matching(compts, path))
+            if _matches(path, 'head') or _matches(path, 'shaft'):
+                nobj += num_spines
+        if pp.get('mode') == 'space' or pp.get('mode') == 'wave':
+            nobj = 1 if nobj else 0
+        if plot_dt <= 0 or nobj == 0:
+            continue
+        samples = runtime / plot_dt
+        if plot_dt < sim_dt:
+            warnings.append('Plot of {} {}: plot dt {:g} s is smaller than the {} dt {:g} s.'.format(
+                path, field, plot_dt, 'chem' if is_chem else 'elec', sim_dt))
+        if samples > _MAX_SAMPLES_PER_TABLE:
+            warnings.append('Plot of {} {}: {:.3g} samples per trace over a {:g} s run.'.format(
+                path, field, samples, runtime))
+        plot_tables += nobj
+        plot_samples += nobj * samples
+
+    # 3-D views stream frames to the GUI rather than keeping them.
+    moogli_frames = 0
+    moogli_values = 0
+    display = config.get('displayMoogli') or {}
+    for mm in config.get('moogli', []):
+        dt = _num(mm.get('dt', display.get('dt')), _DEFAULT_MOOGLI_DT)
+        if dt <= 0:
+            continue
+        frames = runtime / dt
+        moogli_frames = max(moogli_frames, frames)
+        moogli_values += frames * len(_matching(compts, mm.get('path', '')))
+    if moogli_frames > _MAX_MOOGLI_FRAMES:
+        warnings.append('3-D display: {:.3g} frames over a {:g} s run.'.format(moogli_frames, runtime))
+
+    plot_bytes = plot_samples * _SAMPLE_BYTES * num_models
+    model_bytes = num_compts * _COMPT_BYTES + num_chans * _CHAN_BYTES + \
+        pool_voxels * _POOL_VOXEL_BYTES
+    memory = _BASE_PROCESS_BYTES + num_models * model_bytes + plot_bytes
+    chem_cost = _POOL_VOXEL_STEP_SEC * (_GSSA_FACTOR if config.get('useGssa') else 1.0)
+    run_sec = num_models * (
+        elec_steps * (num_compts * _COMPT_STEP_SEC + num_chans * _CHAN_STEP_SEC) +
+        chem_steps * pool_voxels * chem_cost +
+        plot_samples * _SAMPLE_SEC)
+
+    if plot_bytes > _MAX_PLOT_BYTES:
+        warnings.append('Plots will hold about {:.3g} GB of data.'.format(plot_bytes / 1e9))
+    if memory > _MAX_MEMORY_BYTES:
+        warnings.append('Estimated memory use is {:.3g} GB.'.format(memory / 1e9))
+    if run_sec > _MAX_RUNTIME_SEC:
+        warnings.append('Estimated run time is {:.3g} hours.'.format(run_sec / 3600))
+
+    return {
+        'numModels': num_models,
+        'compartments': num_compts,
+        'spines': num_spines,
+        'channels': num_chans,
+        'chemVoxels': num_voxels,
+        'poolVoxels': pool_voxels,
+        'elecSteps': elec_steps,
+        'chemSteps': chem_steps,
+        'plotTables': plot_tables * num_models,
+        'plotSamples': plot_samples * num_models,
+        'moogliFrames': moogli_frames,
+        'moogliValues': moogli_values,
+        'memoryBytes': memory,
+        'runtimeSec': run_sec,
+        'unknown': sorted(set(unknown)),
+        'warnings': warnings,
+    }
@@ -0,0 +1,226 @@
+"""
+Morphology geometry read directly from SWC and GENESIS .p files.
+
+The readers keep the full geometry: the parent of each segment, its
+proximal and distal points and its diameter. cost_estimator uses the
+same segments, through their name and length. Compartment
+names follow the MOOSE loaders, so they match the paths used in
+jardesigner configs. Coordinates and diameters are in metres.
+"""
+import math
+
+# swcType codes used by the 3D viewer.
+_SWC_TYPE_CODES = {'soma': 1, 'axon': 2, 'dend': 3, 'apical': 4, 'custom': 5}
+_PREVIEW_PRECISION = 8  # decimal places of metres kept in previews (10 nm)
+
+SWC_TYPE_NAMES = {1: 'soma', 2: 'axon', 3: 'dend', 4: 'apical'}
+DENDRITE_KINDS = ('dend', 'apical')
+
+
+class Segment:
+    __slots__ = ('name', 'parent', 'kind', 'x0', 'y0', 'z0', 'x', 'y', 'z', 'dia')
+
+    def __init__(self, name, parent, kind, p0, p1, dia):
+        self.name = name
+        self.parent = parent
+        self.kind = kind
+        self.x0, self.y0, self.z0 = p0
+        self.x, self.y, self.z = p1
+        self.dia = dia
+
+    @property
+    def length(self):
+        return math.dist((self.x0, self.y0, self.z0), (self.x, self.y, self.z))
+
+
+def read_swc(fname):
+    """Returns the segments of an SWC file. Soma points are merged into a
+    single 'soma' segment, as the MOOSE loader does; it is centred on the
+    first soma point with that point's diameter."""
+    points = {}     # SWC index → (point, name of its segment)
+    segs = []
+    soma = None
+    with open(fname, 'r', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) < 7:
+                continue
+            try:
+                idx = int(fields[0])
+                stype = int(float(fields[1]))
+                pt = tuple(float(v) * 1e-6 for v in fields[2:5])
+                radius = float(fields[5]) * 1e-6
+                parent = int(float(fields[6]))
+            except ValueError:
+                continue
+            if stype == 1:
+                if soma is None:
+                    soma = Segment('soma', None, 'soma', pt, pt, 2 * radius)
+                    segs.insert(0, soma)
+                points[idx] = (pt, 'soma')
+                continue
+            kind = SWC_TYPE_NAMES.get(stype, 'custom')
+            name = '{}_{}'.format(kind, idx)
+            pp, pname = points.get(parent, (pt, None))
+            segs.append(Segment(name, pname, kind, pp, pt, 2 * radius))
+            points[idx] = (pt, name)
+    return segs
+
+
+def _dotp_kind(name):
+    lower = name.lower()
+    for kind in ('soma', 'axon', 'apical', 'dend'):
+        if kind in lower:
+            return kind
+    return 'dend'
+
+
+def read_dotp(fname):
+    """Returns the segments of a GENESIS .p file. Handles the *relative,
+    *absolute, *cartesian and *polar directives. Polar segments are laid
+    out along their stated angles from the parent's end."""
+    segs = []
+    ends = {}       # segment name → distal point
+    relative = False
+    polar = False
+    with open(fname, 'r', errors='replace') as f:
+        for line in f:
+            line = line.split('//')[0].strip()
+            if not line:
+                continue
+            if line.startswith('*'):
+                directive = line.split()[0]
+                if directive == '*relative':
+                    relative = True
+                elif directive == '*absolute':
+                    relative = False
+                elif directive == '*polar':
+                    polar = True
+                elif directive == '*cartesian':
+                    polar = False
+                continue
+            fields = line.split()
+            if len(fields) < 6:
+                continue
+            try:
+                a, b, c, dia = (float(v) for v in fields[2:6])
+            except ValueError:
+                continue
+            name, parent = fields[0], fields[1]
+            base = ends.get(parent, (0.0, 0.0, 0.0))
+            dia *= 1e-6
+            if polar:
+                # a is the length in microns; b and c are theta and phi, in degrees.
+                a *= 1e-6
+                theta, phi = math.radians(b), math.radians(c)
+                d = (a * math.sin(phi) * math.cos(theta),
+                     a * math.sin(phi) * math.sin(theta), a * math.cos(phi))
+                end = (base[0] + d[0], base[1] + d[1], base[2] + d[2])
+            elif relative or parent not in ends:
+                end = (base[0] + a * 1e-6, base[1] + b * 1e-6, base[2] + c * 1e-6)
+            else:
+                end = (a * 1e-6, b * 1e-6, c * 1e-6)
+            segs.append(Segment(name, parent if parent in ends else None,
+                                _dotp_kind(name), base, end, dia))
+            ends[name] = end
+    return segs
+
+
+def read_morphology(fname):
+    """Reads an SWC or .p file, chosen by extension."""
+    if fname.lower().endswith('.p'):
+        return read_dotp(fname)
+    return read_swc(fname)
+
+
+def morphology_stats(segs, diffusion_length):
+    """Returns the counts and lengths the proto picker and the scheduler
+    use. Voxel counts are for chem distributed over the dendrites, or over
+    every compartment, at the given diffusionLength."""
+    children = {}
+    for seg in segs:
+        children[seg.parent] = children.get(seg.parent, 0) + 1
+    branch_points = sum(1 for seg in segs if children.get(seg.name, 0) >= 2)
+    tips = sum(1 for seg in segs if seg.name not in children)
+    # An unbranched branch starts at each child of the root, of the soma
+    # or of a branch point.
+    branches = sum(1 for seg in segs if seg.kind != 'soma' and (
+        seg.parent is None or seg.parent == 'soma' or children.get(seg.parent, 0) >= 2))
+
+    def voxels(kinds=None):
+        return sum(max(1, int(math.ceil(seg.length / diffusion_length)))
+                   for seg in segs if kinds is None or seg.kind in kinds)
+
+    lengths = {}
+    for seg in segs:
+        lengths[seg.kind] = lengths.get(seg.kind, 0.0) + seg.length
+    xs = [v for seg in segs for v in (seg.x0, seg.x)] or [0.0]
+    ys = [v for seg in segs for v in (seg.y0, seg.y)] or [0.0]
+    zs = [v for seg in segs for v in (seg.z0, seg.z)] or [0.0]
+    return {
+        'numCompartments': len(segs),
+        'numBranches': branches,
+        'numBranchPoints': branch_points,
+        'numTips': tips,
+        'dendriticLength': sum(lengths.get(k, 0.0) for k in DENDRITE_KINDS),
+        'axonLength': lengths.get('axon', 0.0),
+        'totalLength': sum(lengths.values()),
+        'compartmentKinds': sorted(lengths),
+        'extent': [max(xs) - min(xs), max(ys) - min(ys), max(zs) - min(zs)],
+        'dendVoxels': voxels(DENDRITE_KINDS),
+        'voxels': voxels(),
+    }
+
+
+def preview_scene_graph(segs, title='Elec compartments'):
+    """Builds a jardesignerSceneGraph for the morphology, in the form that
+    jarmoogli sends for the setup view: the soma as a sphere at its
+    midpoint and every other compartment as a cylinder."""
+    def r(v):
+        return round(v, _PREVIEW_PRECISION)
+
+    shapes = []
+    for idx, seg in enumerate(segs):
+        c2 = [r(seg.x), r(seg.y), r(seg.z)]
+        if seg.kind == 'soma':
+            mid = [r((seg.x0 + seg.x) / 2), r((seg.y0 + seg.y) / 2), r((seg.z0 + seg.z) / 2)]
+            shape, c1, c2 = 'sphere', mid, mid
+        else:
+            shape, c1 = 'cylinder', [r(seg.x0), r(seg.y0), r(seg.z0)]
+        shapes.append({'type': shape, 'C': c1, 'C2': c2, 'diameter': r(seg.dia),
+                       'value': -0.1, 'swcType': _SWC_TYPE_CODES.get(seg.kind, 5),
+                       'shapeIdx': idx, 'simId': idx, 'simPath': seg.name})
+    n = max(1, len(segs))
+    center = [r(sum(s.x for s in segs) / n), r(sum(s.y for s in segs) / n),
+              r(sum(s.z for s in segs) / n)]
+    return {
+        'filetype': 'jardesignerSceneGraph',
+        'version': '1.0',
+        'wallClockDt': 1000,
+        'runtime': 0.01,
+        'rotation': 0.0,
+        'azim': 0,
+        'elev': 0,
+        'mergeDisplays': True,
+        'colormap': 'jet',
+        'bg': 'white',
+        'block': True,
+        'fullscreen': False,
+        'center': center,
+        'drawables': [{
+            'title': title,
+            'groupId': 'compt_Vm_0',
+            'dataType': 'Memb. Potential',
+            'dataUnits': 'mV',
+            'vmin': -80.0,
+            'vmax': 40.0,
+            'dt': 0.001,
+            'transparency': 0.5,
+            'diaScale': 1.0,
+            'visible': True,
+            'shape': shapes,
+        }],
+    }
@@ -0,0 +1,166 @@
+"""
+In-memory index of the prototype registries.
+
+Each <type>_protos.json in the registry directory is parsed once and kept
+with an id → item map, a digest of the items without their details, and
+an inverted index from tokens of the name, description and source to the
+items that contain them. A file is re-read when its mtime or size
+changes, checked at most once per CHECK_INTERVAL, so edits to the
+registry show up without a server restart. Model metadata written by
+registry_indexer.py to <type>_meta.json is merged into the digest as
+each item's 'metadata', and is reloaded in the same way.
+
+Search matches every query token against whole index tokens or, failing
+that, token prefixes, so "pyr" finds "pyramidal". Matches in the name
+count for more than matches in the source or description, and exact
+tokens for more than prefixes. Results are returned a page at a time.
+"""
+import os
+import re
+import json
+import time
+import bisect
+import threading
+
+PROTO_TYPES = ('morpho', 'chan', 'chem')
+CHECK_INTERVAL = 2.0    # seconds between mtime checks of a registry file
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+META_SUFFIX = '_meta.json'
+_FIELD_WEIGHTS = {'name': 4.0, 'source': 1.5, 'description': 1.0}
+_PREFIX_FACTOR = 0.5    # a prefix match counts this much of an exact one
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class _Registry:
+    """One parsed registry file."""
+
+    def __init__(self, path, stamp, data, meta=None):
+        self.path = path
+        self.stamp = stamp
+        self.type = data.get('type')
+        items = data.get('items', [])
+        meta = meta or {}
+        # Top-ten items first, otherwise in file order.
+        self.items = sorted(items, key=lambda it: not it.get('topTen'))
+        self.by_id = {it.get('id'): it for it in self.items}
+        self.digest = []
+        for it in self.items:
+            summary = {k: v for k, v in it.items() if k != 'details'}
+            if it.get('id') in meta:
+                summary['metadata'] = meta[it.get('id')].get('metadata')
+            self.digest.append(summary)
+        self.postings = {}      # token → {item position: weight}
+        for pos, it in enumerate(self.items):
+            for field, weight in _FIELD_WEIGHTS.items():
+                for tok in set(tokenize(it.get(field, ''))):
+                    entry = self.postings.setdefault(tok, {})
+                    entry[pos] = max(entry.get(pos, 0.0), weight)
+        self.tokens = sorted(self.postings)
+
+    def _match(self, qtok):
+        """Returns {position: score} for items matching one query token."""
+        scores = dict(self.postings.get(qtok, {}))
+        i = bisect.bisect_left(self.tokens, qtok)
+        while i < len(self.tokens) and self.tokens[i].startswith(qtok):
+            tok = self.tokens[i]
+            i += 1
+            if tok == qtok:
+                continue
+            for pos, w in self.postings[tok].items():
+                s = w * _PREFIX_FACTOR
+                if s > scores.get(pos, 0.0):
+                    scores[pos] = s
+        return scores
+
+    def search(self, query):
+        """Returns digest entries for items matching all query tokens,
+        best first."""
+        qtoks = tokenize(query)
+        if not qtoks:
+            return list(self.digest)
+        total = None
+        for qtok in qtoks:
+            scores = self._match(qtok)
+            if total is None:
+                total = scores
+            else:
+                total = {pos: s + scores[pos] for pos, s in total.items() if pos in scores}
+            if not total:
+                return []
+        # Ties go to top-ten items, then to file order.
+        ranked = sorted(total, key=lambda pos: (-total[pos], pos))
+        return [self.digest[pos] for pos in ranked]
+
+
+class ProtoIndex:
+    def __init__(self, registry_dir):
+        self.registry_dir = registry_dir
+        self._registries = {}   # proto type → _Registry
+        self._checked = {}      # proto type → time of the last mtime check
+        self._lock = threading.Lock()
+
+    def _path(self, proto_type):
+        return os.path.join(self.registry_dir, f'{proto_type}_protos.json')
+
+    def _load_meta(self, proto_type):
+        try:
+            with open(os.path.join(self.registry_dir, proto_type + META_SUFFIX), 'r') as f:
+                return json.load(f).get('items', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _stamp(self, proto_type):
+        st = os.stat(self._path(proto_type))
+        try:
+            mt = os.stat(os.path.join(self.registry_dir, proto_type + META_SUFFIX))
+            meta_stamp = (mt.st_mtime_ns, mt.st_size)
+        except OSError:
+            meta_stamp = None
+        return (st.st_mtime_ns, st.st_size, meta_stamp)
+
+    def get(self, proto_type):
+        """Returns the current _Registry for proto_type, or None."""
+        now = time.monotonic()
+        reg = self._registries.get(proto_type)
+        if reg is not None and now - self._checked.get(proto_type, 0.0) < CHECK_INTERVAL:
+            return reg
+        with self._lock:
+            self._checked[proto_type] = now
+            path = self._path(proto_type)
+            try:
+                stamp = self._stamp(proto_type)
+            except OSError:
+                self._registries.pop(proto_type, None)
+                return None
+            reg = self._registries.get(proto_type)
+            if reg is None or reg.stamp != stamp:
+                try:
+                    with open(path, 'r') as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Failed to load proto registry {path}: {e}")
+                    return reg  # Keep serving the last good copy.
+                reg = self._registries[proto_type] = _Registry(
+                    path, stamp, data, self._load_meta(proto_type))
+            return reg
+
+    def find(self, proto_id):
+        """Returns the item with proto_id from any registry, or None."""
+        for proto_type in PROTO_TYPES:
+            reg = self.get(proto_type)
+            if reg is not None and proto_id in reg.by_id:
+                return reg.by_id[proto_id]
+        return None
+
+
+def paginate(entries, offset, limit):
+    """Returns the response body for one page of entries."""
+    offset = max(0, offset)
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    return {'items': entries[offset:offset + limit], 'total': len(entries),
+            'offset': offset, 'limit': limit}
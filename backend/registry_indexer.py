@@ -0,0 +1,284 @@
+"""
+Offline indexer for the prototype registries.
+
+For each entry in proto_registry/<type>_protos.json this loads the model
+the entry refers to, without MOOSE, and records the numbers the proto
+picker and the scheduler need: compartment and branch counts, dendritic
+length and voxel counts for morphologies, and pool, reaction and
+compartment counts for chemistry. Results go to <type>_meta.json next to
+the registry, which the server merges into the items it serves. For each
+morphology it also writes a gzipped preview scene graph to previews/,
+which the server sends from /proto_preview/<id> in place of a MOOSE run.
+
+Each result is stored with the SHA-256 of the file it came from, and an
+entry is only indexed again when that hash changes. Entries are indexed
+in a process pool. Run from the backend directory:
+
+    python registry_indexer.py [--workers N] [--force]
+"""
+import os
+import re
+import ast
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from morphology import read_morphology, morphology_stats, preview_scene_graph
+from proto_index import PROTO_TYPES, META_SUFFIX
+
+INDEX_VERSION = 1       # Bump when the metadata format changes.
+DEFAULT_DIFFUSION_LENGTH = 2e-6     # From jardesignerSchema.json
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+REGISTRY_DIR = os.path.join(BASE_DIR, 'proto_registry')
+JARDESIGNER_DIR = os.path.normpath(os.path.join(BASE_DIR, '..', 'jardesigner'))
+PROTOS_FILE = os.path.join(JARDESIGNER_DIR, 'jardesignerProtos.py')
+
+PREVIEW_DIR_NAME = 'previews'
+MORPHOLOGY_EXTENSIONS = ('.swc', '.p')
+
+_MESH_CLASSES = {'CubeMesh', 'CylMesh', 'NeuroMesh', 'SpineMesh', 'PsdMesh',
+                 'EndoMesh', 'PresynMesh'}
+
+
+def meta_path(registry_dir, proto_type):
+    return os.path.join(registry_dir, proto_type + META_SUFFIX)
+
+
+def preview_path(registry_dir, proto_id):
+    safe = re.sub(r'[^A-Za-z0-9_.-]', '_', proto_id)
+    return os.path.join(registry_dir, PREVIEW_DIR_NAME, safe + '.json.gz')
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for buf in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(buf)
+    return h.hexdigest()
+
+
+#######################################################################
+# Chemistry
+#######################################################################
+
+def kkit_stats(fname):
+    with open(fname, 'r', errors='replace') as f:
+        text = f.read()
+
+    def count(kind):
+        return len(re.findall(r'^\s*simundump\s+{}\b'.format(kind), text, re.MULTILINE))
+    groups = re.findall(r'^\s*simundump\s+group\s+/kinetics/([^/\s]+)\s', text, re.MULTILINE)
+    return {
+        'numPools': count('kpool'),
+        'numReactions': count('kreac'),
+        'numEnzymes': count('kenz'),
+        'numCompartments': max(1, count('geometry')),
+        'groups': sorted(set(groups)),
+    }
+
+
+def sbml_stats(fname):
+    with open(fname, 'r', errors='replace') as f:
+        text = f.read()
+    return {
+        'numPools': len(re.findall(r'<species\b', text)),
+        'numReactions': len(re.findall(r'<reaction\b', text)),
+        'numEnzymes': 0,
+        'numCompartments': len(re.findall(r'<compartment\b', text)),
+        'compartmentNames': re.findall(r'<compartment\b[^>]*\bid="([^"]+)"', text),
+    }
+
+
+def _builtin_function(fn_name):
+    """Returns the ast of a function in jardesignerProtos.py, or None."""
+    try:
+        with open(PROTOS_FILE, 'r') as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == fn_name:
+            return node
+    return None
+
+
+def builtin_chem_file(fn_name):
+    """If a builtin chem proto just loads a kkit file, returns its path."""
+    node = _builtin_function(fn_name)
+    for call in ast.walk(node) if node else []:
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) \
+                and call.func.id == 'makeChemProtoFromFile' and call.args \
+                and isinstance(call.args[0], ast.Constant):
+            path = os.path.join(JARDESIGNER_DIR, 'CHEM_MODELS', call.args[0].value + '.g')
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def builtin_chem_stats(fn_name):
+    """Counts the MOOSE objects a builtin chem proto function makes."""
+    node = _builtin_function(fn_name)
+    if node is None:
+        return None
+    counts = {'numPools': 0, 'numReactions': 0, 'numEnzymes': 0, 'numCompartments': 0}
+    for call in ast.walk(node):
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Attribute):
+            continue
+        attr = call.func.attr
+        if attr in ('Pool', 'BufPool'):
+            counts['numPools'] += 1
+        elif attr == 'Reac':
+            counts['numReactions'] += 1
+        elif attr in ('Enz', 'MMenz'):
+            counts['numEnzymes'] += 1
+        elif attr in _MESH_CLASSES:
+            counts['numCompartments'] += 1
+    return counts
+
+
+#######################################################################
+# Indexing
+#######################################################################
+
+def resolve_source(item, proto_type):
+    """Returns (path, builtin function name) for the model behind an
+    entry; either may be None. Returns (None, None) if there is nothing
+    to index."""
+    server_file = item.get('server_file')
+    if server_file:
+        path = os.path.join(BASE_DIR, server_file)
+        return (path if os.path.isfile(path) else None), None
+    fn = (item.get('builtin_fn') or '').split('(')[0].strip()
+    if proto_type == 'chem' and item.get('source_type') == 'builtin' and fn:
+        path = builtin_chem_file(fn)
+        return (path, None) if path else (PROTOS_FILE, fn)
+    return None, None
+
+
+def name_patterns(segs):
+    """Compartment names as wildcard paths, e.g. ['apical#', 'dend#', 'soma']."""
+    ret = set()
+    for seg in segs:
+        stem = re.sub(r'[\d_\[\]]+$', '', seg.name)
+        ret.add(stem if stem == seg.name else stem + '#')
+    return sorted(ret)
+
+
+def write_preview(segs, out_path):
+    """Writes the preview scene graph of a morphology, gzipped."""
+    body = json.dumps(preview_scene_graph(segs), separators=(',', ':')).encode()
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(out_path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(gzip.compress(body, mtime=0))
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, out_path)
+
+
+def index_entry(path, fn_name, diffusion_length, preview_out=None):
+    """Worker: returns the metadata for one model file or builtin, and
+    writes the preview of a morphology to preview_out if given."""
+    if fn_name:
+        return builtin_chem_stats(fn_name)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in MORPHOLOGY_EXTENSIONS:
+        segs = read_morphology(path)
+        ret = morphology_stats(segs, diffusion_length)
+        ret['compartmentNames'] = name_patterns(segs)
+        ret['diffusionLength'] = diffusion_length
+        if preview_out:
+            write_preview(segs, preview_out)
+        return ret
+    if ext == '.g':
+        return kkit_stats(path)
+    if ext in ('.xml', '.sbml'):
+        return sbml_stats(path)
+    return None
+
+
+def _load_meta(fname):
+    try:
+        with open(fname, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != INDEX_VERSION:
+        return {}
+    return data.get('items', {})
+
+
+def _write_json(fname, data):
+    tmp = fname + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, fname)
+
+
+def index_registry(proto_type, registry_dir=REGISTRY_DIR, workers=None, force=False,
+                   diffusion_length=DEFAULT_DIFFUSION_LENGTH, log=print):
+    """Brings <proto_type>_meta.json up to date. Returns (indexed, kept)."""
+    reg_file = os.path.join(registry_dir, f'{proto_type}_protos.json')
+    if not os.path.isfile(reg_file):
+        return 0, 0
+    with open(reg_file, 'r') as f:
+        items = json.load(f).get('items', [])
+    out_file = meta_path(registry_dir, proto_type)
+    old = {} if force else _load_meta(out_file)
+    meta = {}
+    todo = {}       # id → (hash, path, fn, preview path)
+    for item in items:
+        proto_id = item.get('id')
+        path, fn = resolve_source(item, proto_type)
+        if proto_id is None or path is None:
+            continue
+        key = '{}:{}:{}:{!r}'.format(file_digest(path), fn or '', INDEX_VERSION, diffusion_length)
+        preview = None
+        if path.lower().endswith(MORPHOLOGY_EXTENSIONS):
+            preview = preview_path(registry_dir, proto_id)
+        prev = old.get(proto_id)
+        if prev and prev.get('hash') == key and (preview is None or os.path.isfile(preview)):
+            meta[proto_id] = prev
+        else:
+            todo[proto_id] = (key, path, fn, preview)
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {proto_id: pool.submit(index_entry, path, fn, diffusion_length, preview)
+                       for proto_id, (key, path, fn, preview) in todo.items()}
+            for proto_id, fut in futures.items():
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    log(f'{proto_type}/{proto_id}: failed: {e}')
+                    continue
+                if result is not None:
+                    meta[proto_id] = {'hash': todo[proto_id][0], 'metadata': result}
+                    log(f'{proto_type}/{proto_id}: indexed')
+    if todo or set(meta) != set(old):
+        _write_json(out_file, {'version': INDEX_VERSION, 'items': meta})
+    return len(todo), len(meta) - len(todo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Index the jardesigner prototype registries.')
+    parser.add_argument('--registry', default=REGISTRY_DIR, help='Registry directory.')
+    parser.add_argument('--types', nargs='+', default=list(PROTO_TYPES), choices=PROTO_TYPES)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count).')
+    parser.add_argument('--force', action='store_true', help='Re-index every entry.')
+    parser.add_argument('--diffusion-length', type=float, default=DEFAULT_DIFFUSION_LENGTH,
+                        help='diffusionLength in metres used for voxel counts.')
+    args = parser.parse_args(argv)
+    for proto_type in args.types:
+        indexed, kept = index_registry(proto_type, args.registry, args.workers, args.force,
+                                       args.diffusion_length)
+        print(f'{proto_type}: {indexed} indexed, {kept} unchanged')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 import os
 import sys
 import subprocess
@@ -9,22 +10,55 @@ import time
 import threading
 import shutil
 import zipfile
+import io
 import re
 import secrets
-from flask import Flask, request, jsonify, send_from_directory, send_file, after_this_request
+import itertools
+import hashlib
+import gzip
+import collections
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, join_room, leave_room, emit as sock_emit
 from werkzeug.utils import secure_filename
+from cost_estimator import estimate_config_cost
+import server_metrics as metrics
+from blob_store import BlobStore, BlobMissing, is_digest
+from proto_index import ProtoIndex, PROTO_TYPES, DEFAULT_PAGE_SIZE, paginate
+from morphology import read_morphology
+from registry_indexer import preview_path, write_preview, MORPHOLOGY_EXTENSIONS
+from chunked_upload import UploadManager, UploadError, UploadClosed, DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
 
 # --- Configuration ---
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 USER_UPLOADS_DIR = os.path.join(BASE_DIR, 'user_uploads')
+# Uploaded and staged model files are stored once here, by SHA-256, and
+# hardlinked into the sessions that use them.
+BLOB_STORE_DIR = os.environ.get('JARDES_BLOB_STORE_DIR', os.path.join(BASE_DIR, 'blob_store'))
 
 # Secret shared with simulation subprocesses; never exposed to clients.
 _INTERNAL_SECRET = secrets.token_hex(32)
 _LOOPBACK = {'127.0.0.1', '::1', '::ffff:127.0.0.1'}
 
 os.makedirs(USER_UPLOADS_DIR, exist_ok=True)
+blob_store = BlobStore(BLOB_STORE_DIR)
+# Large files may be sent in chunks that survive reconnects and restarts.
+MAX_UPLOAD_MB = float(os.environ.get('JARDES_MAX_UPLOAD_MB', 2048))
+upload_manager = UploadManager(blob_store, os.path.join(BLOB_STORE_DIR, 'uploads'),
+                               int(MAX_UPLOAD_MB * 1e6))
+
+# --- Admission control ---
+# Limits on concurrent simulation workers. Launches beyond these wait in
+# a priority queue; interactive runs go ahead of batch runs.
+MAX_RUNNING_SIMS = int(os.environ.get('JARDES_MAX_RUNNING_SIMS', os.cpu_count() or 4))
+MAX_RUNNING_PER_CLIENT = int(os.environ.get('JARDES_MAX_RUNNING_PER_CLIENT', 2))
+MAX_QUEUED_PER_CLIENT = int(os.environ.get('JARDES_MAX_QUEUED_PER_CLIENT', 4))
+_PRIORITY_RANK = {'interactive': 0, 'batch': 1}
+TRACE_FILENAME = 'jardes_trace.json'   # Written by jardesigner/jarTrace.py
+_DEFAULT_SIM_DURATION = 300.0   # seconds, used for ETAs until we have data
+# Upper bound on the summed estimated memory of running workers, in MB.
+# 0 means no limit. A single job larger than this is refused outright.
+MAX_SIM_MEMORY_MB = float(os.environ.get('JARDES_MAX_SIM_MEMORY_MB', 0))
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
@@ -38,73 +72,406 @@ running_processes = {}
 client_sim_map = {}
 sid_clientid_map = {}   # sid → client_id
 client_owner_map = {}   # client_id → (sid, session_token)
-
-def stream_printer(stream, pid, stream_name, emit_error_fn=None):
+job_queue = []          # queued jobs, sorted by (priority rank, seq)
+_job_seq = itertools.count()
+_sched_lock = threading.Lock()
+_recent_durations = collections.deque(maxlen=50)   # worker lifetimes, for ETAs
+_launch_times = {}      # data_channel_id → time of the launch request
+
+# --- Metrics, served in Prometheus text format from /metrics ---
+DISK_USAGE_TTL = 60.0   # seconds between scans of the session directories
+_disk_usage = {"bytes": 0.0, "time": 0.0, "scanning": False}
+
+def _disk_scan_done(result, error):
+    if error is None:
+        _disk_usage["bytes"] = result
+    _disk_usage["time"] = time.time()
+    _disk_usage["scanning"] = False
+
+def _session_disk_bytes():
+    # Scans run in the background; a scrape returns the last result.
+    if time.time() - _disk_usage["time"] > DISK_USAGE_TTL and not _disk_usage["scanning"]:
+        _disk_usage["scanning"] = True
+        run_supervised(metrics.dir_size, USER_UPLOADS_DIR, on_done=_disk_scan_done, blocking=True)
+    return _disk_usage["bytes"]
+
+def _worker_stats(index):
+    ret = {}
+    for pid, info in list(running_processes.items()):
+        if info["process"].poll() is None:
+            st = metrics.proc_stats(pid)
+            if st:
+                ret[(pid,)] = st[index]
+    return ret
+
+def _queued_by_priority():
+    ret = {(pri,): 0 for pri in _PRIORITY_RANK}
+    for job in list(job_queue):
+        ret[(job["priority"],)] += 1
+    return ret
+
+metrics.Gauge('jardes_simulations_running', 'Running simulation workers.',
+              lambda: _running_count())
+metrics.Gauge('jardes_simulations_queued', 'Simulations waiting for a slot.',
+              _queued_by_priority, labels=('priority',))
+metrics.Gauge('jardes_session_disk_bytes', 'Disk used by all session directories.',
+              _session_disk_bytes)
+metrics.Gauge('jardes_worker_cpu_seconds', 'CPU time used so far by each worker.',
+              lambda: _worker_stats(0), labels=('pid',))
+metrics.Gauge('jardes_worker_rss_bytes', 'Resident memory of each worker.',
+              lambda: _worker_stats(1), labels=('pid',))
+LAUNCH_LATENCY = metrics.Histogram(
+    'jardes_launch_latency_seconds', 'Time from launch request to the first scene graph.',
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600))
+PUSH_MESSAGES = metrics.Counter('jardes_push_messages_total',
+                                'Messages pushed by workers.', labels=('type',))
+PUSH_BYTES = metrics.Counter('jardes_push_bytes_total',
+                             'Bytes pushed by workers.', labels=('type',))
+EMIT_LATENCY = metrics.Histogram(
+    'jardes_socket_emit_seconds', 'Time taken by socket.io emits of pushed data.',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+UPLOADS = metrics.Counter('jardes_uploads_total',
+                          'Model files uploaded or staged, by whether the body was already stored.',
+                          labels=('result',))
+PROTO_REQUESTS = metrics.Counter('jardes_proto_registry_requests_total',
+                                 'Proto registry requests.', labels=('endpoint',))
+EVENT_LOOP_LAG = metrics.Histogram(
+    'jardes_event_loop_lag_seconds', 'Lateness of a 0.1 s green sleep on the server hub.',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+_event_loop_lag = {"last": 0.0, "max": 0.0}
+
+def _take_max_lag():
+    ret = _event_loop_lag["max"]
+    _event_loop_lag["max"] = _event_loop_lag["last"]
+    return ret
+
+metrics.Gauge('jardes_event_loop_lag_max_seconds', 'Largest event-loop lag since the last scrape.',
+              _take_max_lag)
+
+# --- Worker log capture ---
+# Every line a worker prints goes into a bounded per-worker ring buffer,
+# served by /sim_log/<pid>. Only a rate-limited sample reaches the server
+# console, so verbose workers cannot make the server CPU-bound on logging.
+LOG_RING_LINES = int(os.environ.get('JARDES_LOG_RING_LINES', 2000))
+LOG_CONSOLE_RATE = float(os.environ.get('JARDES_LOG_CONSOLE_RATE', 20))  # lines/s per worker
+LOG_SAMPLE_EVERY = 100      # Over the rate, print one line in this many.
+MAX_LOGGED_WORKERS = 200    # Logs of exited workers are kept until this many.
+# One pass over each line: JSON error records from the Python exception
+# handler, or "Error:" / "Err:" from MOOSE's C++ side.
+_ERROR_RE = re.compile(r'^\{.*"type"\s*:\s*"(?:sim_error|error|simulation_error)"|Error:|Err:')
+worker_logs = collections.OrderedDict()   # pid → {"client_id", "lines", "dropped"}
+
+class _ConsoleLimiter:
+    """Token bucket for console output, with sampling when over the rate."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.last = time.monotonic()
+        self.suppressed = 0
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.suppressed += 1
+        return self.suppressed % LOG_SAMPLE_EVERY == 0
+
+def _worker_log(pid, client_id):
+    log = worker_logs.get(pid)
+    if log is None:
+        log = worker_logs[pid] = {"client_id": client_id, "lines": collections.deque(maxlen=LOG_RING_LINES)}
+        while len(worker_logs) > MAX_LOGGED_WORKERS:
+            worker_logs.popitem(last=False)
+    return log
+
+def stream_printer(stream, pid, stream_name, emit_error_fn=None, client_id=None):
     """
     Reads a stream line-by-line.
-    1. Prints to console for debugging.
-    2. Parses JSON lines to relay specific events (errors) to the frontend.
-    3. Scans plain text for "Error:" to catch C++ backend errors.
+    1. Keeps every line in the worker's ring buffer.
+    2. Prints a rate-limited sample to the console for debugging.
+    3. Relays errors (JSON error records or MOOSE "Error:" lines) to the frontend.
     """
+    lines = _worker_log(pid, client_id)["lines"]
+    limiter = _ConsoleLimiter(LOG_CONSOLE_RATE)
     try:
         for line in iter(stream.readline, ''):
-            if line:
-                stripped_line = line.strip()
-                # DEBUG: Raw output
+            if not line:
+                continue
+            stripped_line = line.strip()
+            lines.append((time.time(), stream_name, stripped_line))
+            if limiter.allow():
                 print(f"[{pid}-{stream_name}] {stripped_line}")
-                
-                if emit_error_fn:
-                    # Case 1: JSON formatted errors (from Python exception handler)
-                    if stripped_line.startswith('{'):
-                        try:
-                            data = json.loads(stripped_line)
-                            msg_type = data.get("type")
-                            
-                            if msg_type in ["sim_error", "error", "simulation_error"]:
-                                #print(f"DEBUG: Triggering emit_error_fn for type '{msg_type}'")
-                                emit_error_fn(data)
-                        except json.JSONDecodeError:
-                            pass
-                    
-                    # Case 2: Plain text errors (from C++/MOOSE stdout)
-                    # Catches "Error:" or "Err:" patterns often used by MOOSE
-                    elif "Error:" in stripped_line or "Err:" in stripped_line:
-                        print(f"DEBUG: Detected plain text error in {stream_name}, probably MOOSE error")
-                        error_payload = {
-                            "type": "sim_error",
-                            "message": "Simulation Engine Error",
-                            "details": stripped_line
-                        }
-                        emit_error_fn(error_payload)
-                        
+
+            if emit_error_fn and _ERROR_RE.search(stripped_line):
+                if stripped_line.startswith('{'):
+                    try:
+                        data = json.loads(stripped_line)
+                        if data.get("type") in ("sim_error", "error", "simulation_error"):
+                            emit_error_fn(data)
+                    except (json.JSONDecodeError, AttributeError):
+                        pass
+                else:
+                    emit_error_fn({
+                        "type": "sim_error",
+                        "message": "Simulation Engine Error",
+                        "details": stripped_line
+                    })
         stream.close()
-        #print(f"Stream printer for PID {pid} ({stream_name}) has finished.")
+        if limiter.suppressed:
+            print(f"[{pid}-{stream_name}] {limiter.suppressed} lines not printed; see /sim_log/{pid}")
     except Exception as e:
         print(f"Error in stream printer for PID {pid} ({stream_name}): {e}")
 
 
-def terminate_process(pid):
-    """Safely terminates a running process and cleans up its entry."""
-    if pid in running_processes:
+# --- Supervisor ---
+# Termination, reaping, directory cleanup and archive building run off
+# the request path. Disk-bound work goes to eventlet's native thread pool
+# so that it cannot stall the hub; waits are green sleeps.
+TERMINATE_GRACE = 5.0   # seconds between SIGTERM and SIGKILL
+
+def run_supervised(fn, *args, on_done=None, blocking=False):
+    """Runs fn(*args) in a background task. Set blocking for calls that
+    would block the hub (file system work). on_done(result, error) is
+    called when it finishes."""
+    def _task():
+        result, error = None, None
         try:
-            proc_info = running_processes[pid]
-            if proc_info["process"].poll() is None:
-                print(f"Terminating process {pid}...")
-                proc_info["process"].terminate()
-                proc_info["process"].wait(timeout=5)
-                print(f"Process {pid} terminated.")
-            del running_processes[pid]
-            return True
+            result = tpool.execute(fn, *args) if blocking else fn(*args)
         except Exception as e:
-            print(f"Error during termination of PID {pid}: {e}")
-            if pid in running_processes:
-                del running_processes[pid]
-    return False
+            error = e
+            print(f"Supervisor task {getattr(fn, '__name__', fn)} failed: {e}")
+        if on_done:
+            on_done(result, error)
+    socketio.start_background_task(_task)
+
+def _reap_process(pid, process):
+    deadline = time.monotonic() + TERMINATE_GRACE
+    while process.poll() is None and time.monotonic() < deadline:
+        socketio.sleep(0.1)
+    if process.poll() is None:
+        print(f"Process {pid} ignored SIGTERM; killing it.")
+        process.kill()
+        while process.poll() is None:
+            socketio.sleep(0.1)
+    print(f"Process {pid} terminated.")
+
+def terminate_process(pid, on_done=None):
+    """Removes a worker from the table, freeing its slot, and terminates
+    it in the background. Returns False if pid is not a known worker."""
+    proc_info = running_processes.pop(pid, None)
+    if proc_info is None:
+        return False
+    process = proc_info["process"]
+    try:
+        if process.poll() is None:
+            print(f"Terminating process {pid}...")
+            process.terminate()
+            run_supervised(_reap_process, pid, process, on_done=on_done)
+        elif on_done:
+            on_done(None, None)
+    except Exception as e:
+        print(f"Error during termination of PID {pid}: {e}")
+    _dispatch_jobs()
+    return True
+
+def remove_session_dir(session_dir, on_done=None):
+    """Deletes a session directory in the background. It is renamed out
+    of the way first, so a client that reconnects at once starts afresh."""
+    if not os.path.exists(session_dir):
+        return
+    trash = os.path.join(USER_UPLOADS_DIR, f'.trash-{uuid.uuid4().hex}')
+    try:
+        os.rename(session_dir, trash)
+    except OSError as e:
+        print(f"Error moving session directory {session_dir}: {e}")
+        trash = session_dir
+    run_supervised(shutil.rmtree, trash, on_done=on_done, blocking=True)
+
+def _blob_gc_done(result, error):
+    if result and result[0]:
+        print(f"Blob store: removed {result[0]} unused files ({result[1] / 1e6:.1f} MB).")
+
+def _collect_storage():
+    upload_manager.expire()
+    return blob_store.gc()
+
+def collect_unused_blobs(_result=None, _error=None):
+    """Drops stored files that no session links to any more, and stale
+    partial uploads. Usable as the on_done callback of remove_session_dir."""
+    run_supervised(_collect_storage, on_done=_blob_gc_done, blocking=True)
+
+# Event-loop lag: how late a short green sleep wakes up. It stays near
+# zero as long as nothing blocks the hub.
+LAG_PROBE_INTERVAL = 0.1
+
+def _monitor_event_loop_lag():
+    while True:
+        t0 = time.monotonic()
+        socketio.sleep(LAG_PROBE_INTERVAL)
+        lag = max(time.monotonic() - t0 - LAG_PROBE_INTERVAL, 0.0)
+        EVENT_LOOP_LAG.observe(lag)
+        _event_loop_lag["last"] = lag
+        _event_loop_lag["max"] = max(_event_loop_lag["max"], lag)
+
+def _running_count(client_id=None):
+    return sum(1 for info in list(running_processes.values())
+               if info["process"].poll() is None
+               and (client_id is None or info["client_id"] == client_id))
+
+def _running_memory():
+    return sum((info.get("cost") or {}).get("memoryBytes", 0)
+               for info in list(running_processes.values())
+               if info["process"].poll() is None)
+
+def _fits_memory(job):
+    if MAX_SIM_MEMORY_MB <= 0:
+        return True
+    need = (job.get("cost") or {}).get("memoryBytes", 0)
+    return _running_memory() + need <= MAX_SIM_MEMORY_MB * 1e6
+
+def _queue_eta(position):
+    """Estimated seconds until the job at 1-based queue position starts."""
+    if _recent_durations:
+        mean_duration = sum(_recent_durations) / len(_recent_durations)
+    else:
+        mean_duration = _DEFAULT_SIM_DURATION
+    now = time.time()
+    remaining = sorted(
+        max(mean_duration - (now - info["start_time"]), 0.0)
+        for info in list(running_processes.values())
+        if info["process"].poll() is None
+    )
+    remaining += [0.0] * max(MAX_RUNNING_SIMS - len(remaining), 0)
+    slot = (position - 1) % MAX_RUNNING_SIMS
+    wave = (position - 1) // MAX_RUNNING_SIMS
+    return remaining[slot] + wave * mean_duration
+
+def _emit_queue_status():
+    """Tells every queued client its position and estimated start time."""
+    for position, job in enumerate(list(job_queue), start=1):
+        eta = _queue_eta(position)
+        socketio.emit('simulation_data', {
+            "type": "queue_status", "job_id": job["job_id"],
+            "position": position, "queue_length": len(job_queue),
+            "eta_seconds": eta, "estimated_start": time.time() + eta,
+        }, room=job["data_channel_id"])
+
+def _start_job(job):
+    """Launches the worker for a job. Called with _sched_lock held."""
+    data_channel_id = job["data_channel_id"]
+    try:
+        process = subprocess.Popen(
+            job["cmd"],
+            cwd=BASE_DIR, 
+            stdin=subprocess.PIPE, 
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, 
+            text=True, 
+            bufsize=1, 
+            env=job["env"]
+        )
+    except Exception as e:
+        job["error"] = f"Failed to launch MOOSE script: {e}"
+        socketio.emit('simulation_error', {"type": "sim_error", "message": job["error"]}, room=data_channel_id)
+        return False
+
+    running_processes[process.pid] = {
+        "process": process, "plot_filename": job["plot_filename"],
+        "config_file_path": job["config_file_path"], "start_time": time.time(),
+        "data_channel_id": data_channel_id, "client_id": job["client_id"],
+        "priority": job["priority"], "cost": job.get("cost"),
+    }
+    if job["priority"] == 'interactive':
+        client_sim_map[job["client_id"]] = process.pid
+    job["pid"] = process.pid
+
+    # Callback to emit error to the specific client room
+    def emit_error(error_data):
+        msg = error_data.get('message', 'Unknown Error')
+        print(f"DEBUG: Attempting to emit 'simulation_error' to room '{data_channel_id}'")
+        print(f"DEBUG: Error Payload: {msg}")
+        socketio.emit('simulation_error', error_data, room=data_channel_id)
+
+    _worker_log(process.pid, job["client_id"])
+    socketio.start_background_task(target=stream_printer, stream=process.stdout, pid=process.pid, stream_name='stdout', emit_error_fn=emit_error, client_id=job["client_id"])
+    socketio.start_background_task(target=stream_printer, stream=process.stderr, pid=process.pid, stream_name='stderr', emit_error_fn=emit_error, client_id=job["client_id"])
+    socketio.start_background_task(target=_watch_process, pid=process.pid)
+    socketio.emit('simulation_data', {
+        "type": "sim_started", "job_id": job["job_id"], "pid": process.pid,
+        "plot_filename": job["plot_filename"], "data_channel_id": data_channel_id,
+    }, room=data_channel_id)
+    return True
+
+def _dispatch_jobs():
+    """Starts queued jobs while there are free slots."""
+    with _sched_lock:
+        i = 0
+        while i < len(job_queue) and _running_count() < MAX_RUNNING_SIMS:
+            job = job_queue[i]
+            if _running_count(job["client_id"]) >= MAX_RUNNING_PER_CLIENT:
+                i += 1  # This client is at quota, let others go ahead.
+                continue
+            if not _fits_memory(job):
+                i += 1  # Wait for memory; a smaller job may still fit.
+                continue
+            job_queue.pop(i)
+            _start_job(job)
+    # Emitting can block on slow clients, so it is done without the lock.
+    _emit_queue_status()
+
+def _enqueue_job(job):
+    """Returns False if the client already has too many queued jobs."""
+    with _sched_lock:
+        queued = sum(1 for jj in job_queue if jj["client_id"] == job["client_id"])
+        if queued >= MAX_QUEUED_PER_CLIENT:
+            return False
+        job["seq"] = next(_job_seq)
+        job_queue.append(job)
+        job_queue.sort(key=lambda jj: (_PRIORITY_RANK[jj["priority"]], jj["seq"]))
+    _dispatch_jobs()
+    return True
+
+def _drop_client_jobs(client_id, priority=None):
+    with _sched_lock:
+        job_queue[:] = [jj for jj in job_queue
+                        if jj["client_id"] != client_id
+                        or (priority is not None and jj["priority"] != priority)]
+
+def _cancel_queued_job(client_id, job_id):
+    """Removes a job of this client from the queue. Returns False if it
+    is not queued, e.g. because it has already started."""
+    with _sched_lock:
+        for i, jj in enumerate(job_queue):
+            if jj["job_id"] == job_id and jj["client_id"] == client_id:
+                job_queue.pop(i)
+                break
+        else:
+            return False
+    _launch_times.pop(jj["data_channel_id"], None)
+    _emit_queue_status()    # Everyone behind it moves up.
+    return True
+
+def _watch_process(pid):
+    """Frees the slot of a worker as soon as it exits on its own."""
+    info = running_processes.get(pid)
+    if not info:
+        return
+    process = info["process"]
+    while process.poll() is None:
+        socketio.sleep(0.5)
+    _recent_durations.append(time.time() - info["start_time"])
+    _dispatch_jobs()
 
 _UPLOADS_REAL = os.path.realpath(USER_UPLOADS_DIR)
 
 # Extensions accepted for user-uploaded model files.
 _ALLOWED_UPLOAD_EXTENSIONS = {'.swc', '.p', '.g', '.xml', '.sbml', '.nml', '.json'}
+# Model files that are shared through the blob store. Configs (.json) are
+# per-session and often rewritten, so they are kept as plain files.
+_BLOB_EXTENSIONS = _ALLOWED_UPLOAD_EXTENSIONS - {'.json'}
 
 def _is_safe_client_id(client_id):
     """Return True only if client_id resolves to a path within USER_UPLOADS_DIR."""
@@ -153,33 +520,176 @@ def get_next_model_filename(directory):
 def index():
     return jsonify({"message": "Flask backend is running!"})
 
+def _bad_extension(ext):
+    return jsonify({
+        "status": "error",
+        "message": f"File type '{ext}' is not allowed. Permitted: {', '.join(sorted(_ALLOWED_UPLOAD_EXTENSIONS))}"
+    }), 400
+
+def _link_upload(digest, client_id, filename):
+    session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
+    os.makedirs(session_dir, exist_ok=True)
+    blob_store.link_into(digest, os.path.join(session_dir, filename), owner=client_id)
+
+def _upload_required(filename, code=200):
+    return jsonify({"status": "upload_required", "filename": filename}), code
+
 @app.route('/upload_file', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
-        return jsonify({"status": "error", "message": "No file part in the request"}), 400
-    file = request.files['file']
+    """Saves a model file into the client's session. A client may first
+    send just the file's sha256 and filename; if the content is already
+    in the blob store and this client has sent it before, it is linked
+    into the session without the body being sent, otherwise the reply
+    asks for an upload."""
     client_id = request.form.get('clientId')
     if not client_id:
         return jsonify({"status": "error", "message": "No clientId provided"}), 400
     if not _is_safe_client_id(client_id):
         return jsonify({"status": "error", "message": "Invalid client ID"}), 400
-    if file.filename == '':
+    file = request.files.get('file')
+    claimed = request.form.get('sha256', '').lower() or None
+    if file is None and claimed is None:
+        return jsonify({"status": "error", "message": "No file part in the request"}), 400
+    raw_name = file.filename if file is not None else request.form.get('filename', '')
+    if raw_name == '':
         return jsonify({"status": "error", "message": "No selected file"}), 400
-    if file:
-        filename = secure_filename(file.filename)
-        ext = os.path.splitext(filename)[1].lower()
-        if ext not in _ALLOWED_UPLOAD_EXTENSIONS:
-            return jsonify({
-                "status": "error",
-                "message": f"File type '{ext}' is not allowed. Permitted: {', '.join(sorted(_ALLOWED_UPLOAD_EXTENSIONS))}"
-            }), 400
-        session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
-        os.makedirs(session_dir, exist_ok=True)
-        save_path = os.path.join(session_dir, filename)
+    if claimed is not None and not is_digest(claimed):
+        return jsonify({"status": "error", "message": "Invalid sha256"}), 400
+    filename = secure_filename(raw_name)
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in _ALLOWED_UPLOAD_EXTENSIONS:
+        return _bad_extension(ext)
+    session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
+    os.makedirs(session_dir, exist_ok=True)
+    save_path = os.path.join(session_dir, filename)
+
+    if ext not in _BLOB_EXTENSIONS:
+        if file is None:
+            return _upload_required(filename)
         file.save(save_path)
         print(f"Saved file for client {client_id} to {save_path}")
         return jsonify({"status": "success", "filename": filename, "message": "File uploaded successfully"}), 200
-    return jsonify({"status": "error", "message": "File upload failed for unknown reasons"}), 500
+
+    if file is None:
+        # Only blobs this client has supplied may be linked by digest, so
+        # the reply says nothing about other users' files.
+        if not blob_store.may_link(client_id, claimed):
+            return _upload_required(filename)
+        try:
+            blob_store.link_into(claimed, save_path, owner=client_id)
+        except BlobMissing:     # Collected since may_link(); send it again.
+            return _upload_required(filename)
+        UPLOADS.inc('deduplicated')
+        print(f"Linked stored file {claimed[:12]} for client {client_id} to {save_path}")
+        return jsonify({"status": "success", "filename": filename, "sha256": claimed,
+                        "deduplicated": True, "message": "File already on server"}), 200
+
+    digest = tpool.execute(blob_store.add_stream, file.stream)
+    if claimed is not None and claimed != digest:
+        return jsonify({"status": "error", "message": "Uploaded file does not match its sha256"}), 400
+    try:
+        blob_store.link_into(digest, save_path, owner=client_id)
+    except BlobMissing:
+        return _upload_required(filename, 409)
+    UPLOADS.inc('stored')
+    print(f"Saved file for client {client_id} to {save_path}")
+    return jsonify({"status": "success", "filename": filename, "sha256": digest,
+                    "message": "File uploaded successfully"}), 200
+
+# --- Chunked uploads ---
+# POST /upload_session opens (or resumes) an upload and lists the chunks
+# the server already has; PUT /upload_chunk sends one chunk with its
+# sha256 in X-Chunk-SHA256; POST /upload_complete assembles the file into
+# the blob store and links it into the session. See chunked_upload.py.
+
+def _get_upload(upload_id, client_id):
+    if not client_id or not _is_safe_client_id(client_id):
+        return None, (jsonify({"status": "error", "message": "Invalid client ID"}), 400)
+    up = upload_manager.get(upload_id, client_id)
+    if up is None:
+        if upload_manager.was_closed(upload_id, client_id):
+            return None, (jsonify({"status": "error", "message": "Upload already completed"}), 409)
+        return None, (jsonify({"status": "error", "message": "Unknown upload"}), 404)
+    return up, None
+
+@app.route('/upload_session', methods=['POST'])
+def open_upload_session():
+    data = request.get_json(silent=True) or {}
+    client_id = data.get('clientId')
+    if not client_id or not _is_safe_client_id(client_id):
+        return jsonify({"status": "error", "message": "Invalid client ID"}), 400
+    filename = secure_filename(data.get('filename', ''))
+    ext = os.path.splitext(filename)[1].lower()
+    if not filename:
+        return jsonify({"status": "error", "message": "No filename provided"}), 400
+    if ext not in _BLOB_EXTENSIONS:
+        return _bad_extension(ext)
+    sha256 = (data.get('sha256') or '').lower() or None
+    if sha256 is not None and not is_digest(sha256):
+        return jsonify({"status": "error", "message": "Invalid sha256"}), 400
+    if sha256 is not None and blob_store.may_link(client_id, sha256):
+        try:
+            _link_upload(sha256, client_id, filename)
+            UPLOADS.inc('deduplicated')
+            return jsonify({"status": "success", "filename": filename, "sha256": sha256,
+                            "deduplicated": True, "message": "File already on server"}), 200
+        except BlobMissing:
+            pass    # Collected since may_link(); fall through to an upload.
+    try:
+        size = int(data.get('size'))
+        up = tpool.execute(upload_manager.open, client_id, filename, size, sha256,
+                           int(data.get('chunkSize') or DEFAULT_CHUNK_SIZE))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e) or "Invalid size"}), 400
+    return jsonify({"status": "upload_required", **up.status()}), 200
+
+@app.route('/upload_session/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    up, err = _get_upload(upload_id, request.args.get('clientId'))
+    if err:
+        return err
+    return jsonify({"status": "upload_required", **up.status()}), 200
+
+@app.route('/upload_chunk/<upload_id>/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    up, err = _get_upload(upload_id, request.args.get('clientId'))
+    if err:
+        return err
+    if (request.content_length or 0) > MAX_CHUNK_SIZE:
+        return jsonify({"status": "error", "message": "Chunk too large"}), 413
+    chunk_sha = request.headers.get('X-Chunk-SHA256', '').lower()
+    if not is_digest(chunk_sha):
+        return jsonify({"status": "error", "message": "Missing X-Chunk-SHA256 header"}), 400
+    data = request.get_data(cache=False)
+    try:
+        tpool.execute(upload_manager.write_chunk, up, index, data, chunk_sha)
+    except UploadClosed as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except UploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "ok", "index": index, "remaining": len(up.missing())}), 200
+
+@app.route('/upload_complete/<upload_id>', methods=['POST'])
+def upload_complete(upload_id):
+    data = request.get_json(silent=True) or {}
+    client_id = data.get('clientId')
+    up, err = _get_upload(upload_id, client_id)
+    if err:
+        return err
+    filename = up.meta['filename']
+    try:
+        digest = tpool.execute(upload_manager.finish, up)
+    except UploadError as e:
+        # Includes UploadClosed, when another request completed it first.
+        return jsonify({"status": "error", "message": str(e), **up.status()}), 409
+    try:
+        _link_upload(digest, client_id, filename)
+    except BlobMissing:
+        return _upload_required(filename, 409)
+    UPLOADS.inc('stored')
+    print(f"Assembled chunked upload {filename} for client {client_id}")
+    return jsonify({"status": "success", "filename": filename, "sha256": digest,
+                    "message": "File uploaded successfully"}), 200
 
 @socketio.on('sim_command')
 def handle_sim_command(data):
@@ -211,81 +721,148 @@ def handle_sim_command(data):
 PROTO_REGISTRY_DIR = os.path.join(BASE_DIR, 'proto_registry')
 _ALLOWED_STAGING_DIRS = {'CELL_MODELS', 'CHEM_MODELS', 'CHAN_MODELS'}
 
-def _load_registry(proto_type):
-    path = os.path.join(PROTO_REGISTRY_DIR, f'{proto_type}_protos.json')
-    if not os.path.exists(path):
-        return None
-    with open(path, 'r') as f:
-        return json.load(f)
+proto_index = ProtoIndex(PROTO_REGISTRY_DIR)
+
+def _page_args():
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        offset, limit = 0, DEFAULT_PAGE_SIZE
+    return offset, limit
 
 @app.route('/proto_digest/<proto_type>', methods=['GET'])
 def get_proto_digest(proto_type):
-    if proto_type not in ('morpho', 'chan', 'chem'):
+    PROTO_REQUESTS.inc('digest')
+    if proto_type not in PROTO_TYPES:
         return jsonify({'error': 'Invalid type'}), 400
-    data = _load_registry(proto_type)
-    if data is None:
-        return jsonify({'items': []})
-    return jsonify(data)
+    reg = proto_index.get(proto_type)
+    if reg is None:
+        return jsonify({'items': [], 'total': 0})
+    return jsonify({'type': reg.type, **paginate(reg.digest, *_page_args())})
 
 @app.route('/proto_detail/<proto_id>', methods=['GET'])
 def get_proto_detail(proto_id):
-    for proto_type in ('morpho', 'chan', 'chem'):
-        data = _load_registry(proto_type)
-        if data:
-            for item in data.get('items', []):
-                if item.get('id') == proto_id:
-                    return jsonify(item.get('details', {}))
-    return jsonify({'error': 'Not found'}), 404
+    PROTO_REQUESTS.inc('detail')
+    item = proto_index.find(proto_id)
+    if item is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(item.get('details', {}))
 
 @app.route('/proto_search/<proto_type>', methods=['GET'])
 def search_protos(proto_type):
-    if proto_type not in ('morpho', 'chan', 'chem'):
+    PROTO_REQUESTS.inc('search')
+    if proto_type not in PROTO_TYPES:
         return jsonify({'error': 'Invalid type'}), 400
-    q = request.args.get('q', '').lower().strip()
-    data = _load_registry(proto_type)
-    if data is None:
-        return jsonify({'items': []})
-    if not q:
-        return jsonify(data)
-    filtered = [
-        item for item in data.get('items', [])
-        if q in item.get('name', '').lower()
-        or q in item.get('description', '').lower()
-        or q in item.get('source', '').lower()
-    ]
-    return jsonify({'items': filtered})
+    reg = proto_index.get(proto_type)
+    if reg is None:
+        return jsonify({'items': [], 'total': 0})
+    return jsonify(paginate(reg.search(request.args.get('q', '')), *_page_args()))
+
+# Preview scene graphs are written by registry_indexer.py, or built here
+# on first request if the indexer has not been run since the entry was
+# added. Bodies are kept gzipped in memory, keyed by file and mtime.
+PREVIEW_MAX_AGE = 3600  # seconds browsers may reuse a preview unchecked
+_preview_cache = {}     # preview path → (mtime_ns, gzipped body, etag)
+
+def _build_preview(src, out_path):
+    write_preview(read_morphology(src), out_path)
+
+def _load_preview(path):
+    st = os.stat(path)
+    cached = _preview_cache.get(path)
+    if cached and cached[0] == st.st_mtime_ns:
+        return cached[1], cached[2]
+    with open(path, 'rb') as f:
+        body = f.read()
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    _preview_cache[path] = (st.st_mtime_ns, body, etag)
+    return body, etag
+
+@app.route('/proto_preview/<proto_id>', methods=['GET'])
+def get_proto_preview(proto_id):
+    """Serves the 3D scene graph of a registry morphology."""
+    PROTO_REQUESTS.inc('preview')
+    item = proto_index.find(proto_id)
+    server_file = (item or {}).get('server_file', '')
+    if not server_file.lower().endswith(MORPHOLOGY_EXTENSIONS):
+        return jsonify({'error': 'No morphology for this proto'}), 404
+    parts = server_file.replace('\\', '/').split('/')
+    if len(parts) < 2 or parts[0] not in _ALLOWED_STAGING_DIRS or '..' in parts:
+        return jsonify({'error': 'Invalid server file path'}), 400
+    path = preview_path(PROTO_REGISTRY_DIR, proto_id)
+    try:
+        if not os.path.isfile(path):
+            src = os.path.join(BASE_DIR, server_file)
+            if not os.path.isfile(src):
+                return jsonify({'error': 'File not found on server'}), 404
+            tpool.execute(_build_preview, src, path)
+        body, etag = tpool.execute(_load_preview, path)
+    except (OSError, ValueError) as e:
+        return jsonify({'error': f'Could not build preview: {e}'}), 500
+
+    headers = {'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding',
+               'Cache-Control': f'public, max-age={PREVIEW_MAX_AGE}'}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    if 'gzip' in request.accept_encodings:
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        body = gzip.decompress(body)
+    return Response(body, mimetype='application/json', headers=headers)
 
 @app.route('/proto_stage/<proto_id>/<client_id>', methods=['POST'])
 def stage_proto_file(proto_id, client_id):
-    """Copy a server-side proto file into the user's uploads directory."""
+    """Link a server-side proto file into the user's uploads directory."""
+    PROTO_REQUESTS.inc('stage')
     if not _is_safe_client_id(client_id):
         return jsonify({'error': 'Invalid client_id'}), 400
-    for proto_type in ('morpho', 'chan', 'chem'):
-        data = _load_registry(proto_type)
-        if data:
-            for item in data.get('items', []):
-                if item.get('id') == proto_id:
-                    server_file = item.get('server_file', '')
-                    if not server_file:
-                        return jsonify({'error': 'No server file for this proto'}), 400
-                    # Security: only allow files from known safe subdirectories.
-                    parts = server_file.replace('\\', '/').split('/')
-                    if len(parts) < 2 or parts[0] not in _ALLOWED_STAGING_DIRS or '..' in parts:
-                        return jsonify({'error': 'Invalid server file path'}), 400
-                    src = os.path.join(BASE_DIR, server_file)
-                    if not os.path.exists(src):
-                        return jsonify({'error': 'File not found on server'}), 404
-                    dest_dir = os.path.join(USER_UPLOADS_DIR, client_id)
-                    os.makedirs(dest_dir, exist_ok=True)
-                    filename = os.path.basename(src)
-                    dest = os.path.join(dest_dir, filename)
-                    shutil.copy2(src, dest)
-                    return jsonify({'filename': filename})
-    return jsonify({'error': 'Proto not found'}), 404
+    item = proto_index.find(proto_id)
+    if item is None:
+        return jsonify({'error': 'Proto not found'}), 404
+    server_file = item.get('server_file', '')
+    if not server_file:
+        return jsonify({'error': 'No server file for this proto'}), 400
+    # Security: only allow files from known safe subdirectories.
+    parts = server_file.replace('\\', '/').split('/')
+    if len(parts) < 2 or parts[0] not in _ALLOWED_STAGING_DIRS or '..' in parts:
+        return jsonify({'error': 'Invalid server file path'}), 400
+    src = os.path.join(BASE_DIR, server_file)
+    if not os.path.exists(src):
+        return jsonify({'error': 'File not found on server'}), 404
+    dest_dir = os.path.join(USER_UPLOADS_DIR, client_id)
+    os.makedirs(dest_dir, exist_ok=True)
+    filename = os.path.basename(src)
+    dest = os.path.join(dest_dir, filename)
+    digest = blob_store.add_file(src)
+    blob_store.link_into(digest, dest, owner=client_id)
+    UPLOADS.inc('staged')
+    return jsonify({'filename': filename})
+
+
+@app.route('/estimate_cost', methods=['POST'])
+def estimate_cost():
+    """Returns the pre-build cost estimate of a config without launching it."""
+    request_data = request.json or {}
+    config_data = request_data.get('config_data')
+    client_id = request_data.get('client_id')
+    if not config_data or not isinstance(config_data, dict):
+        return jsonify({"status": "error", "message": "Invalid or missing JSON config data"}), 400
+    session_dir = None
+    if client_id:
+        if not _is_safe_client_id(client_id):
+            return jsonify({"status": "error", "message": "Invalid client ID"}), 400
+        session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
+    try:
+        cost = estimate_config_cost(config_data, session_dir)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Cost estimate failed: {e}"}), 500
+    return jsonify({"status": "success", "cost": cost}), 200
 
 
 @app.route('/launch_simulation', methods=['POST'])
 def launch_simulation():
+    request_time = time.time()
     request_data = request.json
     config_data = request_data.get('config_data')
     client_id = request_data.get('client_id')
@@ -307,13 +884,37 @@ def launch_simulation():
             "details": violations
         }), 400
 
+    # Estimate the cost up front, so that pathological configs are caught
+    # before a worker slot is used.
+    try:
+        cost = estimate_config_cost(config_data, os.path.join(USER_UPLOADS_DIR, client_id))
+    except Exception as e:
+        print(f"Cost estimate failed: {e}")
+        cost = None
+    if cost:
+        if MAX_SIM_MEMORY_MB > 0 and cost["memoryBytes"] > MAX_SIM_MEMORY_MB * 1e6:
+            return jsonify({
+                "status": "error",
+                "message": f"Estimated memory use of {cost['memoryBytes'] / 1e6:.0f} MB exceeds the server limit of {MAX_SIM_MEMORY_MB:.0f} MB.",
+                "cost": cost
+            }), 400
+        if cost["warnings"] and not request_data.get('skip_cost_check'):
+            return jsonify({"status": "cost_warning", "warnings": cost["warnings"], "cost": cost}), 200
+
     if not data_channel_id:
         data_channel_id = str(uuid.uuid4())
-    
-    if client_id in client_sim_map:
-        old_pid = client_sim_map[client_id]
-        terminate_process(old_pid)
-        client_sim_map.pop(client_id, None)
+
+    priority = request_data.get('priority', 'interactive')
+    if priority not in _PRIORITY_RANK:
+        return jsonify({"status": "error", "message": f"Invalid priority '{priority}'"}), 400
+
+    if priority == 'interactive':
+        # A new interactive launch replaces the client's previous one.
+        _drop_client_jobs(client_id, 'interactive')
+        if client_id in client_sim_map:
+            old_pid = client_sim_map[client_id]
+            terminate_process(old_pid)
+            client_sim_map.pop(client_id, None)
 
     session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
     os.makedirs(session_dir, exist_ok=True)
@@ -368,44 +969,97 @@ def launch_simulation():
         else:
             env['PYTHONPATH'] = BASE_DIR
         env['JARDESIGNER_INTERNAL_TOKEN'] = _INTERNAL_SECRET
-        
-        #print(f"DEBUG: Launching subprocess for client {client_id} with channel {data_channel_id}")
-        
-        process = subprocess.Popen(
-            [sys.executable, launcher_path] + worker_args,
-            cwd=BASE_DIR, 
-            stdin=subprocess.PIPE, 
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE, 
-            text=True, 
-            bufsize=1, 
-            env=env
-        )
-
-        running_processes[process.pid] = {
-            "process": process, "plot_filename": plot_filename,
-            "config_file_path": config_file_path, "start_time": time.time(),
-            "data_channel_id": data_channel_id, "client_id": client_id,
-        }
-        client_sim_map[client_id] = process.pid
-
-        # Callback to emit error to the specific client room
-        def emit_error(error_data):
-            msg = error_data.get('message', 'Unknown Error')
-            print(f"DEBUG: Attempting to emit 'simulation_error' to room '{data_channel_id}'")
-            print(f"DEBUG: Error Payload: {msg}")
-            socketio.emit('simulation_error', error_data, room=data_channel_id)
-
-        socketio.start_background_task(target=stream_printer, stream=process.stdout, pid=process.pid, stream_name='stdout', emit_error_fn=emit_error)
-        socketio.start_background_task(target=stream_printer, stream=process.stderr, pid=process.pid, stream_name='stderr', emit_error_fn=emit_error)
-
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to launch MOOSE script: {e}"}), 500
 
+    for stale in [cid for cid, t in _launch_times.items() if request_time - t > 3600]:
+        _launch_times.pop(stale, None)  # Launches that never sent a scene graph.
+    _launch_times[data_channel_id] = request_time
+    job = {
+        "job_id": str(uuid.uuid4()), "client_id": client_id,
+        "data_channel_id": data_channel_id, "priority": priority,
+        "cmd": [sys.executable, launcher_path] + worker_args, "env": env,
+        "plot_filename": plot_filename, "config_file_path": config_file_path,
+        "enqueued_at": time.time(), "cost": cost,
+    }
+    if not _enqueue_job(job):
+        return jsonify({"status": "error", "message": "Too many queued simulations for this client."}), 429
+
+    if "error" in job:
+        return jsonify({"status": "error", "message": job["error"]}), 500
+    if "pid" in job:
+        return jsonify({
+            "status": "success", "pid": job["pid"],
+            "plot_filename": plot_filename, "data_channel_id": data_channel_id,
+            "cost": cost
+        }), 200
+
+    with _sched_lock:
+        position = next((i for i, jj in enumerate(job_queue, start=1) if jj is job), 0)
     return jsonify({
-        "status": "success", "pid": process.pid,
-        "plot_filename": plot_filename, "data_channel_id": data_channel_id
-    }), 200
+        "status": "queued", "job_id": job["job_id"], "position": position,
+        "eta_seconds": _queue_eta(position) if position else 0.0,
+        "plot_filename": plot_filename, "data_channel_id": data_channel_id,
+        "cost": cost
+    }), 202
+
+# --- Streaming archives ---
+# Project archives are generated as they are sent: no temp file, and the
+# first bytes go out at once. Outputs that are already compressed (or
+# are large binary containers) are stored rather than deflated.
+ZIP_CHUNK_SIZE = 64 * 1024
+_STORED_EXTENSIONS = {'.zip', '.jardes', '.gz', '.bz2', '.xz', '.npz', '.h5', '.hdf5', '.nsdf',
+                      '.png', '.jpg', '.jpeg', '.gif', '.mp4', '.webm', '.svgz'}
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink for ZipFile. ZipFile then writes data
+    descriptors after each entry instead of seeking back."""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _zip_stream(entries):
+    """Yields a zip archive of entries, a list of (path, arcname), in chunks."""
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, 'w') as zf:
+        for path, arcname in entries:
+            try:
+                zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            except OSError:
+                continue    # Removed while we were streaming.
+            if os.path.splitext(arcname)[1].lower() in _STORED_EXTENSIONS:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as src, zf.open(zinfo, 'w', force_zip64=zinfo.file_size > 0x7fffffff) as dest:
+                while True:
+                    buf = src.read(ZIP_CHUNK_SIZE)
+                    if not buf:
+                        break
+                    dest.write(buf)
+                    data = sink.take()
+                    if data:
+                        yield data
+            yield sink.take()
+    yield sink.take()   # Central directory
+
+def _zip_response(entries, download_name):
+    return Response(
+        stream_with_context(_zip_stream(entries)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+    )
 
 @app.route('/download_project/<client_id>', methods=['GET'])
 def download_project(client_id):
@@ -415,26 +1069,14 @@ def download_project(client_id):
     session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
     if not os.path.exists(session_dir):
         return jsonify({"status": "error", "message": "Project directory not found"}), 404
-    
-    timestamp = str(uuid.uuid4())
-    zip_base_name = os.path.join(USER_UPLOADS_DIR, f"project_{timestamp}")
-    
-    try:
-        archive_path = shutil.make_archive(zip_base_name, 'zip', session_dir)
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"Failed to zip project: {str(e)}"}), 500
 
-    @after_this_request
-    def remove_file(response):
-        try:
-            if os.path.exists(archive_path):
-                os.remove(archive_path)
-                print(f"Deleted temp zip: {archive_path}")
-        except Exception as e:
-            print(f"Error removing temp zip: {e}")
-        return response
-
-    return send_file(archive_path, as_attachment=True, download_name="project.jardes")
+    entries = []
+    for root, dirs, files in os.walk(session_dir):
+        dirs.sort()
+        for fname in sorted(files):
+            path = os.path.join(root, fname)
+            entries.append((path, os.path.relpath(path, session_dir)))
+    return _zip_response(entries, "project.jardes")
 
 
 def _get_newest_jardesigner_json(session_dir):
@@ -496,29 +1138,29 @@ def download_project_smart(client_id):
     if json_path is None:
         return jsonify({"status": "error", "message": "No model JSON found in session"}), 404
 
-    sources = _get_referenced_sources(parsed)
-
-    tmp_zip_path = os.path.join(USER_UPLOADS_DIR, f'_smart_{uuid.uuid4()}.zip')
-    try:
-        with zipfile.ZipFile(tmp_zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            zf.write(json_path, arcname=f'{basename}.json')
-            for src in sources:
-                src_path = os.path.join(session_dir, os.path.basename(src))
-                if os.path.isfile(src_path):
-                    zf.write(src_path, arcname=os.path.basename(src))
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"Failed to build archive: {str(e)}"}), 500
-
-    @after_this_request
-    def remove_file(response):
-        try:
-            if os.path.exists(tmp_zip_path):
-                os.remove(tmp_zip_path)
-        except Exception as ex:
-            print(f"Error removing temp zip: {ex}")
-        return response
-
-    return send_file(tmp_zip_path, as_attachment=True, download_name=f'{basename}.jardes')
+    entries = [(json_path, f'{basename}.json')]
+    for src in _get_referenced_sources(parsed):
+        src_path = os.path.join(session_dir, os.path.basename(src))
+        if os.path.isfile(src_path):
+            entries.append((src_path, os.path.basename(src)))
+    return _zip_response(entries, f'{basename}.jardes')
+
+
+def _move_unpacked_files(src_dir, session_dir, client_id):
+    """Moves unpacked project files into the session. Model files go
+    through the blob store; the rest replace any existing file by name,
+    so a file linked to a shared blob is never written through."""
+    for root, dirs, files in os.walk(src_dir):
+        rel = os.path.relpath(root, src_dir)
+        dest_root = session_dir if rel == '.' else os.path.join(session_dir, rel)
+        os.makedirs(dest_root, exist_ok=True)
+        for name in files:
+            src = os.path.join(root, name)
+            dest = os.path.join(dest_root, name)
+            if os.path.splitext(name)[1].lower() in _BLOB_EXTENSIONS:
+                blob_store.link_into(blob_store.add_file(src), dest, owner=client_id)
+            else:
+                os.replace(src, dest)
 
 
 @app.route('/upload_project/<client_id>', methods=['POST'])
@@ -537,13 +1179,16 @@ def upload_project(client_id):
 
     archive_path = os.path.join(session_dir, '_project_upload' + os.path.splitext(secure_filename(file.filename))[1])
     file.save(archive_path)
+    unpack_dir = os.path.join(session_dir, f'_project_unpack-{uuid.uuid4().hex}')
 
     try:
-        shutil.unpack_archive(archive_path, session_dir, format='zip')
+        shutil.unpack_archive(archive_path, unpack_dir, format='zip')
+        tpool.execute(_move_unpacked_files, unpack_dir, session_dir, client_id)
     except Exception as e:
         return jsonify({'error': f'Failed to unpack archive: {str(e)}'}), 400
     finally:
         os.remove(archive_path)
+        shutil.rmtree(unpack_dir, ignore_errors=True)
 
     # Prefer <basename>.json (matches the .jardes filename), then fall back to newest by mtime
     upload_basename = os.path.splitext(secure_filename(file.filename))[0]
@@ -585,10 +1230,22 @@ def push_data():
     if not channel_id or payload is None:
         return jsonify({"status": "error", "message": "Missing data_channel_id or payload"}), 400
 
+    msg_type = payload.get('type', 'data') if isinstance(payload, dict) else 'data'
+    PUSH_MESSAGES.inc(msg_type)
+    PUSH_BYTES.inc(msg_type, amount=request.content_length or 0)
+    if msg_type == 'scene_init' and channel_id in _launch_times:
+        LAUNCH_LATENCY.observe(time.time() - _launch_times.pop(channel_id))
+
     # Send data without printing (quiet mode)
+    t0 = time.perf_counter()
     socketio.emit('simulation_data', payload, room=channel_id)
+    EMIT_LATENCY.observe(time.perf_counter() - t0)
     return jsonify({"status": "success"}), 200
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @socketio.on('connect')
 def handle_connect():
     headers = dict(request.headers)
@@ -622,12 +1279,10 @@ def handle_disconnect():
         if owner_sid == request.sid:
             # This socket is still the registered owner — safe to clean up.
             client_owner_map.pop(client_id, None)
-            session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
-            if os.path.exists(session_dir):
-                try:
-                    shutil.rmtree(session_dir)
-                except Exception as e:
-                    print(f"Error deleting session directory {session_dir}: {e}")
+            blob_store.forget_owner(client_id)
+            remove_session_dir(os.path.join(USER_UPLOADS_DIR, client_id),
+                               on_done=collect_unused_blobs)
+        _drop_client_jobs(client_id)
         pid = client_sim_map.pop(client_id, None)
         if pid:
             terminate_process(pid)
@@ -661,6 +1316,28 @@ def simulation_status(pid):
         else:
             return jsonify({"status": "completed_error", "pid": pid, "message": "Plot not found."}), 200
 
+@app.route('/sim_log/<int:pid>', methods=['GET'])
+def sim_log(pid):
+    """Returns the buffered tail of a worker's output. Query parameters:
+    client_id (required, must own the worker), n (lines, default 200)
+    and stream ('stdout' or 'stderr', default both)."""
+    client_id = request.args.get('client_id', '')
+    log = worker_logs.get(pid)
+    if not log or not _is_safe_client_id(client_id) or log["client_id"] != client_id:
+        return jsonify({"status": "error", "message": "Log not found."}), 404
+    try:
+        n = max(0, min(int(request.args.get('n', 200)), LOG_RING_LINES))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid n."}), 400
+    stream = request.args.get('stream')
+    entries = [ee for ee in list(log["lines"]) if not stream or ee[1] == stream]
+    entries = entries[-n:] if n else []
+    running = pid in running_processes and running_processes[pid]["process"].poll() is None
+    return jsonify({
+        "status": "success", "pid": pid, "running": running,
+        "lines": [{"time": t, "stream": sn, "text": text} for t, sn, text in entries]
+    }), 200
+
 @app.route('/session_file/<client_id>/<filename>')
 def get_session_file(client_id, filename):
     if not _is_safe_client_id(client_id) or '..' in filename or filename.startswith('/'):
@@ -668,6 +1345,28 @@ def get_session_file(client_id, filename):
     session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
     return send_from_directory(session_dir, filename)
 
+@app.route('/download_trace/<client_id>', methods=['GET'])
+def download_trace(client_id):
+    """Downloads the Chrome trace / Perfetto JSON written by a worker
+    run with the benchmark flag set."""
+    if not _is_safe_client_id(client_id):
+        return jsonify({"status": "error", "message": "Invalid client ID."}), 400
+    session_dir = os.path.join(USER_UPLOADS_DIR, client_id)
+    if not os.path.isfile(os.path.join(session_dir, TRACE_FILENAME)):
+        return jsonify({"status": "error", "message": "No trace found. Set 'benchmark' in the model to record one."}), 404
+    return send_from_directory(session_dir, TRACE_FILENAME, as_attachment=True,
+                               download_name=f"jardes_trace_{client_id}.json")
+
+@app.route('/cancel_job', methods=['POST'])
+def cancel_job():
+    request_data = request.get_json(silent=True) or {}
+    client_id = request_data.get('client_id')
+    if not _is_safe_client_id(client_id):
+        return jsonify({"status": "error", "message": "Invalid client ID."}), 400
+    if not _cancel_queued_job(client_id, request_data.get('job_id')):
+        return jsonify({"status": "error", "message": "Job is not queued."}), 404
+    return jsonify({"status": "success", "message": "Queued job cancelled."}), 200
+
 @app.route('/reset_simulation', methods=['POST'])
 def reset_simulation():
     request_data = request.json
@@ -695,4 +1394,6 @@ def reset_simulation():
 if __name__ == '__main__':
     #print(f"User Uploads Directory (absolute): {os.path.abspath(USER_UPLOADS_DIR)}")
     #print("Starting Flask-SocketIO server...")
+    socketio.start_background_task(_monitor_event_loop_lag)
+    collect_unused_blobs()
     socketio.run(app, host='0.0.0.0', debug=False, port=5000)
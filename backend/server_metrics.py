@@ -0,0 +1,166 @@
+"""
+Minimal Prometheus-style metrics for the jardesigner server.
+
+Counters, gauges and histograms are kept in plain dicts keyed by label
+values and rendered in the Prometheus text exposition format. Updates are
+O(1) under one lock, and rendering walks only the metrics themselves, so
+scraping every few seconds is cheap. Values that are costly to compute
+(such as disk usage) are supplied by callbacks that do their own caching.
+"""
+import os
+import threading
+
+_lock = threading.Lock()
+_metrics = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _fmt_value(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.values = {}
+        _metrics.append(self)
+
+    def _header(self):
+        return ['# HELP {} {}'.format(self.name, self.doc),
+                '# TYPE {} {}'.format(self.name, self.kind)]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1.0):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self):
+        lines = self._header()
+        for key, v in sorted(self.values.items()):
+            lines.append('{}{} {}'.format(self.name, _fmt_labels(self.labels, key), _fmt_value(v)))
+        return lines
+
+
+class Gauge(_Metric):
+    """A gauge whose samples come from callback(), which returns either a
+    number, or a dict of {labelValuesTuple: number}."""
+    kind = 'gauge'
+
+    def __init__(self, name, doc, callback, labels=()):
+        super().__init__(name, doc, labels)
+        self.callback = callback
+
+    def render(self):
+        lines = self._header()
+        try:
+            val = self.callback()
+        except Exception:
+            return lines
+        if isinstance(val, dict):
+            for key, v in sorted(val.items()):
+                lines.append('{}{} {}'.format(self.name, _fmt_labels(self.labels, key), _fmt_value(v)))
+        else:
+            lines.append('{} {}'.format(self.name, _fmt_value(val)))
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, doc, buckets=DEFAULT_BUCKETS, labels=()):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, *labels):
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = self._header()
+        for key, (counts, total, n) in sorted(self.values.items()):
+            cum = 0
+            for b, c in zip(self.buckets, counts):
+                cum += c
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _fmt_labels(self.labels, key, ('le', _fmt_value(b))), cum))
+            lines.append('{}_sum{} {}'.format(self.name, _fmt_labels(self.labels, key), _fmt_value(total)))
+            lines.append('{}_count{} {}'.format(self.name, _fmt_labels(self.labels, key), n))
+        return lines
+
+
+def render():
+    """Returns all metrics in the Prometheus text format."""
+    with _lock:
+        metrics = list(_metrics)
+    lines = []
+    for m in metrics:
+        if isinstance(m, Gauge):
+            lines.extend(m.render())
+        else:
+            with _lock:
+                lines.extend(m.render())
+    return '\n'.join(lines) + '\n'
+
+#######################################################################
+# Process statistics from /proc. Linux only; other platforms report none.
+#######################################################################
+
+try:
+    _CLK_TCK = os.sysconf('SC_CLK_TCK')
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (ValueError, AttributeError, OSError):
+    _CLK_TCK, _PAGE_SIZE = 100, 4096
+
+
+def proc_stats(pid):
+    """Returns (cpu_seconds, rss_bytes) for pid, or None."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # The command name may contain spaces; fields follow the last ')'.
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    utime, stime = int(fields[11]), int(fields[12])
+    return (utime + stime) / _CLK_TCK, rss_pages * _PAGE_SIZE
+
+
+def dir_size(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
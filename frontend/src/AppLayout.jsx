@@ -126,6 +126,10 @@ export const AppLayout = (props) => {
     meshMolsData,
     simError,     
     setSimError,
+    queueStatus,
+    handleCancelQueuedJob,
+    tickProfile,
+    runTelemetry,
     elecPaths,
     spinePaths,
     setWarnedAboutMissing,
@@ -168,6 +172,10 @@ export const AppLayout = (props) => {
       activeSimPid={activeSim.pid}
       liveFrameData={liveFrameData}
       isReplaying={isReplaying}
+      queueStatus={queueStatus}
+      onCancelQueuedJob={handleCancelQueuedJob}
+      tickProfile={tickProfile}
+      runTelemetry={runTelemetry}
     />,
     Morphology: <MorphoMenuBox
         onConfigurationChange={updateJsonData}
@@ -240,6 +248,7 @@ export const AppLayout = (props) => {
   }), [
     jsonData, updateJsonData, updateJsonString, handleClearModel, getCurrentJsonData, getChemProtos,
     handleStartRun, handleResetRun, isSimulating, activeSim.pid, liveFrameData, isReplaying,
+    queueStatus, handleCancelQueuedJob, tickProfile, runTelemetry,
     handleMorphologyFileChange, 
     clientId,
     threeDConfigs,
@@ -101,6 +101,10 @@ export const useAppLogic = () => {
     const sessionTokenRef = useRef('');
 
     const [activeSim, setActiveSim] = useState({ pid: null, data_channel_id: null, plot_filename: null });
+    const [queueStatus, setQueueStatus] = useState(null);
+    const [tickProfile, setTickProfile] = useState(null);
+    const [runTelemetry, setRunTelemetry] = useState(null);
+    const simLaunchedRef = useRef(null);
     const socketRef = useRef(null);
     const frameQueueRef = useRef([]);
     const animationFrameId = useRef();
@@ -262,7 +266,25 @@ export const useAppLogic = () => {
                 return;
             }
 
+            if (data?.type === 'queue_status') {
+                setQueueStatus({ jobId: data.job_id, position: data.position, queueLength: data.queue_length, etaSeconds: data.eta_seconds });
+                return;
+            }
+
+            if (data?.type === 'tick_profile') {
+                // Per-tick and per-solver wall times; only sent when the model has 'benchmark' set.
+                setTickProfile({ ticks: data.ticks, solvers: data.solvers });
+                return;
+            }
+
+            if (data?.type === 'sim_started') {
+                setQueueStatus(null);
+                simLaunchedRef.current?.(data);
+                return;
+            }
+
             if (data?.type === 'sim_time_update') {
+                if (data.telemetry) setRunTelemetry(data.telemetry);
                 setLiveFrameData(prev => ({
                     ...prev,
                     [VIEW_IDS.RUN]: { ...(prev[VIEW_IDS.RUN] ?? {}), timestamp: data.currentTime }
@@ -362,13 +384,22 @@ export const useAppLogic = () => {
                 skip_missing_files_check: warnedAboutMissingRef.current
             };
 
-            const response = await fetch(`${API_BASE_URL}/launch_simulation`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
-            if (!response.ok) throw new Error(`Server responded with status: ${response.status}`);
-            const result = await response.json();
+            let result = null;
+            while (true) {
+                const response = await fetch(`${API_BASE_URL}/launch_simulation`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
+                if (!response.ok) throw new Error(`Server responded with status: ${response.status}`);
+                result = await response.json();
+                if (result.status !== 'cost_warning') break;
+                // The server's pre-build estimate flagged the config. Let the
+                // user decide before a simulation slot is used.
+                const proceed = window.confirm(`This model may be very expensive to run:\n\n${result.warnings.join('\n')}\n\nRun it anyway?`);
+                if (!proceed) throw new Error('Launch cancelled after cost warning');
+                payload.skip_cost_check = true;
+            }
             
-            if (result.status === 'success') {
-                const newPid = result.pid;
-                setActiveSim({ pid: newPid, data_channel_id: result.data_channel_id, plot_filename: result.plot_filename });
+            const onLaunched = (launched) => {
+                const newPid = launched.pid;
+                setActiveSim({ pid: newPid, data_channel_id: launched.data_channel_id, plot_filename: launched.plot_filename });
                 lastBuiltJsonDataRef.current = newJsonData;
                 if (pendingStartRuntimeRef.current !== null) {
                     const rt = pendingStartRuntimeRef.current;
@@ -383,10 +414,23 @@ export const useAppLogic = () => {
                         socketRef.current.emit('sim_command', { command: 'start', pid: newPid, params: { runtime: rt } });
                     }
                 }
+            };
+
+            if (result.status === 'success') {
+                simLaunchedRef.current = null;
+                setQueueStatus(null);
+                onLaunched(result);
+            } else if (result.status === 'queued') {
+                // The server starts the worker when a slot frees up and
+                // tells us over the data channel with a 'sim_started' message.
+                simLaunchedRef.current = onLaunched;
+                setQueueStatus({ jobId: result.job_id, position: result.position, queueLength: result.position, etaSeconds: result.eta_seconds });
             } else { throw new Error(result.message || 'Failed to launch simulation'); }
         } catch (err) {
             console.error("Error during model build:", err);
             setActiveSim({ pid: null, data_channel_id: null, plot_filename: null });
+            setQueueStatus(null);
+            simLaunchedRef.current = null;
             pendingStartRuntimeRef.current = null;
         }
     }, [clientId, handleRewindReplay]);
@@ -468,6 +512,21 @@ export const useAppLogic = () => {
         socketRef.current.emit('sim_command', { command: 'stop', pid: activeSim.pid });
     }, [activeSim.pid]);
 
+    const handleCancelQueuedJob = useCallback(async () => {
+        if (!queueStatus?.jobId) return;
+        try {
+            const response = await fetch(`${API_BASE_URL}/cancel_job`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ client_id: clientId, job_id: queueStatus.jobId }) });
+            // 404 means the job has just started; its 'sim_started' message will arrive.
+            if (!response.ok) return;
+            setQueueStatus(null);
+            simLaunchedRef.current = null;
+            pendingStartRuntimeRef.current = null;
+            setActiveSim({ pid: null, data_channel_id: null, plot_filename: null });
+        } catch (err) {
+            console.error("Error cancelling queued job:", err);
+        }
+    }, [clientId, queueStatus]);
+
     const handleSelectionChange = useCallback((viewId, selection, isCtrlClick) => {
         setClickSelected(prev => {
             const prevSel = prev[viewId];
@@ -513,7 +572,7 @@ export const useAppLogic = () => {
 		onStartReplay: handleStartReplay, onPauseReplay: handlePauseReplay,
         onRewindReplay: handleRewindReplay, onSeekReplay: handleSeekReplay,
         handleStartReplay, handlePauseReplay, handleRewindReplay, handleSeekReplay,
-        simError, setSimError, 
+        simError, setSimError, queueStatus, handleCancelQueuedJob, tickProfile, runTelemetry,
         // --- NEW: Pass the extracted paths ---
         elecPaths, spinePaths 
     };
@@ -23,6 +23,7 @@ import LibraryBooksIcon from '@mui/icons-material/LibraryBooks';
 import helpText from './ChanMenuBox.Help.json';
 import { getCompartmentOptions, OPTION_USER_SPECIFIED } from '../../utils/menuHelpers';
 import ProtoPickerDialog from '../ProtoPickerDialog';
+import { uploadSessionFile } from '../../utils/uploadFile';
 
 // --- Helper Functions ---
 const getChannelSourceString = (componentType) => {
@@ -208,21 +209,8 @@ const ChanMenuBox = ({
         const file = event.target.files[0];
         if (!file || !clientId) return;
 
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('clientId', clientId);
-
         try {
-            const uploadUrl = `http://${window.location.hostname}:5000/upload_file`;
-            const response = await fetch(uploadUrl, {
-                method: 'POST',
-                body: formData,
-            });
-
-            if (!response.ok) {
-                const errorText = await response.text();
-                throw new Error(errorText || 'File upload failed');
-            }
+            await uploadSessionFile(`http://${window.location.hostname}:5000`, clientId, file);
             updatePrototype(activePrototype, 'file', file.name);
             
         } catch (error) {
@@ -24,6 +24,7 @@ import helpText from './ChemMenuBox.Help.json';
 import { formatFloat } from '../../utils/formatters.js';
 import { getCompartmentOptions, OPTION_USER_SPECIFIED } from '../../utils/menuHelpers';
 import ProtoPickerDialog from '../ProtoPickerDialog';
+import { uploadSessionFile } from '../../utils/uploadFile';
 
 // --- Helper Functions ---
 const getChemSourceString = (componentType) => {
@@ -289,21 +290,8 @@ const ChemMenuBox = ({
         const file = event.target.files[0];
         if (!file || !clientId) return;
 
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('clientId', clientId);
-
         try {
-            const uploadUrl = `http://${window.location.hostname}:5000/upload_file`;
-            const response = await fetch(uploadUrl, {
-                method: 'POST',
-                body: formData,
-            });
-
-            if (!response.ok) {
-                const errorText = await response.text();
-                throw new Error(errorText || 'File upload failed');
-            }
+            await uploadSessionFile(`http://${window.location.hostname}:5000`, clientId, file);
             
             updatePrototype(activePrototype, 'source', file.name);
             
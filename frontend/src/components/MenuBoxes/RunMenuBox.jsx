@@ -4,6 +4,8 @@ import PlayArrowIcon from '@mui/icons-material/PlayArrow';
 import StopIcon from '@mui/icons-material/Stop';
 import RestartAltIcon from '@mui/icons-material/RestartAlt';
 import InfoOutlinedIcon from '@mui/icons-material/InfoOutlined';
+import TickProfileView from '../TickProfileView';
+import RunTelemetryView from '../RunTelemetryView';
 
 const helpText = {
     runControls: { totalRuntime: "The total duration for the simulation run in seconds.", currentTime: "The current time of the active simulation." },
@@ -40,6 +42,12 @@ const defaultRunConfig = {
     odeMethod: 'lsoda',
 };
 
+const formatEta = (seconds) => {
+    const s = Math.max(0, Math.round(seconds || 0));
+    if (s < 60) return `${s} s`;
+    return `${Math.floor(s / 60)} min ${s % 60} s`;
+};
+
 const InfoTooltip = ({ title }) => (
     <Tooltip title={title}>
         <InfoOutlinedIcon sx={{ fontSize: '1.1rem', color: 'action.active', cursor: 'pointer' }} />
@@ -58,6 +66,10 @@ const RunMenuBox = ({
     activeSimPid,
     liveFrameData,
     isReplaying,
+    queueStatus,
+    onCancelQueuedJob,
+    tickProfile,
+    runTelemetry,
 }) => {
 
     const [runtime, setRuntime] = useState(() => safeToString(currentConfig?.runtime, defaultRunConfig.runtime));
@@ -264,6 +276,14 @@ const RunMenuBox = ({
 
             {statusMessage.text && <Alert severity={statusMessage.type || 'info'} sx={{ mb: 2, wordBreak: 'break-word', whiteSpace: 'pre-wrap' }}>{statusMessage.text}</Alert>}
 
+            {queueStatus && (
+                <Alert severity="warning" sx={{ mb: 2 }}
+                    action={<Button color="inherit" size="small" onClick={onCancelQueuedJob} disabled={!queueStatus.jobId}>Cancel</Button>}>
+                    {`Queued: position ${queueStatus.position} of ${queueStatus.queueLength}. `}
+                    {`Estimated start in ${formatEta(queueStatus.etaSeconds)}.`}
+                </Alert>
+            )}
+
             <Grid container spacing={1.5} sx={{ mb: 2 }}>
                 <Grid item xs={6}>
                     <Box sx={{ display: 'flex', alignItems: 'center', gap: 1 }}>
@@ -279,6 +299,9 @@ const RunMenuBox = ({
                 </Grid>
             </Grid>
 
+            <RunTelemetryView runTelemetry={runTelemetry} />
+            <TickProfileView tickProfile={tickProfile} />
+
             <Divider sx={{ my: 2 }} />
 
             <Box sx={{ display: 'flex', alignItems: 'center', gap: 0.5, mb: 1.5 }}>
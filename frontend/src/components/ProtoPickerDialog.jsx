@@ -10,6 +10,7 @@ import InfoOutlinedIcon from '@mui/icons-material/InfoOutlined';
 import SearchIcon from '@mui/icons-material/Search';
 import CloseIcon from '@mui/icons-material/Close';
 import UploadFileIcon from '@mui/icons-material/UploadFile';
+import { uploadSessionFile } from '../utils/uploadFile';
 
 const DB_OPTIONS = {
     morpho: ['Local', 'NeuroMorpho'],
@@ -30,8 +31,64 @@ const sourceTypeFromFile = (filename, type) => {
     return 'file';
 };
 
+// One-line model size from the metadata precomputed by registry_indexer.py.
+const modelSizeLabel = (m) => {
+    if (!m) return null;
+    if (m.numBranches != null) {
+        return `${m.numCompartments} compartments, ${m.numBranches} branches, ` +
+            `${Math.round(m.dendriticLength * 1e6)} µm dendrite, ${m.dendVoxels} voxels`;
+    }
+    if (m.numPools != null) {
+        return `${m.numPools} pools, ${m.numReactions + m.numEnzymes} reactions, ` +
+            `${m.numCompartments} compartment${m.numCompartments === 1 ? '' : 's'}`;
+    }
+    return null;
+};
+
+// --- Morphology preview: x-y projection of the precomputed scene graph ---
+const MorphologyPreview = ({ baseUrl, protoId }) => {
+    const [shapes, setShapes] = useState(null);
+
+    useEffect(() => {
+        let cancelled = false;
+        setShapes(null);
+        fetch(`${baseUrl}/proto_preview/${protoId}`)
+            .then(r => (r.ok ? r.json() : null))
+            .then(scene => {
+                if (!cancelled) setShapes(scene ? scene.drawables.flatMap(d => d.shape) : []);
+            })
+            .catch(() => !cancelled && setShapes([]));
+        return () => { cancelled = true; };
+    }, [baseUrl, protoId]);
+
+    if (shapes === null) return <CircularProgress size={20} />;
+    if (shapes.length === 0) return null;
+    let x0 = Infinity, x1 = -Infinity, y0 = Infinity, y1 = -Infinity;
+    shapes.forEach(s => {
+        x0 = Math.min(x0, s.C[0], s.C2[0]);
+        x1 = Math.max(x1, s.C[0], s.C2[0]);
+        y0 = Math.min(y0, s.C[1], s.C2[1]);
+        y1 = Math.max(y1, s.C[1], s.C2[1]);
+    });
+    const span = Math.max(x1 - x0, y1 - y0, 1e-6);
+    const pad = span * 0.05;
+    // SVG y runs downwards, so flip it.
+    const px = x => x - x0 + pad;
+    const py = y => y1 - y + pad;
+    return (
+        <svg viewBox={`0 0 ${span + 2 * pad} ${span + 2 * pad}`} style={{ width: '100%', maxHeight: 320 }}>
+            {shapes.map(s => s.type === 'sphere' ? (
+                <circle key={s.shapeIdx} cx={px(s.C[0])} cy={py(s.C[1])} r={s.diameter / 2} fill="#1976d2" />
+            ) : (
+                <line key={s.shapeIdx} x1={px(s.C[0])} y1={py(s.C[1])} x2={px(s.C2[0])} y2={py(s.C2[1])}
+                    stroke="#1976d2" strokeWidth={Math.max(s.diameter, span / 500)} strokeLinecap="round" />
+            ))}
+        </svg>
+    );
+};
+
 // --- Detail renderer: data-source-specific layout ---
-const DetailRenderer = ({ item, detail }) => {
+const DetailRenderer = ({ item, detail, baseUrl }) => {
     const d = detail || {};
     return (
         <Box>
@@ -46,6 +103,18 @@ const DetailRenderer = ({ item, detail }) => {
                 {item.description}
             </Typography>
 
+            {modelSizeLabel(item.metadata) && (
+                <Box sx={{ mb: 2 }}>
+                    <Typography variant="subtitle2" color="primary" gutterBottom>Model size</Typography>
+                    <Typography variant="body2">{modelSizeLabel(item.metadata)}</Typography>
+                    {item.metadata.compartmentNames && (
+                        <Typography variant="body2" sx={{ fontFamily: 'monospace', fontSize: '0.75rem', color: 'text.secondary' }}>
+                            {item.metadata.compartmentNames.join(', ')}
+                        </Typography>
+                    )}
+                </Box>
+            )}
+
             {d.full_description && (
                 <Box sx={{ mb: 2 }}>
                     <Typography variant="subtitle2" color="primary" gutterBottom>Description</Typography>
@@ -77,6 +146,13 @@ const DetailRenderer = ({ item, detail }) => {
                 </Box>
             )}
 
+            {item.server_file && /\.(swc|p)$/i.test(item.server_file) && (
+                <Box sx={{ mb: 2 }}>
+                    <Typography variant="subtitle2" color="primary" gutterBottom>Morphology</Typography>
+                    <MorphologyPreview baseUrl={baseUrl} protoId={item.id} />
+                </Box>
+            )}
+
             {d.image_url && (
                 <Box sx={{ mb: 2 }}>
                     <Typography variant="subtitle2" color="primary" gutterBottom>Preview</Typography>
@@ -144,7 +220,14 @@ const ProtoRow = React.memo(({ item, onSelect, onDetail, isDetailOpen, isTopTen
             {item.name}
         </TableCell>
         <TableCell sx={{ py: 0.5, color: 'text.secondary', fontSize: '0.8rem' }}>{item.source}</TableCell>
-        <TableCell sx={{ py: 0.5, color: 'text.secondary', fontSize: '0.8rem' }}>{item.description}</TableCell>
+        <TableCell sx={{ py: 0.5, color: 'text.secondary', fontSize: '0.8rem' }}>
+            {item.description}
+            {modelSizeLabel(item.metadata) && (
+                <Typography variant="caption" component="div" sx={{ color: 'text.disabled' }}>
+                    {modelSizeLabel(item.metadata)}
+                </Typography>
+            )}
+        </TableCell>
         <TableCell sx={{ py: 0.5, pr: 1, pl: 0, width: 44 }}>
             <Tooltip title="Show details">
                 <IconButton
@@ -189,11 +272,14 @@ const TopTenHeaderRow = () => (
 // --- Main dialog ---
 const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) => {
     const [digest, setDigest] = useState([]);
+    const [digestTotal, setDigestTotal] = useState(0);
     const [loading, setLoading] = useState(false);
     const [staging, setStaging] = useState(false);
     const [searchQuery, setSearchQuery] = useState('');
     const [selectedDb, setSelectedDb] = useState('Local');
     const [searchResults, setSearchResults] = useState(null);
+    const [searchTotal, setSearchTotal] = useState(0);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [detailItem, setDetailItem] = useState(null);
     const [detailData, setDetailData] = useState(null);
     const [detailLoading, setDetailLoading] = useState(false);
@@ -211,7 +297,10 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
         setSearchQuery('');
         fetch(`${baseUrl}/proto_digest/${type}`)
             .then(r => r.json())
-            .then(data => setDigest(data.items || []))
+            .then(data => {
+                setDigest(data.items || []);
+                setDigestTotal(data.total ?? (data.items || []).length);
+            })
             .catch(err => console.error('Failed to load proto digest:', err))
             .finally(() => setLoading(false));
     }, [open, type]);
@@ -227,6 +316,7 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
             const r = await fetch(url);
             const data = await r.json();
             setSearchResults(data.items || []);
+            setSearchTotal(data.total ?? (data.items || []).length);
         } catch (err) {
             console.error('Search failed:', err);
         } finally {
@@ -234,6 +324,28 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
         }
     }, [searchQuery, selectedDb, type, baseUrl]);
 
+    // The registry is served a page at a time; fetch the next page of
+    // whichever list is showing.
+    const handleLoadMore = useCallback(async () => {
+        const searching = searchResults !== null;
+        const offset = searching ? searchResults.length : digest.length;
+        const url = searching
+            ? `${baseUrl}/proto_search/${type}?q=${encodeURIComponent(searchQuery)}&db=${encodeURIComponent(selectedDb)}&offset=${offset}`
+            : `${baseUrl}/proto_digest/${type}?offset=${offset}`;
+        setLoadingMore(true);
+        try {
+            const r = await fetch(url);
+            const data = await r.json();
+            const more = data.items || [];
+            if (searching) setSearchResults(prev => [...(prev || []), ...more]);
+            else setDigest(prev => [...prev, ...more]);
+        } catch (err) {
+            console.error('Failed to load more prototypes:', err);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [searchResults, digest, searchQuery, selectedDb, type, baseUrl]);
+
     const handleOpenDetail = useCallback(async (item) => {
         if (detailItem?.id === item.id) {
             setDetailItem(null);
@@ -280,14 +392,9 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
         const file = e.target.files[0];
         e.target.value = '';
         if (!file || !clientId) return;
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('clientId', clientId);
         setUploading(true);
         try {
-            const r = await fetch(`${baseUrl}/upload_file`, { method: 'POST', body: formData });
-            if (!r.ok) throw new Error('Upload failed');
-            const data = await r.json();
+            const data = await uploadSessionFile(baseUrl, clientId, file);
             const filename = data.filename || file.name;
             onSelect({
                 id: filename,
@@ -309,6 +416,8 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
     const allOthers = digest.filter(d => !d.topTen);
     const displayItems = searchResults !== null ? searchResults.filter(i => !i.topTen) : allOthers;
     const displayTopTen = searchResults !== null ? searchResults.filter(i => i.topTen) : topTen;
+    const loadedCount = searchResults !== null ? searchResults.length : digest.length;
+    const totalCount = searchResults !== null ? searchTotal : digestTotal;
 
     return (
         <Dialog
@@ -412,7 +521,7 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
                                         <>
                                             <SectionHeaderRow
                                                 label={searchResults !== null ? 'Search results' : 'All'}
-                                                count={searchResults !== null ? displayItems.length : null}
+                                                count={searchResults !== null ? searchTotal : null}
                                             />
                                             {displayItems.map(item => (
                                                 <ProtoRow
@@ -426,6 +535,16 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
                                         </>
                                     )}
 
+                                    {loadedCount < totalCount && (
+                                        <TableRow>
+                                            <TableCell colSpan={5} sx={{ textAlign: 'center', py: 1 }}>
+                                                <Button size="small" onClick={handleLoadMore} disabled={loadingMore}>
+                                                    {loadingMore ? 'Loading…' : `Load more (${loadedCount} of ${totalCount} shown)`}
+                                                </Button>
+                                            </TableCell>
+                                        </TableRow>
+                                    )}
+
                                     {displayTopTen.length === 0 && displayItems.length === 0 && (
                                         <TableRow>
                                             <TableCell colSpan={5} sx={{ textAlign: 'center', py: 6, color: 'text.secondary' }}>
@@ -454,7 +573,7 @@ const ProtoPickerDialog = ({ open, onClose, onSelect, type, title, clientId }) =
                                     <CircularProgress size={24} />
                                 </Box>
                             ) : (
-                                <DetailRenderer item={detailItem} detail={detailData} />
+                                <DetailRenderer item={detailItem} detail={detailData} baseUrl={baseUrl} />
                             )}
                         </Box>
                     )}
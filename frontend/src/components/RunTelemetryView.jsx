@@ -0,0 +1,40 @@
+import React from 'react';
+import { Box, Typography, Grid } from '@mui/material';
+
+const formatEta = (seconds) => {
+    if (seconds === null || seconds === undefined) return '—';
+    if (seconds < 60) return `${seconds.toFixed(1)} s`;
+    const m = Math.floor(seconds / 60);
+    return `${m} min ${Math.round(seconds - 60 * m)} s`;
+};
+
+// Progress and resource use of the current run, from the 'telemetry'
+// field of sim_time_update messages.
+const RunTelemetryView = ({ runTelemetry }) => {
+    if (!runTelemetry) return null;
+    const items = [
+        ['Real-time factor', runTelemetry.realTimeFactor.toPrecision(3)],
+        ['Mean real-time factor', runTelemetry.meanRealTimeFactor.toPrecision(3)],
+        ['ETA', formatEta(runTelemetry.eta)],
+        ['Wall time', `${runTelemetry.wallTime.toFixed(1)} s`],
+        ['RSS', `${runTelemetry.rssMB.toFixed(0)} MB`],
+        ['CPU', `${runTelemetry.cpuPercent.toFixed(0)}%`],
+        ['Queued frames', runTelemetry.queuedFrames],
+    ];
+
+    return (
+        <Box sx={{ mb: 2 }}>
+            <Typography variant="subtitle1" sx={{ fontWeight: 'bold', mb: 1 }}>Run Telemetry</Typography>
+            <Grid container spacing={0.5}>
+                {items.map(([label, value]) => (
+                    <React.Fragment key={label}>
+                        <Grid item xs={7}><Typography variant="body2">{label}</Typography></Grid>
+                        <Grid item xs={5}><Typography variant="body2" align="right">{value}</Typography></Grid>
+                    </React.Fragment>
+                ))}
+            </Grid>
+        </Box>
+    );
+};
+
+export default RunTelemetryView;
@@ -0,0 +1,64 @@
+import React from 'react';
+import { Box, Typography, Table, TableHead, TableBody, TableRow, TableCell } from '@mui/material';
+
+// Wall time per clock tick and per solver, as sent in 'tick_profile'
+// messages by models that have 'benchmark' set.
+const TickProfileView = ({ tickProfile }) => {
+    if (!tickProfile?.ticks?.length) return null;
+    const total = tickProfile.ticks.reduce((sum, tt) => sum + tt.wallTime, 0);
+    const pct = (t) => (total > 0 ? (100 * t / total).toFixed(1) : '0.0');
+
+    return (
+        <Box sx={{ mb: 2 }}>
+            <Typography variant="subtitle1" sx={{ fontWeight: 'bold', mb: 1 }}>Wall Time by Solver</Typography>
+            <Table size="small" sx={{ mb: 1.5 }}>
+                <TableHead>
+                    <TableRow>
+                        <TableCell>Solver</TableCell>
+                        <TableCell>Ticks</TableCell>
+                        <TableCell align="right">Time (s)</TableCell>
+                        <TableCell align="right">%</TableCell>
+                    </TableRow>
+                </TableHead>
+                <TableBody>
+                    {(tickProfile.solvers ?? []).map((sv) => (
+                        <TableRow key={sv.solver}>
+                            <TableCell>{sv.solver}</TableCell>
+                            <TableCell>{sv.ticks.join(', ')}</TableCell>
+                            <TableCell align="right">{sv.wallTime.toFixed(3)}</TableCell>
+                            <TableCell align="right">{pct(sv.wallTime)}</TableCell>
+                        </TableRow>
+                    ))}
+                </TableBody>
+            </Table>
+
+            <Typography variant="body2" gutterBottom sx={{ fontWeight: 'medium' }}>By Clock Tick</Typography>
+            <Table size="small">
+                <TableHead>
+                    <TableRow>
+                        <TableCell>Tick</TableCell>
+                        <TableCell>Solver</TableCell>
+                        <TableCell align="right">Objects</TableCell>
+                        <TableCell align="right">Steps</TableCell>
+                        <TableCell align="right">µs/step</TableCell>
+                        <TableCell align="right">%</TableCell>
+                    </TableRow>
+                </TableHead>
+                <TableBody>
+                    {tickProfile.ticks.map((tt) => (
+                        <TableRow key={tt.tick}>
+                            <TableCell>{tt.tick}</TableCell>
+                            <TableCell>{tt.solver}</TableCell>
+                            <TableCell align="right">{tt.numObj}</TableCell>
+                            <TableCell align="right">{tt.steps}</TableCell>
+                            <TableCell align="right">{tt.usPerStep.toFixed(2)}</TableCell>
+                            <TableCell align="right">{pct(tt.wallTime)}</TableCell>
+                        </TableRow>
+                    ))}
+                </TableBody>
+            </Table>
+        </Box>
+    );
+};
+
+export default TickProfileView;
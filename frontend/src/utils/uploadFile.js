@@ -0,0 +1,113 @@
+import { Sha256 } from './sha256';
+
+// Files larger than this are sent in chunks that can be resumed.
+const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const CHUNK_RETRIES = 5;
+// Files are hashed this many bytes at a time, so they are never read whole.
+const HASH_SLICE = 4 * 1024 * 1024;
+
+const toHex = (buffer) => Array.from(new Uint8Array(buffer))
+    .map(b => b.toString(16).padStart(2, '0'))
+    .join('');
+
+const checkedJson = async (response) => {
+    if (!response.ok) {
+        const errorText = await response.text();
+        throw new Error(errorText || 'File upload failed');
+    }
+    return response.json();
+};
+
+// crypto.subtle is faster but only exists in secure contexts.
+const sha256OfBuffer = async (buffer) => {
+    if (window.crypto && window.crypto.subtle) {
+        return toHex(await window.crypto.subtle.digest('SHA-256', buffer));
+    }
+    return new Sha256().update(buffer).hexDigest();
+};
+
+/**
+ * Returns the SHA-256 of a File as a hex string. The file is read one
+ * slice at a time, so memory use does not grow with its size.
+ */
+export const sha256OfFile = async (file) => {
+    const hash = new Sha256();
+    for (let start = 0; start < file.size; start += HASH_SLICE) {
+        hash.update(await file.slice(start, start + HASH_SLICE).arrayBuffer());
+    }
+    return hash.hexDigest();
+};
+
+/**
+ * Sends a file in chunks, each with its own SHA-256, skipping the chunks
+ * the server already holds from an earlier, interrupted attempt. The
+ * whole-file sha256 may be null: the server hashes the assembled file
+ * anyway, and only uses the client's hash to skip a duplicate upload.
+ */
+const uploadInChunks = async (baseUrl, clientId, file, sha256) => {
+    const info = await checkedJson(await fetch(`${baseUrl}/upload_session`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ clientId, filename: file.name, size: file.size, sha256 }),
+    }));
+    if (info.status !== 'upload_required') return info;
+    const { uploadId, chunkSize, numChunks } = info;
+    const have = new Set(info.received);
+    for (let index = 0; index < numChunks; index++) {
+        if (have.has(index)) continue;
+        const chunk = await file.slice(index * chunkSize, (index + 1) * chunkSize).arrayBuffer();
+        const chunkSha = await sha256OfBuffer(chunk);
+        for (let attempt = 0; ; attempt++) {
+            try {
+                await checkedJson(await fetch(
+                    `${baseUrl}/upload_chunk/${uploadId}/${index}?clientId=${encodeURIComponent(clientId)}`,
+                    { method: 'PUT', headers: { 'X-Chunk-SHA256': chunkSha }, body: chunk }));
+                break;
+            } catch (err) {
+                if (attempt + 1 >= CHUNK_RETRIES) throw err;
+                await new Promise(resolve => setTimeout(resolve, Math.min(1000 * 2 ** attempt, 10000)));
+            }
+        }
+    }
+    return checkedJson(await fetch(`${baseUrl}/upload_complete/${uploadId}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ clientId }),
+    }));
+};
+
+/**
+ * Uploads a model file into the client's session. The server keeps model
+ * files by content hash, so the hash is offered first and the file itself
+ * is only sent if the server does not already have it. Large files are
+ * sent in resumable chunks.
+ * Resolves to the server's JSON reply; throws if the upload fails.
+ */
+export const uploadSessionFile = async (baseUrl, clientId, file) => {
+    const post = async (formData) => checkedJson(
+        await fetch(`${baseUrl}/upload_file`, { method: 'POST', body: formData }));
+
+    let sha256 = null;
+    try {
+        sha256 = await sha256OfFile(file);
+    } catch (err) {
+        console.warn('Could not hash file before upload:', err);
+    }
+    if (file.size > CHUNKED_UPLOAD_THRESHOLD && !file.name.toLowerCase().endsWith('.json')) {
+        return uploadInChunks(baseUrl, clientId, file, sha256);
+    }
+    if (sha256) {
+        const probe = new FormData();
+        probe.append('clientId', clientId);
+        probe.append('filename', file.name);
+        probe.append('sha256', sha256);
+        const reply = await post(probe);
+        if (reply.status !== 'upload_required') return reply;
+    }
+
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('clientId', clientId);
+    if (sha256) formData.append('sha256', sha256);
+    return post(formData);
+};
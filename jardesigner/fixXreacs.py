@@ -18,42 +18,72 @@ import moose
 
 msgSeparator = "_xMsg_"
 
-def findCompt(elm):
+def findCompt(elm, comptMap=None):
     elm = moose.element(elm)
+    if comptMap is not None:
+        compt = comptMap.get(elm.path)
+        if compt is not None:
+            return compt
+    compt = _enclosingCompt(elm)
+    if compt is None:
+        print('Error: No compartment parent found for ' + elm.path)
+        return '/'
+    return compt
+
+
+def _enclosingCompt(elm):
     pa = elm.parent
     while pa.path != '/':
         if moose.Neutral(pa).isA['ChemCompt']:
             return pa.path
         pa = pa.parent
-    print('Error: No compartment parent found for ' + elm.path)
-    return '/'
+    return None
+
+
+def buildComptMap(basepath):
+    """Returns a dict mapping element path to the path of its enclosing
+    ChemCompt, for every element under basepath. Built in a single
+    top-down traversal so that lookups do not have to walk up the
+    parent chain for every reactant."""
+    root = moose.element(basepath)
+    comptMap = {}
+    stack = [(root, _enclosingCompt(root))]
+    while stack:
+        elm, compt = stack.pop()
+        if compt is not None:
+            comptMap[elm.path] = compt
+        if elm.isA['ChemCompt']:
+            compt = elm.path
+        for kid in elm.children:
+            stack.append((moose.element(kid), compt))
+    return comptMap
 
 
 # http://stackoverflow.com/q/3844948/
 def checkEqual(lst):
     return not lst or lst.count(lst[0]) == len(lst)
 
-def findConcChanXreacs(basepath ):
+def findConcChanXreacs(basepath, comptMap=None):
     chans = moose.wildcardFind(basepath + '/##[ISA=ConcChan]')
     ret = []
     for i in chans:
-        compt = findCompt(i)
+        compt = findCompt(i, comptMap)
         inside = i.neighbors['inPoolOut'][0]
         outside = i.neighbors['outPoolOut'][0]
-        inc = findCompt(inside)
-        outc = findCompt(outside)
+        inc = findCompt(inside, comptMap)
+        outc = findCompt(outside, comptMap)
         ret.append([i, compt, inside, inc, outside, outc])
     return ret
 
-def findXreacs(basepath, reacType):
+def findXreacs(basepath, reacType, comptMap=None):
     reacs = moose.wildcardFind(basepath + '/##[ISA=' + reacType+ ']')
     ret = []
     for i in reacs:
-        reacc = findCompt(i)
+        reacc = findCompt(i, comptMap)
         subs = i.neighbors['subOut']
         prds = i.neighbors['prdOut']
-        subc = [findCompt(j) for j in subs]
-        prdc = [findCompt(j) for j in prds]
+        subc = [findCompt(j, comptMap) for j in subs]
+        prdc = [findCompt(j, comptMap) for j in prds]
 
         enzc = []
         if reacType == 'EnzBase':
@@ -72,68 +102,64 @@ def removeEnzFromPool(pool):
             moose.delete(i)
 
 
-# If a pool is not in the same compt as reac, make a proxy in the reac
-# compt, connect it up, and disconnect the one in the old compt.
-def proxify(reac, reacc, direction, pool, poolc):
-    reacc_elm = moose.element(reacc)
-    reac_elm = moose.element(reac)
-    pool_elm = moose.element( pool )
-    # Preserve the rates which were set up for the x-compt reacn
-    #_moose.showfield( reac )
+# Returns the proxy for pool in the compt reacc, making it if needed.
+# The proxyCache holds proxies already made in this pass, so that a pool
+# shared by many cross-compartment reactions is only copied and cleaned
+# up once.
+def getProxyPool(reacc, pool, poolc, proxyCache=None):
     dupname = pool.name + '_xfer_' + moose.element(poolc).name
-    #print(f"############# {pool},,,, {dupname},,,, {poolc}")
-    if moose.exists(reacc + '/' + dupname):
-        duppool = moose.element(reacc + '/' + dupname)
+    key = reacc + '/' + dupname
+    if proxyCache is not None and key in proxyCache:
+        return proxyCache[key]
+    if moose.exists(key):
+        duppool = moose.element(key)
     else:
         # This also deals with cases where the duppool is buffered.
-        #print( "MOOSE EXISTS: ", pool.path )
-        #print( "MOOSE EXISTS2: ", reacc_elm.path )
-        #print( "POOL ID", type( pool ), moose.element(pool.path).id )
-        duppool = moose.copy(pool_elm, reacc_elm, dupname)
+        duppool = moose.copy(moose.element(pool), moose.element(reacc), dupname)
     duppool.diffConst = 0  # diffusion only happens in original compt
     removeEnzFromPool(duppool)
+    if proxyCache is not None:
+        proxyCache[key] = duppool
+    return duppool
+
+
+# If a pool is not in the same compt as reac, make a proxy in the reac
+# compt, connect it up, and disconnect the one in the old compt.
+def proxify(reac, reacc, direction, pool, poolc, proxyCache=None):
+    # Preserve the rates which were set up for the x-compt reacn
+    #_moose.showfield( reac )
+    duppool = getProxyPool(reacc, pool, poolc, proxyCache)
     disconnectReactant(reac, pool, duppool)
     moose.connect(reac, direction, duppool, 'reac')
     #moose.showfield( reac )
     #moose.showmsg( duppool )
 
 
-def enzProxify(enz, enzc, direction, pool, poolc):
+def enzProxify(enz, enzc, direction, pool, poolc, proxyCache=None):
     if enzc == poolc:
         return
     enze = moose.element(enz)
     # kcat and k2 are indept of volume, just time^-1
     km = enze.numKm
-    proxify(enz, enzc, direction, pool, poolc)
+    proxify(enz, enzc, direction, pool, poolc, proxyCache)
     enze.numKm = km
 
 
-def reacProxify(reac, reacc, direction, pool, poolc):
+def reacProxify(reac, reacc, direction, pool, poolc, proxyCache=None):
     if reacc == poolc:
         return
     reac_elm = moose.element(reac)
     kf = reac_elm.numKf
     kb = reac_elm.numKb
-    proxify(reac, reacc, direction, pool, poolc)
+    proxify(reac, reacc, direction, pool, poolc, proxyCache)
     reac_elm.numKf = kf
     reac_elm.numKb = kb
 
-def chanProxify(chan, chanc, direction, pool, poolc):
+def chanProxify(chan, chanc, direction, pool, poolc, proxyCache=None):
     if chanc == poolc:
         return
-    poolc_elm = moose.element( poolc )
-    chanc_elm = moose.element( chanc )
-    pool_elm = moose.element( pool )
     #perm = chan.permeability
-    dupname = pool.name + '_xfer_' + poolc_elm.name
-    #  print("#############", pool, dupname, poolc)
-    if moose.exists(chanc + '/' + dupname):
-        duppool = moose.element(chanc + '/' + dupname)
-    else:
-        # This also deals with cases where the duppool is buffered.
-        duppool = moose.copy(pool_elm, chanc_elm, dupname)
-    duppool.diffConst = 0  # diffusion only happens in original compt
-    removeEnzFromPool(duppool)
+    duppool = getProxyPool(chanc, pool, poolc, proxyCache)
     disconnectReactant(chan, pool, duppool)
     moose.connect(chan, direction, duppool, 'reac')
 
@@ -174,28 +200,32 @@ def disconnectReactant(reacOrEnz, reactant, duppool):
     info.notes += notes
 
 def fixXreacs(basepath):
-    xr = findXreacs(basepath, 'Reac')
-    xe = findXreacs(basepath, 'EnzBase')
-    xc = findConcChanXreacs( basepath )
+    # The compartment lookup and the proxies are shared by all three
+    # passes, so that each element is visited only once.
+    comptMap = buildComptMap(basepath)
+    proxyCache = {}
+    xr = findXreacs(basepath, 'Reac', comptMap)
+    xe = findXreacs(basepath, 'EnzBase', comptMap)
+    xc = findConcChanXreacs(basepath, comptMap)
 
     for i in (xr):
         reac, reacc, subs, subc, prds, prdc = i
         for j in range(len(subs)):
-            reacProxify(reac, reacc, 'sub', subs[j], subc[j])
+            reacProxify(reac, reacc, 'sub', subs[j], subc[j], proxyCache)
         for j in range(len(prds)):
-            reacProxify(reac, reacc, 'prd', prds[j], prdc[j])
+            reacProxify(reac, reacc, 'prd', prds[j], prdc[j], proxyCache)
 
     for i in (xe):
         enz, enzc, subs, subc, prds, prdc = i
         for j in range(len(subs)):
-            enzProxify(enz, enzc, 'sub', subs[j], subc[j])
+            enzProxify(enz, enzc, 'sub', subs[j], subc[j], proxyCache)
         for j in range(len(prds)):
-            enzProxify(enz, enzc, 'prd', prds[j], prdc[j])
+            enzProxify(enz, enzc, 'prd', prds[j], prdc[j], proxyCache)
 
     for i in (xc):
         chan, chanc, inside, inc, outside, outc = i
-        chanProxify( chan, chanc, 'in', inside, inc )
-        chanProxify( chan, chanc, 'out', outside, outc )
+        chanProxify( chan, chanc, 'in', inside, inc, proxyCache )
+        chanProxify( chan, chanc, 'out', outside, outc, proxyCache )
 
 #####################################################################
 
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+####################################################################
+# jarChanCache.py
+# Persistent cache of compiled channel prototypes.
+#
+# Channel prototypes are rebuilt on every run: the builtins in
+# jardesignerProtos tabulate their gates, and ChannelML files are parsed
+# and tabulated again. The first time a prototype is built, this saves
+# the gate tables of the resulting HHChannel as numpy arrays, with the
+# channel and gate fields and any addmsg Mstrings in a JSON sidecar.
+# Later builds restore the channel from these, with one bulk tableA and
+# tableB assignment per gate.
+#
+# Entries are keyed by the prototype name and source, the SHA-256 of the
+# file that defines it, the temperature and the cache format version.
+# The gate min, max and divs are fixed by that source and are stored
+# with each gate. Only plain HHChannels with nothing but gates and
+# Mstrings inside are cached; anything else is built every time.
+#
+# The cache lives in $JARDES_CHAN_CACHE_DIR, or ~/.cache/jardesigner/chan.
+# Set JARDES_CHAN_CACHE=0 to turn it off.
+#
+# Copyright (C) Upinder S. Bhalla NCBS 2025
+# This program is licensed under the GNU Public License version 3.
+####################################################################
+
+import os
+import io
+import json
+import hashlib
+import tempfile
+import numpy as np
+import moose
+
+CACHE_VERSION = 1
+CACHE_DIR = os.environ.get( 'JARDES_CHAN_CACHE_DIR',
+    os.path.join( os.path.expanduser( '~' ), '.cache', 'jardesigner', 'chan' ) )
+GATES = [ 'gateX', 'gateY', 'gateZ' ]
+_CHAN_FIELDS = [ 'Xpower', 'Ypower', 'Zpower', 'Ek', 'Gbar', 'Gk',
+    'instant', 'useConcentration' ]
+_GATE_FIELDS = [ 'min', 'max', 'divs', 'useInterpolation' ]
+
+_stats = { 'hits': 0, 'misses': 0 }
+
+def isEnabled():
+    return os.environ.get( 'JARDES_CHAN_CACHE', '1' ) != '0'
+
+def stats():
+    return dict( _stats )
+
+def cacheKey( name, source, sourceFile, temperature ):
+    h = hashlib.sha256()
+    if sourceFile:
+        with open( sourceFile, 'rb' ) as f:
+            for buf in iter( lambda: f.read( 1024 * 1024 ), b'' ):
+                h.update( buf )
+    h.update( '|{}|{}|{!r}|{}'.format( name, source, float( temperature ),
+        CACHE_VERSION ).encode() )
+    return h.hexdigest()
+
+def _paths( key ):
+    base = os.path.join( CACHE_DIR, key[:2], key )
+    return base + '.npz', base + '.json'
+
+def atomicWrite( path, writeFunc ):
+    os.makedirs( os.path.dirname( path ), exist_ok = True )
+    fd, tmp = tempfile.mkstemp( dir = os.path.dirname( path ), suffix = '.tmp' )
+    try:
+        with os.fdopen( fd, 'wb' ) as f:
+            writeFunc( f )
+        os.replace( tmp, path )
+    except BaseException:
+        if os.path.exists( tmp ):
+            os.remove( tmp )
+        raise
+
+def _plain( val ):
+    return val.item() if hasattr( val, 'item' ) else val
+
+def _describe( chan ):
+    """Returns ( meta, arrays ) for an HHChannel, or None if it holds
+    anything other than gates and Mstrings."""
+    if chan.className != 'HHChannel':
+        return None
+    meta = { 'version': CACHE_VERSION,
+        'fields': { ff: _plain( getattr( chan, ff ) ) for ff in _CHAN_FIELDS },
+        'gates': {}, 'mstrings': {} }
+    arrays = {}
+    for obj in chan.children:
+        obj = moose.element( obj )
+        if obj.className == 'Mstring':
+            meta['mstrings'][obj.name] = obj.value
+        elif obj.className != 'HHGate' or obj.name not in GATES:
+            return None
+    powers = { 'gateX': chan.Xpower, 'gateY': chan.Ypower, 'gateZ': chan.Zpower }
+    for gname in GATES:
+        if powers[gname] <= 0:
+            continue
+        gate = moose.element( chan.path + '/' + gname )
+        meta['gates'][gname] = { ff: _plain( getattr( gate, ff ) ) for ff in _GATE_FIELDS }
+        arrays[gname + '_A'] = np.asarray( gate.tableA, dtype = float )
+        arrays[gname + '_B'] = np.asarray( gate.tableB, dtype = float )
+    return meta, arrays
+
+def save( key, chan ):
+    """Stores a freshly built channel prototype under key."""
+    if not isEnabled():
+        return False
+    ret = _describe( chan )
+    if ret is None:
+        return False
+    meta, arrays = ret
+    npzPath, jsonPath = _paths( key )
+    try:
+        buf = io.BytesIO()
+        np.savez( buf, **arrays )
+        atomicWrite( npzPath, lambda f: f.write( buf.getvalue() ) )
+        atomicWrite( jsonPath, lambda f: f.write( json.dumps( meta ).encode() ) )
+        return True
+    except OSError as e:
+        print( "Warning: could not cache channel {}: {}".format( chan.path, e ) )
+        return False
+
+def load( key, path ):
+    """Builds the channel at path from the cache entry for key. Returns
+    the channel, or None if there is no usable entry."""
+    if not isEnabled():
+        return None
+    npzPath, jsonPath = _paths( key )
+    try:
+        with open( jsonPath, 'r' ) as f:
+            meta = json.load( f )
+        with np.load( npzPath ) as data:
+            arrays = { kk: data[kk] for kk in data.files }
+    except ( OSError, ValueError, KeyError ):
+        _stats['misses'] += 1
+        return None
+    if meta.get( 'version' ) != CACHE_VERSION or \
+            any( ff not in meta.get( 'fields', {} ) for ff in _CHAN_FIELDS ):
+        _stats['misses'] += 1
+        return None
+    chan = moose.HHChannel( path )
+    # Powers first, as they create the gates.
+    for ff in _CHAN_FIELDS:
+        setattr( chan, ff, meta['fields'][ff] )
+    for gname, fields in meta['gates'].items():
+        gate = moose.element( chan.path + '/' + gname )
+        for ff in _GATE_FIELDS:
+            setattr( gate, ff, fields[ff] )
+        gate.tableA = arrays[gname + '_A']
+        gate.tableB = arrays[gname + '_B']
+    for name, value in meta['mstrings'].items():
+        moose.Mstring( chan.path + '/' + name ).value = value
+    _stats['hits'] += 1
+    return chan
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+####################################################################
+# jarMorphReduce.py
+# Electrotonic reduction of detailed morphologies.
+#
+# Reconstructed cells often have many more compartments than the
+# electrical solution needs, and HSolve cost grows with the compartment
+# count. This merges runs of adjacent, unbranched compartments until
+# each merged compartment is at most lambdaFraction of a length constant
+# long, using the RM and RA the passive distribution will give it.
+# Branch points, the soma, spines and their parent compartments,
+# compartments that already hold channels or other objects, and any
+# compartment named in a plot, stim, adaptor, moogli or file path are
+# left as they are.
+#
+# A merged compartment keeps the name, start point, Em and initVm of its
+# most proximal member and ends where its most distal member ended. Its
+# diameter is chosen to preserve membrane area, so Rm and Cm are the
+# parallel sums of its members. Ra is what RA gives at the merged
+# geometry, which is also what buildPassiveDistrib will assign.
+#
+# The accuracy check compares the somatic response to a current step in
+# the full and the reduced passive trees, with implicit Euler on the
+# Hines-ordered compartment matrix.
+#
+# Copyright (C) Upinder S. Bhalla NCBS 2025
+# This program is licensed under the GNU Public License version 3.
+####################################################################
+
+import re
+import time
+import numpy as np
+import moose
+
+_SPINE_RE = re.compile( 'shaft|head|spine', re.IGNORECASE )
+_WILDCARD_RE = re.compile( r'[#*?\[\]]' )
+STEP_INJECT = 1e-10     # Amps. The response is linear, so this only sets units.
+STEP_POINTS = 100       # Time steps in the step response check.
+
+def namedCompartments( paths ):
+    """Returns the set of compartment names that appear literally, not
+    through a wildcard, in any of the paths."""
+    ret = set()
+    for path in paths:
+        for tok in re.split( r'[/\s,]+', str( path ) ):
+            if tok and tok not in ( '.', '..' ) and not _WILDCARD_RE.search( tok ):
+                ret.add( tok )
+    return ret
+
+def comptTable( elecid ):
+    """Returns a dict of arrays describing the compartment tree of elecid,
+    in parent-before-child order. 'parent' is -1 for roots. Returns None
+    if the tree uses compartments this cannot merge."""
+    compts = moose.wildcardFind( elecid.path + '/#[ISA=CompartmentBase]' )
+    if len( compts ) == 0:
+        return None
+    index = { cc.path: i for i, cc in enumerate( compts ) }
+    rawParent = [-1] * len( compts )
+    for i, cc in enumerate( compts ):
+        if cc.className != 'Compartment':
+            return None     # SymCompartments connect differently.
+        parents = [ moose.element( pp ).path for pp in cc.neighbors['raxial'] ]
+        if len( parents ) == 1 and parents[0] in index:
+            rawParent[i] = index[parents[0]]
+    kids = [ [] for cc in compts ]
+    for i, pa in enumerate( rawParent ):
+        if pa >= 0:
+            kids[pa].append( i )
+    # Breadth-first from the roots, soma first if there is one.
+    roots = [ i for i, pa in enumerate( rawParent ) if pa < 0 ]
+    roots.sort( key = lambda i: compts[i].name != 'soma' )
+    order = list( roots )
+    for i in order:
+        order.extend( kids[i] )
+    if len( order ) != len( compts ):
+        return None     # A loop in the axial messages.
+    newIdx = { old: new for new, old in enumerate( order ) }
+    ordered = [ compts[i] for i in order ]
+    ret = {
+        'compts': ordered,
+        'names': [ cc.name for cc in ordered ],
+        'parent': np.array( [ newIdx[rawParent[i]] if rawParent[i] >= 0 else -1
+            for i in order ], dtype = int ),
+        'hasChildren': np.array( [ len( cc.children ) > 0 for cc in ordered ] ),
+    }
+    for ff in [ 'length', 'diameter', 'Rm', 'Cm', 'Ra' ]:
+        ret[ff] = np.array( [ getattr( cc, ff ) for cc in ordered ], dtype = float )
+    area = np.pi * ret['diameter'] * ret['length']
+    xa = np.pi * ret['diameter'] ** 2 / 4.0
+    ret['RM'] = ret['Rm'] * area
+    ret['CM'] = ret['Cm'] / np.maximum( area, 1e-30 )
+    ret['RA'] = ret['Ra'] * xa / np.maximum( ret['length'], 1e-12 )
+    return ret
+
+def applyPassiveDistrib( elecid, table, passiveDistrib ):
+    """Updates table with the numeric RM, RA and CM in passiveDistrib, so
+    that the check sees the values buildPassiveDistrib will assign.
+    Values given as expressions are left at what the loaded morphology
+    had."""
+    row = { cc.path: i for i, cc in enumerate( table['compts'] ) }
+    dummy = moose.element( '/' )
+    changed = set()
+    for entry in passiveDistrib:
+        vals = {}
+        for key in ( 'RM', 'RA', 'CM' ):
+            try:
+                vals[key] = float( entry[key] )
+            except ( KeyError, TypeError, ValueError ):
+                pass
+        if not vals:
+            continue
+        for cc in elecid.compartmentsFromExpression[ entry['path'] + ' 1' ]:
+            if cc != dummy and cc.path in row:
+                i = row[cc.path]
+                for key, val in vals.items():
+                    table[key][i] = val
+                changed.add( i )
+    rows = [ i for i in changed if table['length'][i] > 0 ]
+    length = table['length'][rows]
+    area = np.pi * table['diameter'][rows] * length
+    xa = np.pi * table['diameter'][rows] ** 2 / 4.0
+    table['Rm'][rows] = table['RM'][rows] / area
+    table['Cm'][rows] = table['CM'][rows] * area
+    table['Ra'][rows] = table['RA'][rows] * length / xa
+
+def planMerges( table, keep, lambdaFraction ):
+    """Returns a list of groups, each a list of table rows from proximal
+    to distal that become one compartment."""
+    parent = table['parent']
+    n = len( parent )
+    numKids = np.bincount( parent[parent >= 0], minlength = n )
+    dia = table['diameter']
+    lam = np.sqrt( table['RM'] * dia / ( 4.0 * np.maximum( table['RA'], 1e-12 ) ) )
+    elen = table['length'] / np.maximum( lam, 1e-12 )
+    groups = []
+    groupOf = [-1] * n
+    openGroup = [False] * n
+    glen = []
+    for i in range( n ):
+        pa = parent[i]
+        frozen = keep[i] or pa < 0
+        if not frozen and openGroup[pa] and numKids[pa] == 1:
+            g = groupOf[pa]
+            if glen[g] + elen[i] <= lambdaFraction:
+                groups[g].append( i )
+                groupOf[i] = g
+                glen[g] += elen[i]
+                openGroup[i] = True
+                continue
+        groupOf[i] = len( groups )
+        groups.append( [i] )
+        glen.append( elen[i] )
+        openGroup[i] = not frozen
+    return groups
+
+def mergedTable( table, groups ):
+    """Returns the parent, Rm, Cm and Ra arrays of the reduced tree, in
+    the order of groups, along with the merged length and diameter."""
+    parent = table['parent']
+    groupOf = np.empty( len( parent ), dtype = int )
+    for g, members in enumerate( groups ):
+        groupOf[members] = g
+    ret = { 'parent': np.array( [ groupOf[parent[mm[0]]] if parent[mm[0]] >= 0 else -1
+        for mm in groups ], dtype = int ) }
+    length = np.array( [ table['length'][mm].sum() for mm in groups ] )
+    area = np.array( [ ( table['diameter'][mm] * table['length'][mm] ).sum()
+        for mm in groups ] )
+    dia = np.array( [ table['diameter'][mm[0]] for mm in groups ] )
+    multi = np.array( [ len( mm ) > 1 for mm in groups ] )
+    dia[multi] = area[multi] / np.maximum( length[multi], 1e-12 )
+    ret['length'] = length
+    ret['diameter'] = dia
+    ret['Rm'] = np.array( [ 1.0 / ( 1.0 / table['Rm'][mm] ).sum() for mm in groups ] )
+    ret['Cm'] = np.array( [ table['Cm'][mm].sum() for mm in groups ] )
+    # Length-weighted RA, applied to the merged cylinder.
+    RA = np.array( [ ( table['RA'][mm] * table['length'][mm] ).sum() /
+        max( table['length'][mm].sum(), 1e-12 ) for mm in groups ] )
+    Ra = RA * length / ( np.pi * dia ** 2 / 4.0 )
+    ret['Ra'] = np.where( multi, Ra, [ table['Ra'][mm[0]] for mm in groups ] )
+    return ret
+
+def _hinesSolver( parent, diag, g ):
+    """Returns a function solving the tree system whose diagonal is diag
+    and whose coupling between row i and parent[i] is -g[i]. Rows must be
+    in parent-before-child order."""
+    n = len( parent )
+    pa = parent.tolist()
+    gg = g.tolist()
+    d = diag.tolist()
+    for i in range( n - 1, 0, -1 ):
+        if pa[i] >= 0:
+            d[pa[i]] -= gg[i] * gg[i] / d[i]
+
+    def solve( b ):
+        b = list( b )
+        for i in range( n - 1, 0, -1 ):
+            if pa[i] >= 0:
+                b[pa[i]] += gg[i] * b[i] / d[i]
+        v = [0.0] * n
+        for i in range( n ):
+            v[i] = ( b[i] + ( gg[i] * v[pa[i]] if pa[i] >= 0 else 0.0 ) ) / d[i]
+        return v
+    return solve
+
+def _system( tab, dt ):
+    parent = tab['parent']
+    g = np.where( parent >= 0, 1.0 / tab['Ra'], 0.0 )
+    cdt = tab['Cm'] / dt if dt else np.zeros( len( parent ) )
+    diag = cdt + 1.0 / tab['Rm'] + g
+    np.add.at( diag, parent[parent >= 0], g[parent >= 0] )
+    return _hinesSolver( parent, diag, g ), cdt.tolist()
+
+def stepResponse( tab, stimIdx, dt, numSteps ):
+    """Returns the depolarisation at stimIdx for each step of a current
+    step injected there, and the steady-state input resistance."""
+    solve, cdt = _system( tab, dt )
+    n = len( cdt )
+    v = [0.0] * n
+    trace = []
+    for step in range( numSteps ):
+        b = [ c * vv for c, vv in zip( cdt, v ) ]
+        b[stimIdx] += STEP_INJECT
+        v = solve( b )
+        trace.append( v[stimIdx] )
+    dcSolve, dummy = _system( tab, 0 )
+    b = [0.0] * n
+    b[stimIdx] = STEP_INJECT
+    rin = dcSolve( b )[stimIdx] / STEP_INJECT
+    return np.array( trace ), rin
+
+def accuracyCheck( table, reduced ):
+    """Compares the somatic step responses of the full and reduced trees
+    over five membrane time constants of the root compartment."""
+    tau = table['Rm'][0] * table['Cm'][0]
+    dt = 5.0 * tau / STEP_POINTS
+    full, rinFull = stepResponse( table, 0, dt, STEP_POINTS )
+    red, rinRed = stepResponse( reduced, 0, dt, STEP_POINTS )
+    peak = max( np.abs( full ).max(), 1e-30 )
+    return {
+        'stepError': float( np.abs( full - red ).max() / peak ),
+        'rinFull': float( rinFull ),
+        'rinReduced': float( rinRed ),
+    }
+
+def _applyMerges( table, groups, reduced ):
+    compts = table['compts']
+    groupOf = {}
+    for g, members in enumerate( groups ):
+        for i in members:
+            groupOf[i] = g
+    for g, members in enumerate( groups ):
+        if len( members ) == 1:
+            continue
+        head = compts[members[0]]
+        tail = compts[members[-1]]
+        head.x, head.y, head.z = tail.x, tail.y, tail.z
+        for ff in [ 'length', 'diameter', 'Rm', 'Cm', 'Ra' ]:
+            setattr( head, ff, reduced[ff][g] )
+    # Children of a merged tail now hang off its group's head.
+    parent = table['parent']
+    for i, pa in enumerate( parent ):
+        if pa >= 0 and groupOf[pa] != groupOf[i] and groups[groupOf[pa]][0] != pa:
+            moose.connect( compts[groups[groupOf[pa]][0]], 'axial', compts[i], 'raxial' )
+    for members in groups:
+        for i in members[1:]:
+            moose.delete( compts[i] )
+
+def reduceCell( elecid, lambdaFraction, passiveDistrib = None, keepNames = None,
+        checkAccuracy = True ):
+    """Merges compartments of elecid in place. Returns a report dict, or
+    None if the tree could not be reduced."""
+    t0 = time.time()
+    table = comptTable( elecid )
+    if table is None:
+        return None
+    applyPassiveDistrib( elecid, table, passiveDistrib or [] )
+    keepNames = keepNames or set()
+    names = table['names']
+    parent = table['parent']
+    keep = np.array( [ nn in keepNames or 'soma' in nn.lower() or
+        bool( _SPINE_RE.search( nn ) ) for nn in names ] ) | table['hasChildren']
+    keep[0] = True
+    for i, pa in enumerate( parent ):
+        if pa >= 0 and _SPINE_RE.search( names[i] ):
+            keep[pa] = True
+    numKids = np.bincount( parent[parent >= 0], minlength = len( parent ) )
+    keep |= numKids > 1
+    groups = planMerges( table, keep, lambdaFraction )
+    reduced = mergedTable( table, groups )
+    report = {
+        'numBefore': len( names ),
+        'numAfter': len( groups ),
+        'ratio': len( groups ) / len( names ),
+        'numKept': int( keep.sum() ),
+        'lambdaFraction': lambdaFraction,
+    }
+    if checkAccuracy:
+        report.update( accuracyCheck( table, reduced ) )
+    if len( groups ) < len( names ):
+        _applyMerges( table, groups, reduced )
+    report['time'] = time.time() - t0
+    return report
+
+def printReport( report ):
+    msg = "jardesigner: Morphology reduction: {} -> {} compartments (ratio {:.3f}, {} kept), {:.3f} sec".format(
+        report['numBefore'], report['numAfter'], report['ratio'],
+        report['numKept'], report['time'] )
+    print( msg )
+    if 'stepError' in report:
+        print( "    Soma step response error {:.2f}% of peak; input resistance {:.4g} -> {:.4g} Mohm".format(
+            100.0 * report['stepError'], report['rinFull'] * 1e-6,
+            report['rinReduced'] * 1e-6 ) )
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+####################################################################
+# jarSpineLump.py
+# Folds spines that nothing addresses into their parent dendrites.
+#
+# spineDistrib at micron spacing makes tens of thousands of shaft and
+# head compartments, each with its own receptors and Ca_conc, though a
+# model usually stimulates or records from only a few of them. Once the
+# spines are built, this keeps the ones that own an object a stim, plot,
+# file or adaptor reaches, and lumps the rest into the dendrite they sit
+# on: their membrane capacitance and leak are added to the dendrite, as
+# is the Gbar of any channel that the dendrite also has. Synaptic
+# channels on lumped spines get no input, so they are dropped, and so
+# are Ca_concs. A spine holding any other kind of object is kept.
+#
+# The caller resolves each entry to compartments by its path and
+# geomExpr, then to the objects at its relpath, so a randsyn stim on '#'
+# with relpath 'glu', or a plot of '#' Ca_conc, keeps every spine that
+# has one. Moogli displays are the exception: only moogli paths that
+# name spine compartments (shaft, head or spine) keep spines, as a
+# moogli of '#' shows lumped spines as part of their dendrites.
+#
+# Copyright (C) Upinder S. Bhalla NCBS 2025
+# This program is licensed under the GNU Public License version 3.
+####################################################################
+
+import re
+import time
+import moose
+
+_SPINE_RE = re.compile( 'shaft|head|spine', re.IGNORECASE )
+
+def isSpinePath( path ):
+    return bool( _SPINE_RE.search( str( path ) ) )
+
+def findSpines( elecid ):
+    """Returns a dict of spine root compartment → ( dendrite parent, list
+    of the spine's compartments )."""
+    compts = moose.wildcardFind( elecid.path + '/#[ISA=CompartmentBase]' )
+    isSpine = { cc.path: bool( _SPINE_RE.search( cc.name ) ) for cc in compts }
+    parentOf = {}
+    for cc in compts:
+        if isSpine[cc.path]:
+            pa = cc.neighbors['raxial']
+            parentOf[cc.path] = moose.element( pa[0] ) if len( pa ) > 0 else None
+    spines = {}
+    for cc in compts:
+        if not isSpine[cc.path]:
+            continue
+        root = cc
+        pa = parentOf[root.path]
+        while pa is not None and isSpine.get( pa.path, False ):
+            root = pa
+            pa = parentOf[root.path]
+        if pa is None:
+            continue        # A spine with no dendrite to fold into.
+        spines.setdefault( root.path, ( pa, [] ) )[1].append( cc )
+    return spines
+
+def _lumpPlan( compt, dend ):
+    """Returns ( merges, drops ) for the objects in a spine compartment:
+    channels whose Gbar goes to the namesake on dend, and objects that
+    can be discarded. Returns None if the compartment holds something
+    that can be neither."""
+    merges = []
+    drops = []
+    for obj in compt.children:
+        obj = moose.element( obj )
+        target = dend.path + '/' + obj.name
+        if obj.isA['SynChan'] or obj.isA['SynHandlerBase'] or obj.isA['CaConcBase']:
+            drops.append( obj )
+        elif obj.isA['ChanBase'] and moose.exists( target ) and \
+                moose.element( target ).isA['ChanBase']:
+            merges.append( ( obj, moose.element( target ) ) )
+        else:
+            return None
+    return merges, drops
+
+def lumpSpines( elecid, targeted, keepAll = False ):
+    """Lumps every spine of elecid none of whose compartment paths are in
+    targeted. Returns a report dict."""
+    t0 = time.time()
+    spines = findSpines( elecid )
+    numCompts = len( moose.wildcardFind( elecid.path + '/#[ISA=CompartmentBase]' ) )
+    numObjects = len( moose.wildcardFind( elecid.path + '/#[ISA=CompartmentBase]/#' ) )
+    report = { 'numSpines': len( spines ), 'numLumped': 0, 'numExplicit': len( spines ),
+        'comptsRemoved': 0, 'chansMerged': 0, 'objectsDropped': 0,
+        'numCompts': numCompts, 'numObjects': numObjects }
+    if keepAll:
+        report['time'] = time.time() - t0
+        return report
+    doomed = []
+    for root, ( dend, compts ) in spines.items():
+        if any( cc.path in targeted for cc in compts ):
+            continue
+        plans = [ _lumpPlan( cc, dend ) for cc in compts ]
+        if any( pp is None for pp in plans ):
+            continue
+        for cc, ( merges, drops ) in zip( compts, plans ):
+            dend.Cm += cc.Cm
+            dend.Rm = 1.0 / ( 1.0 / dend.Rm + 1.0 / cc.Rm )
+            for chan, target in merges:
+                target.Gbar += chan.Gbar
+            report['chansMerged'] += len( merges )
+            report['objectsDropped'] += len( drops )
+        doomed.extend( compts )
+        report['numLumped'] += 1
+    for cc in doomed:
+        moose.delete( cc )
+    report['numExplicit'] = report['numSpines'] - report['numLumped']
+    report['comptsRemoved'] = len( doomed )
+    report['time'] = time.time() - t0
+    return report
+
+def printReport( report, laterBuildTime = None, spineBuildTime = None ):
+    print( "jardesigner: Spine lumping: {} of {} spines lumped, {} explicit; {} compartments removed, {} channels merged, {} objects dropped, {:.3f} sec".format(
+        report['numLumped'], report['numSpines'], report['numExplicit'],
+        report['comptsRemoved'], report['chansMerged'],
+        report['objectsDropped'], report['time'] ) )
+    # These are estimates from object counts, not measurements: HSolve
+    # work per step goes roughly with compartments plus the channels and
+    # concs in them, as do the later build phases. To measure, build
+    # the model with and without spineLumping under benchmark.
+    before = report['numCompts'] + report['numObjects']
+    removed = report['comptsRemoved'] + report['chansMerged'] + \
+        report['objectsDropped']
+    if before == 0 or removed == 0:
+        return
+    frac = min( removed / before, 1.0 )
+    print( "    Estimated (from object counts, not measured): {:.1f}% less elec run time".format( 100.0 * frac ) )
+    if laterBuildTime is None or frac >= 1.0:
+        return
+    saved = laterBuildTime * frac / ( 1.0 - frac )
+    # Building the lumped spines and then deleting them is the price.
+    cost = report['time']
+    if spineBuildTime is not None and report['numSpines'] > 0:
+        cost += spineBuildTime * report['numLumped'] / report['numSpines']
+    print( "    Estimated build time: {:.3f} sec saved in later phases, {:.3f} sec spent building and lumping the spines, net {:.3f} sec".format(
+        saved, cost, saved - cost ) )
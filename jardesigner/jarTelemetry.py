@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+####################################################################
+# jarTelemetry.py
+# Run telemetry for server-mode jardesigner workers. Status messages go
+# to the server through one daemon thread and one keep-alive HTTP
+# session, rather than a new thread and connection per message. Each
+# sample reports the real-time factor, the ETA to the end of the run,
+# steps per second for each clock family, RSS, CPU%, and the number of
+# frames waiting in the viewer pipeline. Per-run summaries are appended
+# to run_metadata.jsonl in the session directory for capacity planning,
+# one JSON line per run.
+#
+# Copyright (C) Upinder S. Bhalla NCBS 2025
+# This program is licensed under the GNU Public License version 3.
+####################################################################
+
+import os
+import json
+import time
+import queue
+import threading
+import requests
+import moose
+from . import jarTrace
+
+METADATA_FILENAME = "run_metadata.jsonl"
+MAX_SAMPLES = 200       # Samples kept per run for the metadata file.
+# Clock families, by a representative tick. See _configureClocks.
+_CLOCK_FAMILIES = { 'elec': 0, 'elecPlot': 8, 'diff': 10, 'chem': 11, 'chemPlot': 18 }
+
+class _Sender:
+    """Posts payloads to the server from a single thread. If the server
+    falls behind, the oldest unsent messages are dropped."""
+    def __init__( self, url, token ):
+        self.url = url
+        self.session = requests.Session()
+        self.session.headers.update( { 'X-Internal-Token': token } )
+        self.queue = queue.Queue( maxsize = 64 )
+        self.dropped = 0
+        threading.Thread( target = self._run, daemon = True ).start()
+
+    def send( self, channelId, payload ):
+        item = { "data_channel_id": channelId, "payload": payload }
+        while True:
+            try:
+                self.queue.put_nowait( item )
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _run( self ):
+        while True:
+            item = self.queue.get()
+            try:
+                with jarTrace.span( 'push' + item['payload'].get( 'type', '' ), 'push' ):
+                    self.session.post( self.url, json = item, timeout = 1.0 )
+            except Exception:
+                pass
+
+_sender = None
+
+def send( url, token, channelId, payload ):
+    global _sender
+    if _sender is None:
+        _sender = _Sender( url, token )
+    _sender.send( channelId, payload )
+
+
+class RunTelemetry:
+    """Samples the progress and resource use of one run."""
+    def __init__( self, runtime, mooView = None ):
+        clock = moose.element( '/clock' )
+        self.runtime = runtime
+        self.mooView = mooView
+        self.simStart = clock.currentTime
+        self.simEnd = clock.currentTime + runtime
+        self.dts = { name: clock.dts[tick] for name, tick in _CLOCK_FAMILIES.items()
+            if tick < len( clock.dts ) and clock.dts[tick] > 0 }
+        self.wallStart = time.time()
+        self.cpuStart = time.process_time()
+        self.last = ( self.wallStart, self.simStart, self.cpuStart )
+        self.peakRss = jarTrace.rss()
+        self.samples = []
+        # Keep every sampleStride'th sample. When the list fills up,
+        # every other one is dropped and the stride doubles, so the kept
+        # samples span the whole run.
+        self.sampleStride = 1
+        self.numSamples = 0
+
+    def sample( self ):
+        wall = time.time()
+        sim = moose.element( '/clock' ).currentTime
+        cpu = time.process_time()
+        rss = jarTrace.rss()
+        lastWall, lastSim, lastCpu = self.last
+        dwall = max( wall - lastWall, 1e-9 )
+        elapsed = max( wall - self.wallStart, 1e-9 )
+        rate = ( sim - lastSim ) / dwall
+        meanRate = ( sim - self.simStart ) / elapsed
+        self.last = ( wall, sim, cpu )
+        self.peakRss = max( self.peakRss, rss )
+        ret = {
+            'simTime': sim,
+            'wallTime': elapsed,
+            'realTimeFactor': rate,
+            'meanRealTimeFactor': meanRate,
+            'eta': ( self.simEnd - sim ) / meanRate if meanRate > 0 else None,
+            'stepsPerSec': { name: rate / dt for name, dt in self.dts.items() },
+            'rssMB': rss / 1e6,
+            'cpuPercent': 100.0 * ( cpu - lastCpu ) / dwall,
+            'queuedFrames': len( getattr( self.mooView, '_pendingFrames', [] ) ),
+        }
+        if self.numSamples % self.sampleStride == 0:
+            self.samples.append( ret )
+            if len( self.samples ) >= MAX_SAMPLES:
+                self.samples = self.samples[::2]
+                self.sampleStride *= 2
+        self.numSamples += 1
+        return ret
+
+    def finish( self, stopped = False, extra = None ):
+        """Returns the summary record of this run."""
+        last = self.sample()
+        wall = max( time.time() - self.wallStart, 1e-9 )
+        simRun = last['simTime'] - self.simStart
+        return {
+            'startedAt': self.wallStart,
+            'requestedRuntime': self.runtime,
+            'simTime': simRun,
+            'wallTime': wall,
+            'meanRealTimeFactor': simRun / wall,
+            'cpuTime': time.process_time() - self.cpuStart,
+            'peakRssMB': self.peakRss / 1e6,
+            'stepsPerSec': { name: simRun / wall / dt for name, dt in self.dts.items() },
+            'dts': self.dts,
+            'stopped': stopped,
+            'droppedMessages': _sender.dropped if _sender else 0,
+            **( extra or {} ),
+            'samples': self.samples,
+        }
+
+def appendRunMetadata( sessionDir, record ):
+    """Appends record as one line of the session's metadata file."""
+    fname = os.path.join( sessionDir, METADATA_FILENAME )
+    with open( fname, 'a' ) as f:
+        f.write( json.dumps( record ) + '\n' )
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+####################################################################
+# jarTickProfile.py
+# Wall-time accounting per clock tick and per solver class over a run.
+#
+# MOOSE does not time its ticks, so we put a probe PyRun at the end of
+# every active tick. Within a step the Clock runs ticks in index order,
+# and within a tick it runs objects in the order they were assigned, so
+# a probe made after the model is built runs last on its tick. The time
+# between successive probes is then the time spent on that tick. The
+# first tick of each step also absorbs the Clock's per-step overhead,
+# and each tick is charged for one probe call. PyRun compiles its
+# runString at reinit, so the probes must be installed before the
+# moose.reinit that precedes the run.
+#
+# Ticks as assigned by _configureClocks and _buildMoogli:
+#   0-7 elec and HSolve, 8 elec plots, 10 Dsolve, 11-17 Ksolve/Gsolve
+#   and Functions, 18 chem plots, 19 status/control PyRun, 20+ moogli.
+#
+# Copyright (C) Upinder S. Bhalla NCBS 2025
+# This program is licensed under the GNU Public License version 3.
+####################################################################
+
+import sys
+import time
+import moose
+
+NUM_TICKS = 32
+PROBE_PATH = '/jardes_tickProbe'
+# Classes that name a tick, most specific first.
+_SOLVER_CLASSES = [ 'HSolve', 'Dsolve', 'Ksolve', 'Gsolve', 'Stoich',
+    'Table2', 'Table', 'NSDFWriter', 'Function', 'PyRun' ]
+
+_prof = { 'enabled': False, 'installed': False, 'last': 0.0,
+    'time': [0.0] * NUM_TICKS, 'steps': [0] * NUM_TICKS,
+    'label': {}, 'numObj': {} }
+
+def probe( tick ):
+    now = time.perf_counter()
+    _prof['time'][tick] += now - _prof['last']
+    _prof['steps'][tick] += 1
+    _prof['last'] = now
+
+def enable( flag = True ):
+    _prof['enabled'] = flag
+
+def isEnabled():
+    return _prof['enabled']
+
+def _tickObjects( tick ):
+    """Returns {className: numObjects} for everything on tick."""
+    ret = {}
+    clock = moose.element( '/clock' )
+    for vv in clock.neighbors[ 'proc{}'.format( tick ) ]:
+        el = moose.element( vv )
+        if el.path.startswith( PROBE_PATH ):
+            continue
+        ret[el.className] = ret.get( el.className, 0 ) + len( moose.vec( vv ) )
+    return ret
+
+def _label( classes ):
+    for cname in _SOLVER_CLASSES:
+        if cname in classes:
+            return cname
+    if len( classes ) == 0:
+        return 'idle'
+    return max( classes, key = classes.get )
+
+def install():
+    """Makes the probes. Call once the model, plots, moogli and control
+    PyRuns have all been assigned their ticks, and before moose.reinit."""
+    if not _prof['enabled'] or moose.exists( PROBE_PATH ):
+        return
+    _prof['label'] = {}
+    _prof['numObj'] = {}
+    import __main__
+    __main__._jarTickProbe = probe
+    dts = moose.element( '/clock' ).dts
+    moose.Neutral( PROBE_PATH )
+    for tick in range( NUM_TICKS ):
+        if tick >= len( dts ) or dts[tick] <= 0:
+            continue
+        classes = _tickObjects( tick )
+        if len( classes ) == 0:
+            continue
+        pr = moose.PyRun( '{}/t{}'.format( PROBE_PATH, tick ) )
+        pr.runString = '_jarTickProbe({})'.format( tick )
+        pr.tick = tick
+        _prof['label'][tick] = _label( classes )
+        _prof['numObj'][tick] = sum( classes.values() )
+    _prof['installed'] = True
+
+def startRun():
+    """Zeroes the accumulators. Call just before moose.start."""
+    if not _prof['enabled']:
+        return
+    _prof['time'] = [0.0] * NUM_TICKS
+    _prof['steps'] = [0] * NUM_TICKS
+    _prof['last'] = time.perf_counter()
+
+def resume():
+    """Call before a moose.start that continues the current run, so that
+    time spent between chunks is not charged to the first tick."""
+    _prof['last'] = time.perf_counter()
+
+def summary():
+    """Returns per-tick and per-solver wall times accumulated so far."""
+    ticks = []
+    solvers = {}
+    for tick in sorted( _prof['label'] ):
+        t = _prof['time'][tick]
+        n = _prof['steps'][tick]
+        label = _prof['label'][tick]
+        ticks.append( { 'tick': tick, 'solver': label, 'numObj': _prof['numObj'][tick],
+            'steps': n, 'wallTime': t, 'usPerStep': 1e6 * t / n if n else 0.0 } )
+        ss = solvers.setdefault( label, { 'solver': label, 'wallTime': 0.0, 'ticks': [] } )
+        ss['wallTime'] += t
+        ss['ticks'].append( tick )
+    return { 'ticks': ticks,
+        'solvers': sorted( solvers.values(), key = lambda x: -x['wallTime'] ) }
+
+def printReport():
+    if not _prof['enabled'] or not _prof['installed']:
+        return
+    ss = summary()
+    total = sum( tt['wallTime'] for tt in ss['ticks'] )
+    if total <= 0:
+        return
+    print( "Wall time by clock tick:" )
+    print( "  {:>4} {:<10} {:>8} {:>10} {:>10} {:>9} {:>6}".format(
+        "tick", "solver", "objects", "steps", "time (s)", "us/step", "%" ) )
+    for tt in ss['ticks']:
+        print( "  {:>4} {:<10} {:>8} {:>10} {:>10.3f} {:>9.2f} {:>6.1f}".format(
+            tt['tick'], tt['solver'], tt['numObj'], tt['steps'],
+            tt['wallTime'], tt['usPerStep'], 100 * tt['wallTime'] / total ) )
+    print( "Wall time by solver:" )
+    for sv in ss['solvers']:
+        print( "  {:<10} {:>10.3f} s {:>6.1f}%   ticks {}".format( sv['solver'],
+            sv['wallTime'], 100 * sv['wallTime'] / total, sv['ticks'] ) )
+    sys.stdout.flush()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+####################################################################
+# jarTrace.py
+# Span tracing for jardesigner builds and runs. When enabled, each
+# span records wall and CPU time, the change in resident memory, and
+# optional object counts. The trace is written in the Chrome trace
+# event format, which loads directly into chrome://tracing or Perfetto.
+# When disabled, span() costs one dict lookup.
+#
+# Copyright (C) Upinder S. Bhalla NCBS 2025
+# This program is licensed under the GNU Public License version 3.
+####################################################################
+
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager
+
+TRACE_FILENAME = "jardes_trace.json"
+MAX_EVENTS = 200000     # Spans beyond this are counted but not kept.
+
+_trace = { 'enabled': False, 'events': [], 'dropped': 0, 't0': 0.0 }
+_lock = threading.Lock()
+try:
+    _PAGE_SIZE = os.sysconf( 'SC_PAGE_SIZE' )
+except ( ValueError, AttributeError, OSError ):
+    _PAGE_SIZE = 4096
+
+def rss():
+    """Current resident set size of this process in bytes."""
+    try:
+        with open( '/proc/self/statm' ) as f:
+            return int( f.read().split()[1] ) * _PAGE_SIZE
+    except OSError:
+        import resource     # Peak, not current, but better than nothing.
+        return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss * 1024
+
+def enable( flag = True ):
+    _trace['enabled'] = flag
+    if flag and _trace['t0'] == 0.0:
+        _trace['t0'] = time.perf_counter()
+
+def isEnabled():
+    return _trace['enabled']
+
+def reset():
+    with _lock:
+        _trace['events'] = []
+        _trace['dropped'] = 0
+        _trace['t0'] = time.perf_counter()
+
+def _addEvent( ev ):
+    with _lock:
+        if len( _trace['events'] ) < MAX_EVENTS:
+            _trace['events'].append( ev )
+        else:
+            _trace['dropped'] += 1
+
+@contextmanager
+def span( name, cat = 'build', countFunc = None, **args ):
+    """Records a span around the enclosed block. The yielded dict can be
+    filled with counts while the span is open. countFunc, if given, is
+    called after the span is timed and should return a dict of object
+    counts; its cost is not charged to the span."""
+    if not _trace['enabled']:
+        yield {}
+        return
+    counts = {}
+    r0 = rss()
+    c0 = time.process_time()
+    t0 = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        t1 = time.perf_counter()
+        c1 = time.process_time()
+        r1 = rss()
+        if countFunc:
+            try:
+                counts.update( countFunc() )
+            except Exception:
+                pass
+        args.update( counts )
+        args['cpuMs'] = round( ( c1 - c0 ) * 1e3, 3 )
+        args['rssDeltaKB'] = ( r1 - r0 ) // 1024
+        args['rssKB'] = r1 // 1024
+        _addEvent( { 'name': name, 'cat': cat, 'ph': 'X',
+            'ts': ( t0 - _trace['t0'] ) * 1e6, 'dur': ( t1 - t0 ) * 1e6,
+            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args } )
+
+def counter( name, values, cat = 'run' ):
+    """Records a counter sample, drawn as a track in the trace viewer."""
+    if not _trace['enabled']:
+        return
+    _addEvent( { 'name': name, 'cat': cat, 'ph': 'C',
+        'ts': ( time.perf_counter() - _trace['t0'] ) * 1e6,
+        'pid': os.getpid(), 'args': values } )
+
+def writeTrace( fname ):
+    """Writes all events recorded so far to fname as Chrome trace JSON."""
+    if not _trace['enabled']:
+        return
+    with _lock:
+        events = list( _trace['events'] )
+        dropped = _trace['dropped']
+    meta = [ { 'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+        'args': { 'name': 'jardesigner' } } ]
+    with open( fname, 'w' ) as f:
+        json.dump( { 'traceEvents': meta + events, 'displayTimeUnit': 'ms',
+            'otherData': { 'droppedEvents': dropped } }, f )
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+####################################################################
+# jarWiring.py
+# Bulk message wiring for jardesigner. Plots, stims and adaptors each
+# connect a vec of sources to many targets. Rather than make one message
+# per target from Python, we group the targets by the Element they
+# belong to and make a single OneToOne or OneToAll message per group
+# where the mapping allows it. pymoose cannot make Sparse messages
+# between vecs of different lengths, nor pairFill them, so every other
+# mapping is wired with per-element connects.
+#
+# Copyright (C) Upinder S. Bhalla NCBS 2025
+# This program is licensed under the GNU Public License version 3.
+####################################################################
+
+import time
+import moose
+
+# Accumulated over a build, reported by buildModel in benchmark mode.
+wiringStats = { 'time': 0.0, 'targets': 0, 'bulkMsgs': 0, 'singleMsgs': 0 }
+
+def resetWiringStats():
+    for key in wiringStats:
+        wiringStats[key] = 0
+    wiringStats['time'] = 0.0
+
+def printWiringStats():
+    print( "- Wiring: {} targets in {} bulk and {} single msgs, {:.3f} sec".format(
+        wiringStats['targets'], wiringStats['bulkMsgs'],
+        wiringStats['singleMsgs'], wiringStats['time'] ) )
+
+def _isIdentity( idx, n ):
+    return len( idx ) == n and all( i == j for i, j in enumerate( idx ) )
+
+def _connectPairs( srcVec, srcField, srcIdx, destVec, destField, destIdx ):
+    n = len( srcIdx )
+    wiringStats['targets'] += n
+    if n == 1:
+        moose.connect( srcVec[srcIdx[0]], srcField, destVec[destIdx[0]], destField )
+        wiringStats['singleMsgs'] += 1
+        return
+    numSrc = len( srcVec )
+    numDest = len( destVec )
+    if numSrc == numDest and _isIdentity( srcIdx, numSrc ) and _isIdentity( destIdx, numDest ):
+        moose.connect( srcVec, srcField, destVec, destField, 'OneToOne' )
+    elif numSrc == 1 and _isIdentity( sorted( destIdx ), numDest ):
+        moose.connect( srcVec[0], srcField, destVec, destField, 'OneToAll' )
+    else:
+        for si, di in zip( srcIdx, destIdx ):
+            moose.connect( srcVec[int(si)], srcField, destVec[int(di)], destField )
+        wiringStats['singleMsgs'] += n
+        return
+    wiringStats['bulkMsgs'] += 1
+
+def connectPairs( srcVec, srcField, srcIdx, destVec, destField, destIdx ):
+    """Connects srcVec[srcIdx[k]] to destVec[destIdx[k]] for all k, using
+    a single message between the two vecs where possible."""
+    if len( srcIdx ) == 0:
+        return
+    t0 = time.time()
+    _connectPairs( srcVec, srcField, srcIdx, destVec, destField, destIdx )
+    wiringStats['time'] += time.time() - t0
+
+def connectMany( srcVec, srcField, srcIdx, destList, destField ):
+    """Connects srcVec[srcIdx[k]] to destList[k] for all k. The targets
+    are grouped by their Element so that each group is wired with one
+    message. Targets that are entries in FieldElements are connected
+    one at a time."""
+    if len( destList ) == 0:
+        return
+    t0 = time.time()
+    groups = {}
+    for si, dest in zip( srcIdx, destList ):
+        if dest.fieldIndex != 0:
+            moose.connect( srcVec[si], srcField, dest, destField )
+            wiringStats['targets'] += 1
+            wiringStats['singleMsgs'] += 1
+            continue
+        key = dest.id.idValue
+        if key not in groups:
+            groups[key] = ( dest.vec, [], [] )
+        groups[key][1].append( si )
+        groups[key][2].append( dest.dataIndex )
+    for destVec, si, di in groups.values():
+        _connectPairs( srcVec, srcField, si, destVec, destField, di )
+    wiringStats['time'] += time.time() - t0
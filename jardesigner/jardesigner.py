@@ -19,6 +19,7 @@
 import json
 import jsonschema
 import importlib.util
+import inspect
 import os
 import moose
 import numpy as np
@@ -26,16 +27,25 @@ import math
 import sys
 import time
 import threading
+import subprocess
+import tempfile
+import shutil
 import queue
 import matplotlib.pyplot as plt
 import argparse
-import requests
 import csv
 import traceback
 from . import jarmoogli
 from . import jardesignerProtos as jp
 from . import jarReacGraph as jrg
 from . import fixXreacs
+from . import jarWiring
+from . import jarTrace
+from . import jarTickProfile
+from . import jarTelemetry
+from . import jarMorphReduce
+from . import jarSpineLump
+from . import jarChanCache
 
 from moose.neuroml.NeuroML import NeuroML
 from moose.neuroml.ChannelML import ChannelML
@@ -46,6 +56,7 @@ _sim_flags = {
     'stop': False, 'reset_pending': False,
     'last_status_wallclock': 0.0,
     'data_channel_id': None,
+    'telemetry': None,      # jarTelemetry.RunTelemetry of the current run
 }
 _STATUS_URL   = "http://127.0.0.1:5000/internal/push_data"
 _STATUS_TOKEN = os.environ.get('JARDESIGNER_INTERNAL_TOKEN', '')
@@ -54,21 +65,18 @@ def _stdin_reader():
     for line in sys.stdin:
         _cmd_queue.put(line)
 
-def _send_time_update_async(sim_time):
+def _send_status():
     channel_id = _sim_flags['data_channel_id']
     if not channel_id:
         return
-    def _post():
-        try:
-            requests.post(_STATUS_URL,
-                          json={"data_channel_id": channel_id,
-                                "payload": {"type": "sim_time_update",
-                                            "currentTime": sim_time}},
-                          headers={'X-Internal-Token': _STATUS_TOKEN},
-                          timeout=1.0)
-        except Exception:
-            pass
-    threading.Thread(target=_post, daemon=True).start()
+    payload = {"type": "sim_time_update",
+               "currentTime": moose.element('/clock').currentTime}
+    if _sim_flags['telemetry']:
+        payload['telemetry'] = _sim_flags['telemetry'].sample()
+    jarTelemetry.send(_STATUS_URL, _STATUS_TOKEN, channel_id, payload)
+    if jarTickProfile.isEnabled():
+        jarTelemetry.send(_STATUS_URL, _STATUS_TOKEN, channel_id,
+                          {"type": "tick_profile", **jarTickProfile.summary()})
 
 def _pyrun_check():
     # Check for stop/reset commands from the client
@@ -92,7 +100,7 @@ def _pyrun_check():
     now = time.time()
     if now - _sim_flags['last_status_wallclock'] >= 0.5:
         _sim_flags['last_status_wallclock'] = now
-        _send_time_update_async(moose.element('/clock').currentTime)
+        _send_status()
 
 knownFieldInfo = {
     'Vm': {'fieldScale': 1000, 'dataUnits': 'mV', 
@@ -131,11 +139,100 @@ DefaultFdict = { "title": "Elec compartments",
     "iconNum": 0 
 }
 
+def plotGridShape( numPlots ):
+    """Returns nrows, ncols, and the figure size for numPlots plots."""
+    FIG_HT = 5
+    FIG_WID = 6
+    if numPlots <= 3:
+        nrows = numPlots
+        ncols = 1
+    elif numPlots == 4:
+        nrows = 2
+        ncols = 2
+    elif numPlots <= 6:
+        nrows = 3
+        ncols = 2
+    else:
+        nrows = int( np.sqrt( numPlots -1 ) )+1
+        ncols = 1 + (numPlots -1) // nrows
+    
+    if numPlots <= 9:   
+        sx = ncols * FIG_WID
+        sy = nrows * FIG_HT
+    else:
+        sx = 3 * FIG_HT
+        sy = 3 * FIG_WID
+    return nrows, ncols, sx, sy
+
 class AnimationEvent():
     def __init__(self, key, time):
         self.key = key
         self.time = time
 
+class PopulationRecorder():
+    """Keeps population statistics for one plot across the numModels
+    copies. Each model records into its own Table vec as usual, but the
+    tables are emptied by flush() after every run chunk, so only
+    the statistics and a few sample traces are kept between chunks."""
+    def __init__( self, tabPaths, percentiles, numTraces ):
+        self.tabPaths = tabPaths    # One Table vec path per model
+        self.percentiles = list( percentiles )
+        numTraces = min( numTraces, len( tabPaths ) )
+        self.traceModels = sorted( np.random.choice( len( tabPaths ), numTraces, replace = False ) )
+        self.chunks = []    # List of dicts of stats arrays for each chunk
+
+    @property
+    def dt( self ):
+        # Read from the table as clocks are only assigned after plots.
+        return moose.vec( self.tabPaths[0] )[0].dt
+
+    def reset( self ):
+        self.chunks = []
+
+    def flush( self ):
+        vecs = [ moose.vec( pp ) for pp in self.tabPaths ]
+        tabs = [ [ tt.vector for tt in vv ] for vv in vecs ]
+        numSamples = min( len( tt ) for vv in tabs for tt in vv )
+        if numSamples == 0:
+            return
+        # data has shape (numModels, numObj, numSamples)
+        data = np.array( [ [ tt[:numSamples] for tt in vv ] for vv in tabs ] )
+        chunk = { 'mean': data.mean( axis = 0 ), 'std': data.std( axis = 0 ),
+            'traces': data[ self.traceModels ] }
+        if len( self.percentiles ) > 0:
+            chunk['pct'] = np.percentile( data, self.percentiles, axis = 0 )
+        self.chunks.append( chunk )
+        for vv in vecs:
+            for tt in vv:
+                tt.clearVec()
+
+    def series( self ):
+        """Returns a list of labels and a list of 1-D arrays, one for each
+        line to plot: mean, std, each percentile, then the kept traces."""
+        if len( self.chunks ) == 0:
+            return [], []
+        def joined( key ):
+            return np.concatenate( [ cc[key] for cc in self.chunks ], axis = -1 )
+        labels = []
+        ret = []
+        mean = joined( 'mean' )
+        std = joined( 'std' )
+        for obj in range( len( mean ) ):
+            labels.extend( [ "mean[{}]".format( obj ), "std[{}]".format( obj ) ] )
+            ret.extend( [ mean[obj], std[obj] ] )
+        if len( self.percentiles ) > 0:
+            pct = joined( 'pct' )
+            for pp, pval in zip( self.percentiles, pct ):
+                for obj in range( len( pval ) ):
+                    labels.append( "p{}[{}]".format( pp, obj ) )
+                    ret.append( pval[obj] )
+        traces = joined( 'traces' )
+        for mm, trace in zip( self.traceModels, traces ):
+            for obj in range( len( trace ) ):
+                labels.append( "model{}[{}]".format( mm, obj ) )
+                ret.append( trace[obj] )
+        return labels, ret
+
 class DictToClass:
     def __init__(self, input_dict):
         for key, value in input_dict.items():
@@ -150,6 +247,15 @@ except ImportError:
 
 meshOrder = ['soma', 'dend', 'spine', 'psd', 'psd_dend', 'presyn_dend', 'presyn_spine', 'endo']
 
+# Build phases after which cached query answers must be discarded.
+# elecTreePhases add or replace compartments in the elec tree, so every
+# entry goes. chemTreePhases only add chem compartments, so just the
+# wildcardFind entries go. _buildExtras is in the elec list but only
+# invalidates when there is a tweakFunc to run.
+elecTreePhases = ['installCellFromProtos', '_reduceMorphology', 'buildSpineDistrib', '_lumpSpines',
+    'makeArrayOfModels', '_buildExtras']
+chemTreePhases = ['buildChemDistrib']
+
 # Deprecated. Use knownFieldInfo which is a dict defined above.
 knownFieldsDefault = {
     'Vm':('CompartmentBase', 'getVm', 1000, 'Memb. Potential (mV)', -80.0, 40.0 ),
@@ -173,7 +279,8 @@ def _profile(func):
     """
     def wrap(self=None, *args, **kwargs):
         t0 = time.time()
-        result = func(self, *args, **kwargs)
+        with jarTrace.span( func.__name__, 'profile' ):
+            result = func(self, *args, **kwargs)
         print("[INFO ] Took %s sec" % (time.time()-t0))
         return result
     return wrap
@@ -303,6 +410,7 @@ class JarDesigner:
         self.sessionDir = sessionDir # Used for server-mode jardes
         self.runMooView = None      # Used for runtime display
         self.setupMooView = None    # Used to see model during construction
+        self.showViewer = True      # False on shards that do not hold model 0
         self.stims = []
         self.moogli = []
         self.chanDistrib = []
@@ -312,20 +420,22 @@ class JarDesigner:
         self.comptDict = {}     # dict of chem compartments
         self.meshDict = {}      # dict of neuroMesh,spineMesh,psdMesh etc
         self.meshMols = {}      # dict of meshName:[molPathTail] in each mesh
+        self._resetQueryCache()
+        self._voxelIndexCache = {}  # dict of meshPath:{voxel lookup arrays}
         # Construct the absolute path to the schema file
         script_dir = os.path.dirname(os.path.abspath(__file__))
         schemaFile_path = os.path.join(script_dir, schemaFile)
 
         if not jsonFile and not jsonData:
             print( "No model specified either as file or data" )
-            quit()
+            quit( 1 )
         if jsonFile and not jsonFile.endswith(".json"):
             print(f"Model file '{jsonFile}' is not a json file.")
-            quit()
+            quit( 1 )
         if plotFile != None:
             if not (plotFile.endswith(".svg") or plotFile.endswith(".png") or plotFile.endswith(".json") ):
                 print(f"Plot file '{plotFile}' should be json or svg or png.")
-                quit()
+                quit( 1 )
         self.plotFile = plotFile
         with open(schemaFile_path) as f:
             try:
@@ -333,14 +443,14 @@ class JarDesigner:
             except json.JSONDecodeError as e:
                 print(f"schema file {schemaFile_path} did not load")
                 print( e )
-                quit()
+                quit( 1 )
         if jsonFile:
             with open(jsonFile) as f:
                 try:
                     data = json.load(f)
                 except:
                     print(f"{jsonFile} did not load")
-                    quit()
+                    quit( 1 )
         if jsonData:
             data = jsonData
         try:
@@ -353,7 +463,7 @@ class JarDesigner:
                 jsonschema.validate(instance=data, schema=schema)
         except jsonschema.exceptions.ValidationError as e:
             print(f"{jsonFile} fails to pass schema: {e}")
-            quit()
+            quit( 1 )
 
         #### Now we load in all the fields of the jardesigner class
         for key, value in data.items():
@@ -369,25 +479,33 @@ class JarDesigner:
         self.plotNames = [] # Need to get rid of this, use the existing dict
         self.wavePlotNames = [] # Need to get rid of this, use the existing dict
 
+        if self.benchmark:
+            jarTrace.enable()
+            jarTickProfile.enable()
         if not moose.exists( '/library' ):
             library = moose.Neutral( '/library' )
         ## Build the protos
         try:
-            self.buildCellProto()
-            self.buildChanProto()
-            self.buildSpineProto()
-            self.buildChemProto()
+            for protoFunc in [ self.buildCellProto, self.buildChanProto,
+                    self.buildSpineProto, self.buildChemProto ]:
+                with jarTrace.span( protoFunc.__name__, 'proto' ):
+                    protoFunc()
         except BuildError as msg:
             print("Error: jardesigner: Prototype build failed:", msg)
-            quit()
+            quit( 1 )
 
     ################################################################
     def _printModelStats( self ):
         if not self.verbose:
             return
+        # The Neuron's spine tables are filled when spines are inserted,
+        # so after lumping they still count the lumped spines.
+        numSpines = self.elecid.numSpines
+        if hasattr( self, 'spineLumpReport' ):
+            numSpines = self.spineLumpReport['numExplicit']
         print("jardesigner: Elec model has",
             self.elecid.numCompartments, "compartments and",
-            self.elecid.numSpines, "spines on",
+            numSpines, "spines on",
             len( self.comptDict ), "compartments.")
         if hasattr( self , 'chemid') and len( self.chemDistrib ) > 0:
             #  dmstoich = moose.element( self.dendCompt.path + '/stoich' )
@@ -397,7 +515,9 @@ class JarDesigner:
                 print( "    | In {}, {} voxels X {} pools".format( j.name, j.mesh.num, s.numAllPools ) )
 
     def buildModel( self, modelPath = '/model', numModels = 1, 
-            placementFunc = None, tweakFunc = None ):
+            placementFunc = None, tweakFunc = None, modelRange = None ):
+        # modelRange selects which of the numModels this process builds.
+        # It is used by sharded runs, where each worker builds a slice.
         if moose.exists( modelPath ):
             print("jardesigner::buildModel: Build failed. Model '",
                 modelPath, "' already exists.")
@@ -405,10 +525,16 @@ class JarDesigner:
         self.model = moose.Neutral( modelPath )
         self.modelPath = modelPath
         self.numModels = numModels
+        if modelRange is None:
+            modelRange = range( numModels )
+        self.modelRange = modelRange
         self.placementFunc = placementFunc
         self.tweakFunc = tweakFunc
-        funcs = [self.installCellFromProtos, self.buildPassiveDistrib
-            , self.buildChanDistrib, self.buildSpineDistrib
+        self._resetQueryCache()
+        jarWiring.resetWiringStats()
+        funcs = [self.installCellFromProtos, self._reduceMorphology
+            , self.buildPassiveDistrib
+            , self.buildChanDistrib, self.buildSpineDistrib, self._lumpSpines
             , self.makeArrayOfModels
             , self.buildChemDistrib
             , self._configureChemSolvers
@@ -419,23 +545,43 @@ class JarDesigner:
             , self._configureClocks, self._printModelStats]
 
         #funcs = [self.installCellFromProtos, self.buildPassiveDistrib]
+        self._phaseTimes = {}
         for i, _func in enumerate(funcs):
             if self.benchmark:
                 print("- (%02d/%d) Executing %25s"%(i+1, len(funcs), _func.__name__), end=' ' )
             t0 = time.time()
             try:
-                _func()
+                with jarTrace.span( _func.__name__, 'build',
+                        countFunc = self._traceObjectCounts ):
+                    _func()
             except BuildError as msg:
                 print("Error: jardesigner: model build failed:", msg)
                 moose.delete(self.model)
                 return False
             t = time.time() - t0
+            self._phaseTimes[_func.__name__] = t
+            if _func.__name__ == '_buildExtras' and not self.tweakFunc:
+                pass
+            elif _func.__name__ in elecTreePhases:
+                self._invalidateQueryCache()
+            elif _func.__name__ in chemTreePhases:
+                self._invalidateQueryCache( elecToo = False )
             if self.benchmark:
                 msg = r'    ... DONE'
                 if t > 0.01:
                     msg += ' %.3f sec' % t
                 print(msg)
             sys.stdout.flush()
+        if hasattr( self, 'spineLumpReport' ) and ( self.verbose or self.benchmark ):
+            names = [ ff.__name__ for ff in funcs ]
+            later = names[ names.index( '_lumpSpines' ) + 1: ]
+            jarSpineLump.printReport( self.spineLumpReport,
+                sum( self._phaseTimes[nn] for nn in later ),
+                self._phaseTimes['buildSpineDistrib'] )
+        if self.benchmark:
+            self._printQueryStats()
+            jarWiring.printWiringStats()
+            self._writeTrace()
         if self.statusDt > min( self.elecDt, self.chemDt, self.diffDt ):
             pr = moose.PyRun( modelPath + '/updateStatus' )
             pr.initString = "_status_t0 = time.time()"
@@ -445,6 +591,55 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             moose.setClock( pr.tick, self.statusDt )
         return True
 
+    ################################################################
+    # Build-scoped cache for compartmentsFromExpression and wildcardFind.
+    # The same path expressions are looked up by the chem, plot, stim and
+    # moogli phases, so we keep the answers until buildModel reaches a
+    # phase in elecTreePhases or chemTreePhases.
+    ################################################################
+    def _resetQueryCache( self ):
+        self._queryCache = {}
+        self._queryStats = { 'hits': 0, 'misses': 0 }
+
+    def _invalidateQueryCache( self, elecToo = True ):
+        if elecToo:
+            self._queryCache.clear()
+            return
+        for key in [ kk for kk in self._queryCache if kk[0] == 'wildcardFind' ]:
+            del self._queryCache[key]
+
+    def _comptsFromExpr( self, elecid, path, geomExpr = '1' ):
+        # Key on the canonical path so that an elecid held from install
+        # time and one looked up later for the same model share entries.
+        key = ( moose.element( elecid ).path, path, geomExpr )
+        ret = self._queryCache.get( key )
+        if ret is None:
+            self._queryStats['misses'] += 1
+            ret = elecid.compartmentsFromExpression[ path + ' ' + geomExpr ]
+            self._queryCache[key] = ret
+        else:
+            self._queryStats['hits'] += 1
+        return ret
+
+    def _cachedWildcardFind( self, wildcard ):
+        key = ( 'wildcardFind', wildcard )
+        ret = self._queryCache.get( key )
+        if ret is None:
+            self._queryStats['misses'] += 1
+            ret = moose.wildcardFind( wildcard )
+            self._queryCache[key] = ret
+        else:
+            self._queryStats['hits'] += 1
+        return ret
+
+    def _printQueryStats( self ):
+        hits = self._queryStats['hits']
+        total = hits + self._queryStats['misses']
+        if total == 0:
+            return
+        print( "- Query cache: {} lookups, {} hits ({:.1f}%)".format(
+            total, hits, 100.0 * hits / total ) )
+
     def installCellFromProtos( self ):
         if self.stealCellFromLibrary:
             moose.move( self.elecid, self.model )
@@ -694,10 +889,33 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             else:
                 return name[slash+1:period]
 
+    def _chanSourceFile( self, cp ):
+        # The file whose contents define the channel, for the cache key.
+        src = cp['source']
+        if cp['type'] == 'neuroml':
+            return src
+        if callable( src ):
+            return None
+        modPos = src.rfind( '.', 0, max( src.find( '()' ), 0 ) )
+        if modPos != -1:
+            return os.path.realpath( src[0:modPos] ) + '.py'
+        return jp.__file__
+
     def buildChanProto( self ):
         if hasattr( self, "chanProto" ):
             for cp in self.chanProto:
                 ctype = cp["type"]
+                path = '/library/' + cp['name']
+                key = None
+                if ctype in ( 'builtin', 'neuroml' ) and not moose.exists( path ) \
+                        and jarChanCache.isEnabled():
+                    try:
+                        key = jarChanCache.cacheKey( cp['name'], str( cp['source'] ),
+                            self._chanSourceFile( cp ), self.temperature )
+                    except OSError:
+                        key = None
+                    if key and jarChanCache.load( key, path ) is not None:
+                        continue
                 if ctype == 'builtin':
                     self.buildProtoFromFunction( cp['source'], cp['name'] )
                 elif ctype == 'neuroml':
@@ -707,6 +925,8 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                     if chanName != cp['name']:
                         chan = moose.element( '/library/' + chanName )
                         chan.name = cp['name']
+                if key and moose.exists( path ):
+                    jarChanCache.save( key, moose.element( path ) )
 
     def buildChemProto( self ):
         if hasattr( self, "chemProto" ):
@@ -824,6 +1044,28 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
     ################################################################
     # Here we set up the distributions
     ################################################################
+    def _reduceMorphology( self ):
+        if not hasattr( self, 'morphReduction' ):
+            return
+        mr = self.morphReduction
+        paths = list( mr['keep'] )
+        for key, fields in [ ( 'plots', ['path'] ), ( 'stims', ['path'] ),
+                ( 'adaptors', ['source', 'dest'] ), ( 'moogli', ['path'] ),
+                ( 'files', ['path'] ) ]:
+            for entry in getattr( self, key, [] ):
+                paths.extend( entry[ff] for ff in fields if ff in entry )
+        report = jarMorphReduce.reduceCell( self.elecid, mr['lambdaFraction'],
+            getattr( self, 'passiveDistrib', [] ),
+            jarMorphReduce.namedCompartments( paths ), mr['checkAccuracy'] )
+        if report is None:
+            print( "Warning: jardesigner: morphReduction skipped, cell does not use plain Compartments" )
+            return
+        self.morphReductionReport = report
+        if report['numAfter'] < report['numBefore']:
+            self.elecid.buildSegmentTree()
+        if self.verbose or self.benchmark:
+            jarMorphReduce.printReport( report )
+
     def buildPassiveDistrib( self ):
 	# [path field expr [field expr]...]
         # RM, RA, CM set specific values, per unit area etc.
@@ -882,6 +1124,71 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
 
         self.elecid.spineDistribution = temp
 
+    def _lumpSpines( self ):
+        if not hasattr( self, 'spineLumping' ) or not hasattr( self, 'spineDistrib' ):
+            return
+        keepAll, targeted = self._spineLumpTargets()
+        self.spineLumpReport = jarSpineLump.lumpSpines( self.elecid, targeted, keepAll )
+        if self.spineLumpReport['numLumped'] > 0:
+            self.elecid.buildSegmentTree()
+
+    def _chemMeshType( self, name ):
+        for i in getattr( self, 'chemDistrib', [] ):
+            if i['proto'] == name:
+                return i['type']
+        return name if name in [ 'dend', 'spine', 'psd' ] else None
+
+    def _reachedCompts( self, path, geomExpr, relpath, field ):
+        """Returns the compartments that own the objects a stim, plot or
+        file entry reaches: those on path and geomExpr, narrowed to the
+        ones that hold relpath when the field is on an object inside
+        the compartment."""
+        dummy = moose.element( '/' )
+        compts = [ cc for cc in self._comptsFromExpr( self.elecid, path, geomExpr )
+            if cc != dummy ]
+        if field in [ 'n', 'conc', 'nInit', 'concInit', 'volume', 'increment' ]:
+            # A dend mesh leaves spine compartments to the spine meshes.
+            pos = relpath.find( '/' ) if relpath else -1
+            if pos != -1 and self._chemMeshType( relpath[:pos] ) == 'dend':
+                return []
+            return compts
+        kf = knownFieldsDefault.get( field )
+        if ( kf and kf[0] == 'CompartmentBase' ) or not relpath or relpath == '.':
+            return compts
+        return [ cc for cc in compts if moose.exists( cc.path + '/' + relpath ) ]
+
+    def _spineLumpTargets( self ):
+        """Returns ( keepAll, paths of the compartments whose spines must
+        stay explicit ) for spine lumping."""
+        targeted = set()
+        for path in self.spineLumping['keep']:
+            targeted.update( cc.path for cc in self._reachedCompts( path, '1', None, None ) )
+        for key in [ 'plots', 'files' ]:
+            for i in getattr( self, key, [] ):
+                targeted.update( cc.path for cc in self._reachedCompts(
+                    i['path'], '1', i.get( 'relpath' ), i['field'] ) )
+        for i in getattr( self, 'stims', [] ):
+            targeted.update( cc.path for cc in self._reachedCompts( i['path'],
+                i.get( 'geomExpr', '1' ), i.get( 'relpath' ), i.get( 'field' ) ) )
+        # A moogli of '#' shows lumped spines as part of their dendrites,
+        # so only moogli paths that name spines keep them.
+        for i in getattr( self, 'moogli', [] ):
+            if jarSpineLump.isSpinePath( i['path'] ):
+                targeted.update( cc.path for cc in self._reachedCompts(
+                    i['path'], '1', i.get( 'relpath' ), i['field'] ) )
+        # Adaptors reach every compartment on their chem mesh. Only
+        # spine-type meshes, or the 'spine' elec path, reach spines.
+        keepAll = False
+        for i in getattr( self, 'adaptors', [] ):
+            mesh, name = self.findMeshOnName( i['source'] )
+            elecPath = i['dest']
+            if mesh == "":
+                mesh, name = self.findMeshOnName( i['dest'] )
+                elecPath = i['source']
+            if elecPath == 'spine' or self._chemMeshType( mesh ) != 'dend':
+                keepAll = True
+        return keepAll, targeted
+
     def newChemDistrib( self, argList, comptDict ):
         if not moose.exists( '/model/chem' ):
             moose.Neutral( '/model/chem' )
@@ -949,18 +1256,16 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
         elecPath = argList['path']
         meshType = argList['type']
         mesh = moose.PresynMesh( '/model/chem/' + chemSrc )
-        #pair = elecPath + " " + geom
-        pair = elecPath + " 1"
         if meshType == 'presyn_dend':
             presynRadius = float( argList["radius"] )
             presynRadiusSdev = float( argList["radiusSdev"] )
             presynSpacing = float( argList["spacing"] )
-            elecList = self.elecid.compartmentsFromExpression[ pair ]
+            elecList = self._comptsFromExpr( self.elecid, elecPath )
             mesh.buildOnDendrites( elecList, presynSpacing )
         else:
             presynRadius = float( argList["radiusByPsd"] )
             presynRadiusSdev = float( argList["radiusByPsdSdev"] )
-            elecList = self.elecid.compartmentsFromExpression[ pair ]
+            elecList = self._comptsFromExpr( self.elecid, elecPath )
             mesh.buildOnSpineHeads( elecList )
         mesh.setRadiusStats( presynRadius, presynRadiusSdev )
         return mesh
@@ -1016,6 +1321,7 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
         self._fixSpine()
         for model in self.modelList:
             self._buildOneChemDistrib( model )
+        self._buildVoxelIndex()
 
     def _buildOneChemDistrib( self, model ):
         sortedChemDistrib = sorted( self.chemDistrib, key = lambda c: meshOrder.index( c['type'] ) )
@@ -1032,11 +1338,9 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                 dendMesh = moose.element(self.meshDict[i['proto']])
                 if self.verbose:
                     print( "DendMesh path = ", dendMesh.path )
-                #pair = i['path'] + " " + geom
-                pair = i['path'] + " 1"
                 dendMesh.diffLength = i.get( 'diffusionLength', self.diffusionLength )
 
-                dendMesh.subTree = self.elecid.compartmentsFromExpression[ pair ]
+                dendMesh.subTree = self._comptsFromExpr( self.elecid, i['path'] )
             '''
             if i['type'] == 'endo' or i['type'] == 'endo_axial': 
                 # Should come after dend
@@ -1051,32 +1355,74 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
     # Here we make copies of the model in nx and ny.
     ################################################################
 
-    def _positionModelObj( self, obj, idx ):
+    def _placementOffsets( self ):
+        """Returns an (numModels, 3) array of model offsets, or None if
+        there is no placementFunc."""
         if not self.placementFunc:
-            return
-        dx, dy, dz = self.placementFunc( self.numModels, idx )
-        for ee in moose.wildcardFind(obj.path+"/##[ISA=CompartmentBase]"):
-            ee.x += dx
-            ee.x0 += dx
-            ee.y += dy
-            ee.y0 += dy
-            ee.z += dz
-            ee.z0 += dz
-            #ee.displace( dx, dy, dz ) # Don't have it defined in pybind11
-            #print( ee.x0, ee.y0, ee.z0 )
+            return None
+        if _needsModelIdx( self.placementFunc ):
+            # Older placement functions return one (dx, dy, dz) per call.
+            offsets = [ self.placementFunc( self.numModels, idx )
+                for idx in range( self.numModels ) ]
+        else:
+            offsets = self.placementFunc( self.numModels )
+        return np.array( offsets, dtype = float ).reshape( self.numModels, 3 )
+
+    def _positionModels( self, offsets ):
+        # The compartments of the template are found once and grouped by
+        # the Element (vec) they belong to. Every copy has the same tree,
+        # so its vecs are found by swapping the model path prefix. Each
+        # of x0, y0, z0, x, y, z is then set over a whole vec in one call.
+        # MOOSE has no setter spanning several Elements, so a compartment
+        # that is the only entry of its Element still gets one coords
+        # assignment, but no wildcard search is done per copy.
+        # Returns the number of vec-wide assignments made.
+        compts = moose.wildcardFind( self.model.path + "/##[ISA=CompartmentBase]" )
+        if len( compts ) == 0:
+            return 0
+        prefix = len( self.model.path )
+        groups = {}     # relative vec path → [ dataIndex list, coords list ]
+        for ee in compts:
+            vecPath = ee.vec.path
+            if vecPath.endswith( ']' ):  # Drop the dataIndex of this entry.
+                vecPath = vecPath[:vecPath.rfind( '[' )]
+            grp = groups.setdefault( vecPath[prefix:], [ [], [] ] )
+            grp[0].append( ee.dataIndex )
+            grp[1].append( ee.coords )
+        fields = [ 'x0', 'y0', 'z0', 'x', 'y', 'z' ]
+        numBulk = 0
+        for relPath, ( dataIdx, coords ) in groups.items():
+            coords = np.array( coords, dtype = float )
+            whole = dataIdx == list( range( len( dataIdx ) ) )
+            for model, offset in zip( self.modelList, offsets ):
+                vv = moose.vec( model.path + relPath )
+                shifted = coords[:, 0:6] + np.tile( offset, 2 ) # [x0 y0 z0 x y z dia]
+                if whole and len( vv ) == len( dataIdx ):
+                    if len( dataIdx ) == 1:
+                        vv[0].coords = np.concatenate( ( shifted[0], coords[0, 6:] ) )
+                        continue
+                    for col, ff in enumerate( fields ):
+                        setattr( vv, ff, shifted[:, col].tolist() )
+                    numBulk += 1
+                else:
+                    for row, di in enumerate( dataIdx ):
+                        vv[di].coords = np.concatenate( ( shifted[row], coords[row, 6:] ) )
+        return numBulk
 
     def makeArrayOfModels( self ):
-        self.modelList = []
-        self._positionModelObj( self.model, 0 )
-        self.modelList.append(self.model)
+        self.modelList = [ self.model ]
         parent = self.model.parent.path
 
-        for idx in range( 1, self.numModels ):
+        for idx in range( 1, len( self.modelRange ) ):
             name = "{}_{}".format( self.model.name, idx )
             dup = moose.copy( self.model, parent, name, 1 )
-            self._positionModelObj( dup[0], idx )
             self.modelList.append( dup[0] ) # dup is a vec
 
+        offsets = self._placementOffsets()
+        if offsets is None:
+            return
+        self._positionModels( offsets[ list( self.modelRange ) ] )
+
     ################################################################
     # Here we call any extra building function supplied by user.
     ################################################################
@@ -1085,7 +1431,7 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
         # self.extraBuildFunction( self )
         if not self.tweakFunc:
             return
-        for idx, model in enumerate( self.modelList ):
+        for idx, model in zip( self.modelRange, self.modelList ):
             self.tweakFunc( idx, model.path )
 
 
@@ -1143,6 +1489,48 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
         #  return obj.name + " " + str( obj.index )
         return "%s %s" % (obj.name, obj.index)
 
+    ################################################################
+    # Voxel <-> elec compartment index. Plots, stims, moogli and adaptors
+    # all need to know which voxels of a chem mesh sit on which elec
+    # compartments. We work this out once per mesh and keep it as
+    # numpy arrays rather than redoing it for every plot and stim.
+    ################################################################
+    def _buildVoxelIndex( self ):
+        self._voxelIndexCache = {}
+        for meshPath in self.meshDict.values():
+            mesh = moose.element( meshPath )
+            if mesh.className in ['NeuroMesh', 'SpineMesh', 'PsdMesh']:
+                self._voxelIndex( mesh )
+
+    def _voxelIndex( self, cc ):
+        entry = self._voxelIndexCache.setdefault( cc.path, {} )
+        if 'byName' not in entry:
+            # The voxel indexing follows the sorted compartment names, as
+            # it need not overlap with the indexing in the chem path.
+            em = sorted( [ self._makeUniqueNameStr(i[0]) for i in cc.elecComptMap ] )
+            byName = {}
+            for idx, name in enumerate( em ):
+                byName.setdefault( name, [] ).append( idx )
+            entry['byName'] = { key: np.array( val, dtype = int )
+                for key, val in byName.items() }
+        return entry
+
+    def _voxelsOnCompts( self, cc, comptList ):
+        byName = self._voxelIndex( cc )['byName']
+        names = set( self._makeUniqueNameStr( i ) for i in comptList )
+        hits = [ byName[name] for name in names if name in byName ]
+        if len( hits ) == 0:
+            return np.zeros( 0, dtype = int )
+        return np.unique( np.concatenate( hits ) )
+
+    def _voxelRanges( self, mesh ):
+        entry = self._voxelIndexCache.setdefault( mesh.path, {} )
+        if 'elecComptList' not in entry:
+            entry['elecComptList'] = mesh.elecComptList
+            entry['startVoxel'] = np.array( mesh.startVoxelInCompt, dtype = int )
+            entry['endVoxel'] = np.array( mesh.endVoxelInCompt, dtype = int )
+        return entry['elecComptList'], entry['startVoxel'], entry['endVoxel']
+
     # Returns vector of source objects, and the field to use.
     # plotDict has entries: relpath, field, 
     def _parseComptField( self, comptList, plotDict, knownFields ):
@@ -1160,7 +1548,7 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             path = plotDict['relpath'] # e.g., chemMesh/[group/]poolName
             pos = path.find( '/' )
             if pos == -1:   # Assume it is in the first chem compartment.
-                el = moose.wildcardFind( self.modelPath + "/chem/##[ISA=ChemCompt]" )
+                el = self._cachedWildcardFind( self.modelPath + "/chem/##[ISA=ChemCompt]" )
                 if len( el ) == 0:
                     raise BuildError( "parseComptField: no compartment on: " + self.modelPath )
                 chemComptName = el[0].name
@@ -1169,7 +1557,7 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                 cc = moose.element(self.modelPath + '/chem/'+chemComptName)
             else:
                 chemComptName = path.split('/')[0]
-                el = moose.wildcardFind( self.modelPath + "/chem/##[ISA=ChemCompt]" )
+                el = self._cachedWildcardFind( self.modelPath + "/chem/##[ISA=ChemCompt]" )
                 cc = moose.element( '/' )
                 for elm in el:
                     if elm.name == chemComptName:
@@ -1178,14 +1566,7 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             if cc.path == '/':
                 print( "ERROR: path = ", path, chemComptName, field, flush = True )
                 raise BuildError( "parseComptField: no chemMesh named: " + chemComptName )
-            voxelVec = []
-            temp = [ self._makeUniqueNameStr( i ) for i in comptList ]
-            comptSet = set( temp )
-            em = sorted( [ self._makeUniqueNameStr(i[0]) for i in cc.elecComptMap ] )
-
-            # The indexing in the voxelVec need not overlap with the 
-            # indexing in the chem path. Need to just go by lengths.
-            voxelVec = [i for i in range(len( em ) ) if em[i] in comptSet ]
+            voxelVec = self._voxelsOnCompts( cc, comptList )
             # Here we collapse the voxelVec into objects to plot.
             p = plotDict['relpath']
             if ( p[-1] == "]") and not( p[-2] == "[" ) :
@@ -1193,7 +1574,7 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             else:
                 allObj = moose.vec( self.modelPath + '/chem/' + plotDict['relpath'] )
             nd = len( allObj )
-            objList = [ allObj[j] for j in voxelVec if j < nd]
+            objList = [ allObj[int(j)] for j in voxelVec[voxelVec < nd] ]
             #print "############", chemCompt, len(objList), kf[1]
             return objList, kf[1]
 
@@ -1204,8 +1585,79 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
     def _buildPlots( self ):
         if not hasattr( self, 'plots' ):
             return
+        self._populationTabs = {}       # plotIdx:[tabname for each model]
+        self._populationEntries = {}    # plotIdx:plotNames entry of model 0
+        self._populationRecorders = []
         for model in self.modelList:
             self._buildOnePlot( model )
+        for plotIdx, tabPaths in self._populationTabs.items():
+            pop = self.plots[plotIdx]['population']
+            rec = PopulationRecorder( tabPaths,
+                    pop.get( 'percentiles', [] ), pop.get( 'numTraces', 0 ) )
+            self._populationRecorders.append( rec )
+            entry = self._populationEntries[plotIdx]
+            entry[0] = rec
+            self.plotNames.append( entry )
+
+    def _traceObjectCounts( self ):
+        return { 'objects': len( moose.wildcardFind( self.modelPath + '/##' ) ) }
+
+    def _writeTrace( self ):
+        if not jarTrace.isEnabled():
+            return
+        tdir = self.sessionDir if self.sessionDir else '.'
+        try:
+            jarTrace.writeTrace( os.path.join( tdir, jarTrace.TRACE_FILENAME ) )
+        except OSError as e:
+            print( "Warning: jardesigner: could not write trace:", e )
+
+    def _populationChunkTime( self ):
+        # Keep up to 1000 samples per table between flushes.
+        return 1000 * min( rec.dt for rec in self._populationRecorders )
+
+    def _start( self, runtime ):
+        """Runs the simulation for runtime. If there are population plots
+        the run is split into chunks, and the recorders are flushed after
+        each one so that the per-model tables stay small."""
+        recorders = getattr( self, '_populationRecorders', [] )
+        jarTickProfile.startRun()
+        _sim_flags['telemetry'] = jarTelemetry.RunTelemetry( runtime, self.runMooView )
+        if len( recorders ) == 0:
+            with jarTrace.span( 'moose.start', 'run', runtime = runtime ):
+                moose.start( runtime )
+            self._endRun()
+            return
+        clock = moose.element( '/clock' )
+        if clock.currentTime == 0:  # Fresh run after reinit
+            for rec in recorders:
+                rec.reset()
+        tend = clock.currentTime + runtime
+        chunk = self._populationChunkTime()
+        while clock.currentTime < tend - 1e-9 and not _sim_flags['stop']:
+            dt = min( chunk, tend - clock.currentTime )
+            jarTickProfile.resume()
+            with jarTrace.span( 'moose.start', 'run', runtime = dt ):
+                moose.start( dt )
+            with jarTrace.span( 'populationFlush', 'run' ):
+                for rec in recorders:
+                    rec.flush()
+        self._endRun()
+
+    def _endRun( self ):
+        tel = _sim_flags['telemetry']
+        _sim_flags['telemetry'] = None
+        if tel and self.sessionDir:
+            record = tel.finish( stopped = _sim_flags['stop'],
+                extra = { 'numModels': self.numModels } )
+            try:
+                jarTelemetry.appendRunMetadata( self.sessionDir, record )
+            except OSError as e:
+                print( "Warning: jardesigner: could not write run metadata:", e )
+        if jarTickProfile.isEnabled():
+            jarTickProfile.printReport()
+            jarTrace.counter( 'tickWallTime', { ss['solver']: ss['wallTime']
+                for ss in jarTickProfile.summary()['solvers'] } )
+        self._writeTrace()
 
     def _buildOnePlot( self, model ):
         knownFields = {
@@ -1233,11 +1685,9 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
         elecid = moose.element( model.path + '/elec' )
         dummy = moose.element( '/' )
         k = 0
-        for i in self.plots:
+        for plotIdx, i in enumerate( self.plots ):
             # GeomExpr removed for plots
-            #pair = i['path'] + ' ' + i.geom_expr 
-            pair = i['path'] + ' 1'
-            dendCompts = elecid.compartmentsFromExpression[ pair ]
+            dendCompts = self._comptsFromExpr( elecid, i['path'] )
             #spineCompts = elecid.spinesFromExpression[ pair ]
             plotObj, plotField = self._parseComptField( dendCompts, i, knownFields )
             numPlots = sum( q != dummy for q in plotObj )
@@ -1251,7 +1701,13 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                     title = i['title']
                 else:
                     title = i['path'] + "." + i['field']
-                if i['mode'] == 'wave':
+                if 'population' in i:
+                    if i['mode'] != 'time' or i['field'] == 'spikeTime':
+                        raise BuildError( "buildPlots: population plots must be time plots of a continuous field: " + title )
+                    # Only one entry goes to plotNames, for all the models.
+                    self._populationTabs.setdefault( plotIdx, [] ).append( tabname )
+                    self._populationEntries.setdefault( plotIdx, [ tabname, title, plotIdx, scale, units, i['field'], i['ymin'], i['ymax'], objList ] )
+                elif i['mode'] == 'wave':
                     self.wavePlotNames.append( [ tabname, title, k, scale, units, i, objList ] )
                 elif i['mode'] == 'time': 
                     self.plotNames.append( [ tabname, title, k, scale, units, i['field'], i['ymin'], i['ymax'], objList ] )
@@ -1268,18 +1724,16 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                         tabs.vec.useSpikeMode = True # spike detect mode on
 
             vtabs = moose.vec( tabs )
-            q = 0
-            for p in [ x for x in plotObj if x != dummy ]:
-                #print( p.path, plotField, q )
-                moose.connect( vtabs[q], 'requestOut', p, plotField )
-                objList.append( p )
-                q += 1
+            objList.extend( [ x for x in plotObj if x != dummy ] )
+            jarWiring.connectMany( vtabs, 'requestOut',
+                    range( len( objList ) ), objList, plotField )
 
     def _buildMoogli( self ):
-        if not hasattr( self, 'moogli' ):
+        if not hasattr( self, 'moogli' ) or not self.showViewer:
             return
         knownFields = knownFieldsDefault
         moogliBase = moose.Neutral( self.modelPath + '/moogli' )
+        elecid = moose.element( self.model.path + '/elec' )
         self.runMooView = jarmoogli.MooView( self.dataChannelId )
         for idx, i in enumerate( self.moogli ):
             path = i['path'].split('/')[-1]
@@ -1288,8 +1742,8 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             path4 = path3.replace( ']', '_' )
             groupId = "{}_{}_{}".format( path4, i['field'], idx )
             kf = knownFields[i['field']]
-            pair = i['path'] + " 1"  # I'm replacing geom_expr with '1'
-            dendCompts = self.elecid.compartmentsFromExpression[ pair ]
+            # I'm replacing geom_expr with '1'
+            dendCompts = self._comptsFromExpr( elecid, i['path'] )
             #spineCompts = self.elecid.spinesFromExpression[ pair ]
             dendObj, mooField = self._parseComptField( dendCompts, i, knownFields )
             dummy = moose.element( '/' )
@@ -1523,6 +1977,8 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
     def _displayMoogli( self ):
         if not hasattr( self, 'moogli' ) or not hasattr( self, 'displayMoogli' ):
             return False
+        if not self.showViewer:
+            return False
         if len( self.moogli ) == 0:
             return False
         dm = self.displayMoogli
@@ -1545,8 +2001,9 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                 movieFrame = mvfArray
                 #block = dm['block']
         )
+        jarTickProfile.install()
         moose.reinit()
-        moose.start( dm["runtime"] )
+        self._start( dm["runtime"] )
         self._save()                                            
         self.runMooView.notifySimulationEnd(self.dataChannelId)
         if dm["block"] or self.plotFile != None:
@@ -1556,8 +2013,9 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
         return True
 
     def _display( self, startIndex = 0, block=True ):
+        jarTickProfile.install()
         moose.reinit()
-        moose.start( self.runtime )
+        self._start( self.runtime )
         self._save()                                            
         self.display( startIndex, block )
 
@@ -1569,6 +2027,22 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                 "plots": []
         }
         for idx, pp in enumerate( self.plotNames ):
+            if isinstance( pp[0], PopulationRecorder ):
+                labels, vals = pp[0].series()
+                payload["plots"].append( 
+                    {
+                        "title": pp[1],
+                        "xlabel": "Time (s)",
+                        "ylabel": pp[4],
+                        "isRaster": False,
+                        "numSubPlots": len( vals ),
+                        "tmax": moose.element( "/clock").currentTime,
+                        "dt": pp[0].dt,
+                        "labels": labels,
+                        "val": [(vv*pp[3]).tolist() for vv in vals]
+                    } 
+                )
+                continue
             vtab = moose.vec( pp[0] )
             payload["plots"].append( 
                 {
@@ -1586,29 +2060,9 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             json.dump(payload, f)
 
     def display( self, startIndex = 0, block=True ):
-        FIG_HT = 5
-        FIG_WID = 6
         if len( self.plotNames ) == 0:
             return
-        if len( self.plotNames ) <= 3:
-            nrows = len( self.plotNames )
-            ncols = 1
-        elif len( self.plotNames ) == 4:
-            nrows = 2
-            ncols = 2
-        elif len( self.plotNames ) <= 6:
-            nrows = 3
-            ncols = 2
-        else:
-            nrows = int( np.sqrt( len( self.plotNames ) -1 ) )+1
-            ncols = 1 + (len( self.plotNames ) -1) // nrows
-        
-        if len( self.plotNames ) <= 9:   
-            sx = ncols * FIG_WID
-            sy = nrows * FIG_HT
-        else:
-            sx = 3 * FIG_HT
-            sy = 3 * FIG_WID
+        nrows, ncols, sx, sy = plotGridShape( len( self.plotNames ) )
 
         if self.plotFile != None and (self.plotFile.split('.')[-1] == "json"):
             self.plots2json( nrows, ncols, self.plotFile )
@@ -1622,6 +2076,14 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             ax.set_xlabel( "Time (s)", fontsize = 16 )
             ax.set_ylabel( i[4], fontsize = 16 )
             ax.tick_params(axis='both', which='major', labelsize=14)
+            if isinstance( i[0], PopulationRecorder ):
+                labels, vals = i[0].series()
+                for label, vv in zip( labels, vals ):
+                    t = np.arange( 0, len( vv ), 1 ) * i[0].dt
+                    ax.plot( t, vv * i[3], label = label )
+                if 0 < len( labels ) <= 10:
+                    ax.legend()
+                continue
             vtab = moose.vec( i[0] )
             if i[5] == 'spikeTime':
                 k = 0
@@ -1815,8 +2277,7 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                 field = i['field']
             else:   # Backward compat. In the json file it is cleaner.
                 field = stimType
-            pair = i['path'] + " " + i['geomExpr']
-            dendCompts = elecid.compartmentsFromExpression[ pair ]
+            dendCompts = self._comptsFromExpr( elecid, i['path'], i['geomExpr'] )
             #print( "BUILD COMPTS FROM EXPR = ", dendCompts )
             if field == 'vclamp':
                 stimObj = self._buildVclampOnCompt( dendCompts, [] )
@@ -1840,11 +2301,10 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
                 func.expr = i['expr']
                 #func.expr = expr
                 func.doEvalAtReinit = 1
-                for q in stimObj:
-                    moose.connect( func, 'valueOut', q, stimField )
-                    #print( "connecting stim: ", func.path, q.path + "[", q.dataIndex, "]." + stimField )
+                jarWiring.connectMany( func.vec, 'valueOut',
+                        [0] * numStim, stimObj, stimField )
                 if stimField == "increment": # Has to be under Ksolve
-                    moose.move( func, q )
+                    moose.move( func, stimObj[-1] )
         #print( "Built Stim on ", model.path )
 
     def _buildStims( self ):
@@ -2151,28 +2611,24 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
             print( "rdes::buildAdaptor: Error: meshName not found: ", meshName )
             quit()
         #elecComptList = mesh.elecComptList
+        meshComptList, startVoxelInCompt, endVoxelInCompt = self._voxelRanges( mesh )
         if elecRelPath == 'spine':
             # This is nasty. The spine indexing is different from
             # the compartment indexing and the mesh indexing and the 
             # chem indexing. Need to fix at some time.
             #elecComptList = moose.vec( mesh.elecComptList[0].path + '/../spine' )
             elec = moose.element( '/model/elec' )
-            elecComptList = [ elec.spineFromCompartment[i.me] for i in mesh.elecComptList ]
+            elecComptList = [ elec.spineFromCompartment[i.me] for i in meshComptList ]
             #elecComptList = moose.element( '/model/elec').spineIdsFromCompartmentIds[ mesh.elecComptList ]
             #elecComptList = mesh.elecComptMap
-            print( len( mesh.elecComptList ) )
-            for i,j in zip( elecComptList, mesh.elecComptList ):
-                print( "Lookup: {} {} {}; orig: {} {} {}".format( i.name, i.index, i.fieldIndex, j.name, j.index, j.fieldIndex ))
         else:
             #print("Building adapter: elecComptList '", mesh.elecComptList, "' on mesh: '", mesh.path , "' with elecRelPath = ", elecRelPath )
-            elecComptList = mesh.elecComptList
+            elecComptList = meshComptList
 
         if len( elecComptList ) == 0:
             raise BuildError( \
                 "buildAdaptor: no elec compts in elecComptList on: " + \
                 mesh.path )
-        startVoxelInCompt = mesh.startVoxelInCompt
-        endVoxelInCompt = mesh.endVoxelInCompt
         capField = elecField[0].capitalize() + elecField[1:]
         capChemField = chemField[0].capitalize() + chemField[1:]
         chemPath = mesh.path + '/' + chemRelPath
@@ -2196,59 +2652,208 @@ print( "Wall Clock Time = {:8.2f}, simtime = {:8.3f}".format( time.time() - _sta
         # print( 'building ', len( elecComptList ), 'adaptors ', adName, ' for: ', mesh.name, elecRelPath, elecField, chemRelPath )
         av = ad.vec
         chemVec = moose.element( mesh.path + '/' + chemRelPath ).vec
-
-        for i in zip( elecComptList, startVoxelInCompt, endVoxelInCompt, av ):
-            i[3].inputOffset = 0.0
-            i[3].outputOffset = offset
-            i[3].scale = scale
+        av.inputOffset = 0.0
+        av.outputOffset = offset
+        av.scale = scale
+
+        # Collect all the targets first, then wire them in bulk.
+        elecIdx = []    # Adaptor index for each elec object
+        elecObjs = []
+        chemSrcIdx = [] # Adaptor index for each chem voxel
+        chemVoxels = []
+        for idx, (compt, startVox, endVox) in enumerate( zip( elecComptList, startVoxelInCompt, endVoxelInCompt ) ):
             if elecRelPath == 'spine':
-                print( "ISSPINE" )
                 # Check needed in case there were unmapped entries in 
                 # spineIdsFromCompartmentIds
-                elObj = i[0]
-                #print( "EL OBJ = ", elObj.path )
-                #moose.showfield( elObj.me )
+                elObj = compt
                 if elObj.path == "/":
                     continue
             else:
-                ePath = i[0].path + '/' + elecRelPath
-                #print( "EPATH = ", ePath )
-                #print( "NOT SPINE", ePath )
+                ePath = compt.path + '/' + elecRelPath
                 if not( moose.exists( ePath ) ):
                     print( "Error: NOT SPINE", ePath, "DOESN'T EXIST, bailing" )
                     continue
                     #raise BuildError( "Error: buildAdaptor: no elec obj in " + ePath )
-                elObj = moose.element( i[0].path + '/' + elecRelPath )
-            if isElecToChem:
-                elecFieldSrc = 'get' + capField
-                chemFieldDest = 'set' + capChemField
-                #print ePath, elecFieldSrc, scale
-                moose.connect( i[3], 'requestOut', elObj, elecFieldSrc )
-                for j in range( i[1], i[2] ):
-                    moose.connect( i[3], 'output', chemVec[j],chemFieldDest)
-                    #print( "connect elecToChem:", i[3].path, 'input: ', elObj, elecFieldSrc, 'output', chemVec[j].name, chemFieldDest)
+                elObj = moose.element( ePath )
+            elecIdx.append( idx )
+            elecObjs.append( elObj )
+            chemSrcIdx.extend( [idx] * (endVox - startVox) )
+            chemVoxels.extend( range( startVox, endVox ) )
+
+        if isElecToChem:
+            elecFieldSrc = 'get' + capField
+            chemFieldDest = 'set' + capChemField
+            jarWiring.connectMany( av, 'requestOut', elecIdx, elecObjs, elecFieldSrc )
+            jarWiring.connectPairs( av, 'output', chemSrcIdx, chemVec, chemFieldDest, chemVoxels )
+        else:
+            chemFieldSrc = 'get' + capChemField
+            if capField == 'Activation':
+                elecFieldDest = 'activation'
             else:
-                chemFieldSrc = 'get' + capChemField
-                if capField == 'Activation':
-                    elecFieldDest = 'activation'
-                else:
-                    elecFieldDest = 'set' + capField
-                for j in range( i[1], i[2] ):
-                    moose.connect( i[3], 'requestOut', chemVec[j], chemFieldSrc)
-                    #print( "connect chemToElec:", i[3].name, 'requestOut', chemVec[j].name, chemFieldSrc)
-                msg = moose.connect( i[3], 'output', elObj, elecFieldDest )
-                #print( "Connect chemToElec: Connecting {} to {} and {}.{}".format( i[3], chemVec[0], elObj, elecFieldDest ) )
-        #moose.showfield( ad )
+                elecFieldDest = 'set' + capField
+            jarWiring.connectPairs( av, 'requestOut', chemSrcIdx, chemVec, chemFieldSrc, chemVoxels )
+            jarWiring.connectMany( av, 'output', elecIdx, elecObjs, elecFieldDest )
 
 
 
-def squareGridPlacementFunc( numModels, idx ):
+def _needsModelIdx( placementFunc ):
+    """True if placementFunc must be called once per model with
+    ( numModels, idx ), rather than once for all models."""
+    try:
+        params = inspect.signature( placementFunc ).parameters.values()
+    except ( TypeError, ValueError ):
+        return False
+    positional = ( inspect.Parameter.POSITIONAL_ONLY,
+        inspect.Parameter.POSITIONAL_OR_KEYWORD )
+    required = [ pp for pp in params
+        if pp.kind in positional and pp.default is inspect.Parameter.empty ]
+    return len( required ) >= 2
+
+def squareGridPlacementFunc( numModels, idx = None ):
+    """Returns an (numModels, 3) array of offsets on a square grid, or
+    just the offset of model idx if it is given."""
     nx = int( np.sqrt( numModels ) )
-    return 0.5e-3 * (idx // nx), 0.5e-3 * (idx % nx), 0.0
+    ii = np.arange( numModels )
+    offsets = np.zeros( (numModels, 3) )
+    offsets[:,0] = 0.5e-3 * (ii // nx)
+    offsets[:,1] = 0.5e-3 * (ii % nx)
+    if idx is None:
+        return offsets
+    return tuple( offsets[idx] )
+
+def randomPlacementFunc( numModels, idx = None ):
+    """Returns an (numModels, 3) array of random offsets in a 0.5 mm
+    square, or a single random offset if idx is given."""
+    if idx is not None:
+        return np.random.random()*0.5e-3, np.random.random()*0.5e-3, 0.0
+    offsets = np.zeros( (numModels, 3) )
+    offsets[:,0:2] = np.random.random( (numModels, 2) ) * 0.5e-3
+    return offsets
 
-def randomPlacementFunc( numModels, idx ):
-    nx = int( np.sqrt( numModels ) )
-    return np.random.random()*0.5e-3, np.random.random()*0.5e-3, 0.0
+
+################################################################
+# Sharded runs. The copies in a numModels array never interact, so the
+# array can be split into contiguous slices of model indices, each built
+# and run by its own worker process. The coordinator merges the plots
+# from the workers in index order, so the result is the same as for a
+# single process. Only model 0 drives the 3D viewer, so the viewer
+# output comes from the worker holding model 0.
+################################################################
+
+def shardRanges( numModels, numShards ):
+    numShards = max( 1, min( numShards, numModels ) )
+    step, extra = divmod( numModels, numShards )
+    ret = []
+    start = 0
+    for i in range( numShards ):
+        end = start + step + ( 1 if i < extra else 0 )
+        ret.append( range( start, end ) )
+        start = end
+    return ret
+
+def mergeShardPlots( shardFiles ):
+    """Concatenates the plots2json payloads written by the shards. Every
+    shard must have written its file."""
+    missing = [ fname for fname in shardFiles if not os.path.exists( fname ) ]
+    if len( missing ) > 0:
+        raise BuildError( "mergeShardPlots: no plots from shards: {}".format(
+            ", ".join( missing ) ) )
+    payload = None
+    for fname in shardFiles:
+        with open( fname ) as f:
+            shard = json.load( f )
+        if payload is None:
+            payload = shard
+        else:
+            payload["plots"].extend( shard["plots"] )
+    if payload is not None:
+        numPlots = len( payload["plots"] )
+        nrows, ncols, sx, sy = plotGridShape( numPlots )
+        payload.update( { "numPlots": numPlots, "nrows": nrows, "ncols": ncols } )
+    return payload
+
+def displayPlotPayload( payload, plotFile = None ):
+    """Draws the plots in a plots2json payload, as display() does from
+    the tables in a live model."""
+    numPlots = len( payload["plots"] )
+    if numPlots == 0:
+        return
+    nrows, ncols, sx, sy = plotGridShape( numPlots )
+    fig, axes = plt.subplots( nrows = nrows, ncols = ncols, 
+        figsize = (sx, sy), squeeze = False )
+    for idx, pp in enumerate( payload["plots"] ):
+        ax = axes[idx % nrows, idx // nrows]
+        ax.set_title( pp["title"], fontsize = 18 )
+        ax.set_xlabel( pp["xlabel"], fontsize = 16 )
+        ax.set_ylabel( pp["ylabel"], fontsize = 16 )
+        ax.tick_params(axis='both', which='major', labelsize=14)
+        if pp["isRaster"]:
+            for k, vv in enumerate( pp["val"] ):
+                ax.plot( vv, [k] * len( vv ), linestyle = 'None', marker = '.', markersize = 10 )
+            ax.set_xlim( 0, pp["tmax"] )
+        else:
+            for vv in pp["val"]:
+                ax.plot( np.arange( len( vv ) ) * pp["dt"], vv )
+    plt.tight_layout()
+    if plotFile == None:
+        plt.show()
+    else:
+        plt.savefig( plotFile )
+
+def runShards( args ):
+    """Coordinator for --shards: launches one worker per slice of the
+    model array, waits for them, and merges their plots."""
+    with open( args.file ) as f:
+        plots = json.load( f ).get( 'plots', [] )
+    # Each shard only sees its own models, so its population mean, std
+    # and percentiles cannot be merged into those of the whole array.
+    popTitles = [ pp.get( 'title' ) or pp.get( 'path', '' ) for pp in plots
+        if 'population' in pp ]
+    if len( popTitles ) > 0:
+        print( "Error: jardesigner: population plots are not supported with --shards. Run without --shards, or drop 'population' from plots: {}".format( ", ".join( popTitles ) ) )
+        return 1
+    ranges = shardRanges( args.numModels, args.shards )
+    # All shards must agree on placement, so they share one seed.
+    seed = args.seed if args.seed is not None else int( np.random.randint( 1, 2**31 - 1 ) )
+    shardDir = tempfile.mkdtemp( prefix = "jardes_shards_" )
+    env = os.environ.copy()
+    pkgParent = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+    env['PYTHONPATH'] = pkgParent + os.pathsep + env.get( 'PYTHONPATH', '' )
+    shardFiles = []
+    procs = []
+    for idx, rr in enumerate( ranges ):
+        shardFile = os.path.join( shardDir, "shard_{}.json".format( idx ) )
+        shardFiles.append( shardFile )
+        cmd = [ sys.executable, '-m', 'jardesigner.jardesigner', args.file,
+            '--run', '--numModels', str( args.numModels ),
+            '--shardRange', "{}:{}".format( rr.start, rr.stop ),
+            '--seed', str( seed ), '--plotFile', shardFile ]
+        if args.placementFunc:
+            cmd += [ '--placementFunc', args.placementFunc ]
+        if args.verbose:
+            cmd.append( '--verbose' )
+        procs.append( subprocess.Popen( cmd, env = env ) )
+    failed = [ idx for idx, pp in enumerate( procs ) if pp.wait() != 0 ]
+    if len( failed ) > 0:
+        print( "Error: jardesigner: shards {} failed".format( failed ) )
+        shutil.rmtree( shardDir, ignore_errors = True )
+        return 1
+    if len( plots ) == 0:
+        shutil.rmtree( shardDir, ignore_errors = True )
+        return 0
+    try:
+        payload = mergeShardPlots( shardFiles )
+    except BuildError as msg:
+        print( "Error: jardesigner:", msg )
+        return 1
+    finally:
+        shutil.rmtree( shardDir, ignore_errors = True )
+    if args.plotFile != None and args.plotFile.endswith( ".json" ):
+        with open( args.plotFile, 'w' ) as f:
+            json.dump( payload, f )
+    else:
+        displayPlotPayload( payload, args.plotFile )
+    return 0
 
 
 def serverCommandLoop( rdes ):
@@ -2269,7 +2874,7 @@ def serverCommandLoop( rdes ):
                 if moose.element( "/clock" ).currentTime == 0:
                     if hasattr( rdes, 'moogli' ) and len(rdes.moogli) > 0:
                         rdes.runMooView.sendSceneGraph( "run" )
-                moose.start(runtime)
+                rdes._start(runtime)
                 stopped = _sim_flags['stop']
                 reset_pending = _sim_flags['reset_pending']
                 _sim_flags['stop'] = False
@@ -2277,6 +2882,7 @@ def serverCommandLoop( rdes ):
                 rdes.display()
                 time.sleep(0.1)
                 rdes.runMooView.notifySimulationEnd( rdes.dataChannelId )
+                rdes._writeTrace()  # Again, to include the frame push.
                 if reset_pending:
                     moose.reinit()
 
@@ -2308,10 +2914,18 @@ def main():
         parser.add_argument( '-p', '--plotFile', type=str, help='Optional: Save plots to an svg file with the specified name, instead of displaying them.' )
         parser.add_argument( '--placementFunc', type=str, help='Optional: Pick a builtin placement function for multiple models. Options: squareGrid, random. Default: None' )
         parser.add_argument( '-n', '--numModels', type=int, help='Optional: Number of models to make. Default = 1', default = 1 )
+        parser.add_argument( '--shards', type=int, help='Optional: Split the numModels array across this many worker processes and run it. Standalone mode only. Default = 1', default = 1 )
+        parser.add_argument( '--shardRange', type=str, help='Internal: start:end range of model indices built by this shard worker.' )
+        parser.add_argument( '--seed', type=int, help='Optional: Random seed for model placement. Shared by all shards.' )
         parser.add_argument( '-v', '--verbose', action="store_true", help='Verbose flag. Prints out diagnostics when set.' )
         parser.add_argument('--data-channel-id', help='Unique ID for this simulation run, used in server mode for jardesigner interface. If not set we are in standalone mode.')
         parser.add_argument('--session-path', type=str, help='Temp directory for model and plot files, used in server mode for jardesigner interface.')
         args = parser.parse_args()
+        if args.shards > 1 and not args.shardRange:
+            if args.data_channel_id:
+                print( "Error: jardesigner: --shards is not supported in server mode." )
+                return 1
+            return runShards( args )
         rdes = JarDesigner( args.file, plotFile = args.plotFile, 
             jsonData = None, dataChannelId = args.data_channel_id, 
             sessionDir = args.session_path,
@@ -2322,7 +2936,21 @@ def main():
             pf = squareGridPlacementFunc
         elif args.placementFunc == "random":
             pf = randomPlacementFunc
-        rdes.buildModel( numModels = args.numModels, placementFunc = pf )
+        modelRange = None
+        if args.shardRange:
+            start, end = [ int( x ) for x in args.shardRange.split( ':' ) ]
+            modelRange = range( start, end )
+            # Only the shard holding model 0 drives the viewer. The others
+            # keep the moogli list, since spine lumping and morphology
+            # reduction use it to decide what to keep.
+            rdes.showViewer = ( start == 0 )
+        if args.seed is not None:
+            np.random.seed( args.seed )
+        if not rdes.buildModel( numModels = args.numModels, placementFunc = pf,
+                modelRange = modelRange ):
+            return 1
+        if args.seed is not None and modelRange:
+            moose.seed( args.seed + modelRange.start )
         #print( "jardesigner.py: built model" )
         if rdes.dataChannelId:
             rdes._buildSetupMoogli()
@@ -2337,15 +2965,16 @@ def main():
             ctrl.tick = 19
             moose.setClock(19, 0.1)
 
+        jarTickProfile.install()
         moose.reinit()
         if args.run and args.data_channel_id == None: # local run
             #print( "Running locally")
-            moose.start( rdes.runtime )
+            rdes._start( rdes.runtime )
             rdes.display()
             if rdes.runMooView and len( rdes.moogli ) > 0:
                 rdes.runMooView.sendSceneGraph( "run" )
                 rdes.runMooView.notifySimulationEnd( None )
-            quit()
+            return 0
     
         serverCommandLoop( rdes )
     except Exception as e:
@@ -2364,5 +2993,5 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    sys.exit( main() )
 
@@ -46,7 +46,6 @@
 # Code:
 import numpy as np
 import moose
-import math
 from pathlib import Path
 from moose import utils
 from . import fixXreacs
@@ -121,6 +120,11 @@ def make_myelinated_axon(comptLen = 10e-6, comptDia = 2e-6,
     
     return axon
 
+def gateVoltages( gate ):
+    """Returns the divs + 1 values of the gate variable at which an HHGate
+    table is sampled, from gate.min to gate.max."""
+    return gate.min + np.arange( gate.divs + 1 ) * ( (gate.max - gate.min) / gate.divs )
+
 def make_HH_Na(name = 'HH_Na', parent='/library', vmin=-110e-3, vmax=50e-3, vdivs=3000):
     """Create a Hodhkin-Huxley Na channel under `parent`.
 
@@ -289,20 +293,12 @@ def make_Ca( name ):
     ygate.min = -0.1
     ygate.max = 0.05
     ygate.divs = 3000
-    yA = np.zeros( (ygate.divs + 1), dtype=float)
-    yB = np.zeros( (ygate.divs + 1), dtype=float)
 
 
 #Fill the Y_A table with alpha values and the Y_B table with (alpha+beta)
-    dx = (ygate.max - ygate.min)/ygate.divs
-    x = ygate.min
-    for i in range( ygate.divs + 1 ):
-        if ( x > EREST_ACT):
-            yA[i] = 5.0 * math.exp( -50 * (x - EREST_ACT) )
-        else:
-            yA[i] = 5.0
-        yB[i] = 5.0
-        x += dx
+    x = gateVoltages( ygate )
+    yA = np.where( x > EREST_ACT, 5.0 * np.exp( -50 * np.maximum( x - EREST_ACT, 0.0 ) ), 5.0 )
+    yB = np.full( len( x ), 5.0 )
     ygate.tableA = yA
     ygate.tableB = yB
 # Tell the cell reader that the current from this channel must be fed into
@@ -403,14 +399,9 @@ def make_K_AHP( name ):
     zgate.min = 0
     zgate.max = xmax
     zgate.divs = 3000
-    zA = np.zeros( (zgate.divs + 1), dtype=float)
-    zB = np.zeros( (zgate.divs + 1), dtype=float)
-    dx = (zgate.max - zgate.min)/zgate.divs
-    x = zgate.min
-    for i in range( zgate.divs + 1 ):
-            zA[i] = min( 250.00 * CA_SCALE * x, 10 )
-            zB[i] = 1.0 + zA[i]
-            x = x + dx
+    x = gateVoltages( zgate )   # Here the gate variable is [Ca]
+    zA = np.minimum( 250.00 * CA_SCALE * x, 10 )
+    zB = 1.0 + zA
 
     zgate.tableA = zA
     zgate.tableB = zB
@@ -452,22 +443,14 @@ def make_K_C( name ):
     xgate.min = -0.1
     xgate.max = 0.05
     xgate.divs = 3000
-    xA = np.zeros( (xgate.divs + 1), dtype=float)
-    xB = np.zeros( (xgate.divs + 1), dtype=float)
-    dx = (xgate.max - xgate.min)/xgate.divs
-    x = xgate.min
-    for i in range( xgate.divs + 1 ):
-        alpha = 0.0
-        beta = 0.0
-        if (x < EREST_ACT + 0.05):
-            alpha = math.exp( 53.872 * (x - EREST_ACT) - 0.66835 ) / 0.018975
-            beta = 2000* (math.exp ( (EREST_ACT + 0.0065 - x)/0.027)) - alpha
-        else:
-            alpha = 2000 * math.exp( ( EREST_ACT + 0.0065 - x)/0.027 )
-            beta = 0.0
-        xA[i] = alpha
-        xB[i] = alpha + beta
-        x = x + dx
+    x = gateVoltages( xgate )
+    # Below EREST_ACT + 0.05, alpha + beta is the 2000*exp term; above it
+    # alpha is that term and beta is zero, so xB is the same throughout.
+    slow = np.exp( ( EREST_ACT + 0.0065 - x ) / 0.027 ) * 2000
+    xA = np.where( x < EREST_ACT + 0.05,
+        np.exp( np.minimum( 53.872 * (x - EREST_ACT), 53.872 * 0.05 ) - 0.66835 ) / 0.018975,
+        slow )
+    xB = slow
     xgate.tableA = xA
     xgate.tableB = xB
 
@@ -482,15 +465,10 @@ def make_K_C( name ):
         # based on estimates above let's keep it at 20uM.
     zgate.max = xmax
     zgate.divs = 3000
-    zA = np.zeros( (zgate.divs + 1), dtype=float)
-    zB = np.zeros( (zgate.divs + 1), dtype=float)
-    dx = ( zgate.max -  zgate.min)/ zgate.divs
-    x = zgate.min
+    x = gateVoltages( zgate )   # Here the gate variable is [Ca]
     #CaScale = 100000.0 / 250.0e-3
-    for i in range( zgate.divs + 1 ):
-        zA[i] = min( 1.0, x * CA_SCALE / xmax)
-        zB[i] = 1.0
-        x += dx
+    zA = np.minimum( 1.0, x * CA_SCALE / xmax )
+    zB = np.ones( len( x ) )
     zgate.tableA = zA
     zgate.tableB = zB
 
@@ -918,20 +896,12 @@ def make_LCa( name = 'LCa', parent = '/library' ):
         ygate.min = -0.1
         ygate.max = 0.05
         ygate.divs = 3000
-        yA = np.zeros( (ygate.divs + 1), dtype=float)
-        yB = np.zeros( (ygate.divs + 1), dtype=float)
 
 
 #Fill the Y_A table with alpha values and the Y_B table with (alpha+beta)
-        dx = (ygate.max - ygate.min)/ygate.divs
-        x = ygate.min
-        for i in range( ygate.divs + 1 ):
-                if ( x > EREST_ACT):
-                        yA[i] = 5.0 * math.exp( -50 * (x - EREST_ACT) )
-                else:
-                        yA[i] = 5.0
-                yB[i] = 5.0
-                x += dx
+        x = gateVoltages( ygate )
+        yA = np.where( x > EREST_ACT, 5.0 * np.exp( -50 * np.maximum( x - EREST_ACT, 0.0 ) ), 5.0 )
+        yB = np.full( len( x ), 5.0 )
         ygate.tableA = yA
         ygate.tableB = yB
         return Ca
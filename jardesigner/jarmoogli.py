@@ -14,6 +14,7 @@ import pathlib
 import os
 import sys
 import importlib.resources
+from . import jarTrace
 
 # Define the URL for the internal server endpoint
 FLASK_SERVER_URL = "http://127.0.0.1:5000/internal/push_data"
@@ -588,7 +589,8 @@ class MooView:
         if idx >= len(self.drawables):
             return
 
-        payload = self.drawables[idx].getDataFrame( simTime )
+        with jarTrace.span( 'encodeFrame', 'frame', drawable = idx ):
+            payload = self.drawables[idx].getDataFrame( simTime )
         if self.standalone:
             self.standaloneFrames.append( payload )
         else:
@@ -633,8 +635,9 @@ class MooView:
             self.standaloneSceneGraph = payload['scene']
         else:
             try:
-                requests.post(FLASK_SERVER_URL, json=requestBody,
-                              headers={'X-Internal-Token': _INTERNAL_TOKEN}, timeout=2.0)
+                with jarTrace.span( 'pushSceneGraph', 'push', viewId = viewId ):
+                    requests.post(FLASK_SERVER_URL, json=requestBody,
+                                  headers={'X-Internal-Token': _INTERNAL_TOKEN}, timeout=2.0)
                 #print( "Sent Scene Graph: \n", requestBody )
             except Exception as e:
                 print(f"FATAL ERROR: Could not send initial scene graph to server. {e}")
@@ -650,12 +653,14 @@ class MooView:
             return
         if self._pendingFrames:
             try:
-                requests.post(FLASK_SERVER_URL,
-                              json={"data_channel_id": dataChannelId,
-                                    "payload": {"type": "sim_batch",
-                                                "frames": self._pendingFrames}},
-                              headers={'X-Internal-Token': _INTERNAL_TOKEN},
-                              timeout=30.0)
+                with jarTrace.span( 'pushFrames', 'push',
+                        frames = len( self._pendingFrames ) ):
+                    requests.post(FLASK_SERVER_URL,
+                                  json={"data_channel_id": dataChannelId,
+                                        "payload": {"type": "sim_batch",
+                                                    "frames": self._pendingFrames}},
+                                  headers={'X-Internal-Token': _INTERNAL_TOKEN},
+                                  timeout=30.0)
             except Exception as e:
                 print(f"Warning: Could not send simulation frame batch. {e}")
             self._pendingFrames = []
@@ -0,0 +1,37 @@
+"""
+Shared fixtures for tests that build jardesigner models in MOOSE. The
+model is the Y-shaped multiscale example from the backend, with its 3-D
+display removed so that it builds headless.
+"""
+import os
+import copy
+import json
+import pytest
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'backend',
+                       'multiscale_model2_Y_spiking_chem_seq.json')
+_ROOTS = ['/model', '/library', '/jardes_tickProbe', '/jardes_ctrl']
+
+
+@pytest.fixture
+def moose():
+    """Clears the MOOSE objects made by an earlier build."""
+    moose = pytest.importorskip('moose')
+
+    def clear():
+        for path in _ROOTS:
+            if moose.exists(path):
+                moose.delete(path)
+    clear()
+    yield moose
+    clear()
+
+
+@pytest.fixture
+def modelConfig():
+    with open(EXAMPLE) as f:
+        cfg = json.load(f)
+    for key in ['moogli', 'displayMoogli']:
+        cfg.pop(key, None)
+    cfg['runtime'] = 0.1
+    return copy.deepcopy(cfg)
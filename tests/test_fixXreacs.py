@@ -0,0 +1,71 @@
+"""
+Memoisation in fixXreacs, on a synthetic model with many
+cross-compartment reactions. A ring of CubeMesh compartments holds pools
+A and B; each compartment has Reacs and MMenzs whose product is in the
+next compartment. The compartment map should answer every reactant
+lookup, and each foreign pool should be copied into a compartment once,
+however many reactions use it.
+
+    python -m pytest tests/test_fixXreacs.py
+"""
+import pytest
+
+moose = pytest.importorskip('moose')
+from jardesigner import fixXreacs
+
+
+def buildModel(path, numCompts, reacsPerCompt):
+    model = moose.Neutral(path)
+    compts = []
+    for i in range(numCompts):
+        compt = moose.CubeMesh('{}/c{}'.format(model.path, i))
+        compt.volume = 1e-18
+        moose.Pool(compt.path + '/A').concInit = 1e-3
+        moose.Pool(compt.path + '/B').concInit = 1e-3
+        compts.append(compt)
+    for i, compt in enumerate(compts):
+        nxt = compts[(i + 1) % numCompts]
+        enzPool = moose.element(compt.path + '/A')
+        for j in range(reacsPerCompt):
+            reac = moose.Reac('{}/r{}'.format(compt.path, j))
+            reac.Kf = 0.1
+            reac.Kb = 0.1
+            moose.connect(reac, 'sub', compt.path + '/A', 'reac')
+            moose.connect(reac, 'prd', nxt.path + '/B', 'reac')
+            enz = moose.MMenz('{}/mm{}'.format(enzPool.path, j))
+            enz.Km = 1e-3
+            enz.kcat = 1
+            moose.connect(enzPool, 'nOut', enz, 'enzDest')
+            moose.connect(enz, 'sub', compt.path + '/B', 'reac')
+            moose.connect(enz, 'prd', nxt.path + '/A', 'reac')
+    return model
+
+
+def test_fixXreacs_memoises(monkeypatch):
+    numCompts, reacsPerCompt = 20, 5
+    model = buildModel('/xreacs', numCompts, reacsPerCompt)
+    walks = []
+    copies = []
+    enclosing = fixXreacs._enclosingCompt
+    copy = moose.copy
+
+    def countedWalk(elm):
+        walks.append(elm.path)
+        return enclosing(elm)
+
+    def countedCopy(*args):
+        copies.append(args[2])
+        return copy(*args)
+    monkeypatch.setattr(fixXreacs, '_enclosingCompt', countedWalk)
+    monkeypatch.setattr(moose, 'copy', countedCopy)
+    try:
+        fixXreacs.fixXreacs(model.path)
+        numXfer = len(moose.wildcardFind(model.path + '/##/#_xfer_#'))
+    finally:
+        moose.delete(model)
+    # Only the root of the traversal walks up its parents; every
+    # reactant is answered from the compartment map.
+    assert walks == [model.path]
+    # One proxy per (compartment, foreign pool), each copied once.
+    assert numXfer == numCompts * 2
+    assert len(copies) == numXfer
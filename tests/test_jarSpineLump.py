@@ -0,0 +1,29 @@
+"""
+Spine lumping on the example model. Spines that no plot, stim or
+adaptor reaches are folded into their dendrites, and everything that
+looks at spines after the build should see only the explicit ones.
+
+    python -m pytest tests/test_jarSpineLump.py
+"""
+import pytest
+
+pytest.importorskip('moose')
+from jardesigner import jarSpineLump
+from jardesigner.jardesigner import JarDesigner
+
+
+def test_lumped_spines_are_gone(moose, modelConfig, capsys):
+    cfg = modelConfig
+    cfg['spineLumping'] = {'keep': ['branch1_0']}
+    rdes = JarDesigner(jsonData=cfg, verbose=True)
+    assert rdes.buildModel()
+    report = rdes.spineLumpReport
+    assert report['numLumped'] > 0
+    assert report['numExplicit'] > 0
+    elec = rdes.elecid.path
+    assert len(jarSpineLump.findSpines(rdes.elecid)) == report['numExplicit']
+    assert len(moose.wildcardFind(elec + '/head#')) == report['numExplicit']
+    assert rdes.elecid.numCompartments == \
+        len(moose.wildcardFind(elec + '/#[ISA=CompartmentBase]'))
+    out = capsys.readouterr().out
+    assert "and {} spines on".format(report['numExplicit']) in out
@@ -0,0 +1,32 @@
+"""
+Runs a small model with benchmark on and checks the per-tick wall time
+breakdown that jarTickProfile prints at the end of the run.
+
+    python -m pytest tests/test_jarTickProfile.py
+"""
+import pytest
+
+pytest.importorskip('moose')
+from jardesigner import jarTickProfile, jarTrace
+from jardesigner.jardesigner import JarDesigner
+
+
+def test_benchmark_run_profiles_ticks(moose, modelConfig, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)     # benchmark writes a trace file here
+    modelConfig['benchmark'] = True
+    try:
+        rdes = JarDesigner(jsonData=modelConfig)
+        assert rdes.buildModel()
+        jarTickProfile.install()
+        moose.reinit()
+        rdes._start(0.02)
+        ss = jarTickProfile.summary()
+    finally:
+        jarTickProfile.enable(False)
+        jarTrace.enable(False)
+    assert len(ss['ticks']) > 0
+    hsolve = [sv for sv in ss['solvers'] if sv['solver'] == 'HSolve']
+    assert len(hsolve) == 1 and hsolve[0]['wallTime'] > 0
+    elecTicks = [tt for tt in ss['ticks'] if tt['tick'] in hsolve[0]['ticks']]
+    assert all(tt['steps'] > 0 and tt['numObj'] > 0 for tt in elecTicks)
+    assert 'Wall time by clock tick:' in capsys.readouterr().out
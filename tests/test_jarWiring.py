@@ -0,0 +1,26 @@
+"""
+Wiring of adaptors, stims and plots whose sources and targets are not
+one-to-one or one-to-all, which jarWiring connects element by element.
+
+    python -m pytest tests/test_jarWiring.py
+"""
+import pytest
+
+pytest.importorskip('moose')
+from jardesigner import jarWiring
+from jardesigner.jardesigner import JarDesigner
+
+
+def test_adaptor_and_subset_stim(moose, modelConfig):
+    cfg = modelConfig
+    # The chem mesh covers the whole cell, but the adaptor reads only
+    # the voxels under each elec compartment.
+    cfg['chemDistrib'][0]['path'] = '#'
+    cfg['stims'].append({'type': 'field', 'path': 'branch2#',
+                         'relpath': 'Oscillator/a', 'expr': '1e-3', 'field': 'conc'})
+    cfg['plots'].append({'path': 'branch1#', 'field': 'conc', 'relpath': 'Oscillator/a'})
+    rdes = JarDesigner(jsonData=cfg)
+    assert rdes.buildModel()
+    assert jarWiring.wiringStats['singleMsgs'] > 0
+    moose.reinit()
+    moose.start(0.01)
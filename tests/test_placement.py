@@ -0,0 +1,40 @@
+"""
+Placement of model copies by makeArrayOfModels. Compartments that share
+one Element are moved with a single vec-wide assignment per field.
+
+    python -m pytest tests/test_placement.py
+"""
+import types
+import pytest
+
+pytest.importorskip('moose')
+import numpy as np
+from jardesigner.jardesigner import JarDesigner
+
+
+def test_copies_placed_in_bulk(moose):
+    numModels, numDend = 4, 5
+    model = moose.Neutral('/model')
+    moose.Neutral('/model/elec')
+    moose.Compartment('/model/elec/soma').coords = [0, 0, 0, 10e-6, 0, 0, 10e-6]
+    dend = moose.vec('/model/elec/dend', n=numDend, dtype='Compartment')
+    for i in range(numDend):
+        dend[i].coords = [10e-6 * (i + 1), 0, 0, 10e-6 * (i + 2), 0, 0, 1e-6]
+    modelList = [model]
+    for idx in range(1, numModels):
+        modelList.append(moose.copy(model, '/', 'model_{}'.format(idx), 1)[0])
+    offsets = np.array([[0, 100e-6 * idx, 0] for idx in range(numModels)])
+    rdes = types.SimpleNamespace(model=model, modelList=modelList)
+    try:
+        numBulk = JarDesigner._positionModels(rdes, offsets)
+        # One bulk assignment for the dend vec of each copy.
+        assert numBulk == numModels
+        for idx, mm in enumerate(modelList):
+            vv = moose.vec(mm.path + '/elec/dend')
+            assert np.allclose(vv.y0, 100e-6 * idx)
+            assert np.allclose(vv.x, [10e-6 * (i + 2) for i in range(numDend)])
+            soma = moose.element(mm.path + '/elec/soma')
+            assert np.isclose(soma.y, 100e-6 * idx)
+    finally:
+        for mm in modelList[1:]:
+            moose.delete(mm)
@@ -0,0 +1,24 @@
+"""
+Reuse of compartmentsFromExpression answers across build phases. The
+example model looks up 'dend#' for its chemDistrib, a stim and a plot.
+
+    python -m pytest tests/test_queryCache.py
+"""
+import pytest
+
+pytest.importorskip('moose')
+from jardesigner.jardesigner import JarDesigner
+
+
+def test_shared_path_hits_cache(moose, modelConfig):
+    rdes = JarDesigner(jsonData=modelConfig)
+    calls = []
+    lookup = rdes._comptsFromExpr
+
+    def counted(elecid, path, geomExpr='1'):
+        calls.append(path)
+        return lookup(elecid, path, geomExpr)
+    rdes._comptsFromExpr = counted
+    assert rdes.buildModel()
+    assert calls.count('dend#') >= 3
+    assert rdes._queryStats['hits'] >= 2